@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""Compare building filters from deep and wide specs with the explicit stack
+of :func:`sa_filters.filters.build_filters` and with the recursive builder
+it replaced.
+
+Run from the root of the repository::
+
+    python -m benchmarks.build_filters
+"""
+
+import sys
+import timeit
+from itertools import chain
+
+from sa_filters.exceptions import BadFilterFormat
+from sa_filters.filters import (
+    BOOLEAN_FUNCTIONS,
+    BooleanFilter,
+    Filter,
+    _is_iterable_filter,
+    build_filters,
+)
+
+
+def recursive_build_filters(filter_spec):
+    """The recursive builder, as it was before the explicit stack."""
+    if _is_iterable_filter(filter_spec):
+        return list(
+            chain.from_iterable(recursive_build_filters(item) for item in filter_spec)
+        )
+
+    if isinstance(filter_spec, dict):
+        for boolean_function in BOOLEAN_FUNCTIONS:
+            if boolean_function.key in filter_spec:
+                fn_args = filter_spec[boolean_function.key]
+
+                if not _is_iterable_filter(fn_args):
+                    raise BadFilterFormat(
+                        "`{}` value must be an iterable across the function "
+                        "arguments".format(boolean_function.key)
+                    )
+                if boolean_function.only_one_arg and len(fn_args) != 1:
+                    raise BadFilterFormat(
+                        "`{}` must have one argument".format(boolean_function.key)
+                    )
+                if not boolean_function.only_one_arg and len(fn_args) < 1:
+                    raise BadFilterFormat(
+                        "`{}` must have one or more arguments".format(
+                            boolean_function.key
+                        )
+                    )
+                return [
+                    BooleanFilter(
+                        boolean_function.sqlalchemy_fn,
+                        *recursive_build_filters(fn_args),
+                    )
+                ]
+
+    return [Filter(filter_spec)]
+
+
+def leaf(position):
+    return {"field": "name", "op": "==", "value": "name_{}".format(position)}
+
+
+def deep_spec(depth):
+    """A spec with `depth` nested `and` / `or` functions, each with a list of
+    two arguments.
+    """
+    spec = leaf(0)
+    for position in range(1, depth):
+        key = "and" if position % 2 else "or"
+        spec = {key: [[spec], leaf(position)]}
+    return spec
+
+
+def wide_spec(width):
+    """A spec with `width` filters, in lists of ten combined with `or`."""
+    return [
+        {"or": [leaf(position + offset) for offset in range(10)]}
+        for position in range(0, width, 10)
+    ]
+
+
+def run(name, spec, number):
+    def stack():
+        build_filters(spec)
+
+    def recursive():
+        recursive_build_filters(spec)
+
+    stack_time = min(timeit.repeat(stack, number=number, repeat=5)) / number
+    try:
+        recursive_time = min(timeit.repeat(recursive, number=number, repeat=5))
+    except RecursionError:
+        print(
+            "{:<24} stack {:8.2f} ms   recursive: RecursionError".format(
+                name, stack_time * 1000
+            )
+        )
+        return
+    recursive_time /= number
+
+    print(
+        "{:<24} stack {:8.2f} ms   recursive {:8.2f} ms   speedup {:.2f}x".format(
+            name,
+            stack_time * 1000,
+            recursive_time * 1000,
+            recursive_time / stack_time,
+        )
+    )
+
+
+def main():
+    print(
+        "Python {}, recursion limit {}".format(
+            sys.version.split()[0], sys.getrecursionlimit()
+        )
+    )
+    run("100 levels deep", deep_spec(100), 200)
+    run("150 levels deep", deep_spec(150), 200)
+    run("1000 levels deep", deep_spec(1000), 20)
+    run("10k filters wide", wide_spec(10000), 5)
+    run("10k filters, 150 deep", [deep_spec(150) for _ in range(66)], 5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Compare encoding and decoding keyset pagination cursors with
+:func:`sa_filters.pagination.encode_cursor` and
+:func:`sa_filters.pagination.decode_cursor`, and with a JSON round trip.
+
+Run from the root of the repository::
+
+    python -m benchmarks.cursors
+"""
+
+import base64
+import datetime
+import json
+import timeit
+
+from sa_filters.pagination import (
+    _get_cursor_fingerprint,
+    _pack,
+    decode_cursor,
+    encode_cursor,
+)
+
+
+FILTERS = [
+    {"field": "name", "op": "like", "value": "name_%"},
+    {"model": "Bar", "field": "count", "op": ">=", "value": 5},
+]
+SORT = [
+    {"field": "created_at", "direction": "desc"},
+    {"field": "id", "direction": "asc"},
+]
+KEY = (datetime.datetime(2024, 1, 2, 3, 4, 5), 123456)
+
+
+def json_encode(key):
+    data = json.dumps(
+        {"key": [key[0].isoformat(), key[1]], "filters": FILTERS, "sort": SORT}
+    )
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii")
+
+
+def json_decode(cursor):
+    data = json.loads(base64.urlsafe_b64decode(cursor))
+    if data["filters"] != FILTERS or data["sort"] != SORT:
+        raise ValueError(cursor)
+    created_at, id = data["key"]
+    return datetime.datetime.fromisoformat(created_at), id
+
+
+def run(name, function, number=100000):
+    seconds = min(timeit.repeat(function, number=number, repeat=5)) / number
+    print("{:<28} {:8.2f} us".format(name, seconds * 1e6))
+
+
+def main():
+    cursor = encode_cursor(KEY, FILTERS, SORT)
+    json_cursor = json_encode(KEY)
+    print("cursor: {} ({} characters)".format(cursor, len(cursor)))
+    print("JSON cursor: {} characters".format(len(json_cursor)))
+
+    run("encode_cursor", lambda: encode_cursor(KEY, FILTERS, SORT))
+    run("decode_cursor", lambda: decode_cursor(cursor, FILTERS, SORT))
+    run("  of which spec fingerprint", lambda: _get_cursor_fingerprint(FILTERS, SORT))
+    run("  of which key packing", lambda: b"".join(map(_pack, KEY)))
+    run("JSON encode", lambda: json_encode(KEY))
+    run("JSON decode", lambda: json_decode(json_cursor))
+
+
+if __name__ == "__main__":
+    main()
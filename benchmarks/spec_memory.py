@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Measure the memory held by the filters, sorts and loads parsed from specs
+of 100k nodes, with the slotted node classes and with equivalent classes
+that have an instance ``__dict__`` and keep their raw spec.
+
+Run from the root of the repository::
+
+    python -m benchmarks.spec_memory
+"""
+
+import gc
+import tracemalloc
+from unittest import mock
+
+from sa_filters import filters as filters_module
+from sa_filters.filters import BooleanFilter, Filter, build_filters
+from sa_filters.loads import LoadOnly
+from sa_filters.sorting import Sort
+
+
+NODES = 100000
+
+
+class DictFilter(Filter):
+    """A :class:`Filter` with an instance ``__dict__``, keeping its spec."""
+
+    def __init__(self, filter_spec):
+        super().__init__(filter_spec)
+        self.filter_spec = filter_spec
+
+    # replaces the property, so that the raw spec can be kept
+    filter_spec = None
+
+
+class DictBooleanFilter(BooleanFilter):
+    pass
+
+
+class DictSort(Sort):
+    def __init__(self, sort_spec):
+        super().__init__(sort_spec)
+        self.sort_spec = sort_spec
+
+
+class DictLoadOnly(LoadOnly):
+    def __init__(self, load_spec):
+        super().__init__(load_spec)
+        self.load_spec = load_spec
+
+
+def filter_spec(nodes):
+    """A spec with `nodes` filters, in groups of ten combined with `or`."""
+    return [
+        {
+            "or": [
+                {
+                    "model": "Foo",
+                    "field": "name",
+                    "op": "==",
+                    "value": "name_{}".format(position + offset),
+                }
+                for offset in range(10)
+            ]
+        }
+        for position in range(0, nodes, 10)
+    ]
+
+
+def measure(build):
+    """Return the memory, in bytes, still allocated by `build` once it has
+    returned, and the result of `build`.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return size, result
+
+
+def report(name, slotted_size, dict_size):
+    print(
+        "{:<20} slots {:8.2f} MiB ({:5.1f} B/node)   "
+        "dict {:8.2f} MiB ({:5.1f} B/node)   saved {:4.1f}%".format(
+            name,
+            slotted_size / 2**20,
+            slotted_size / NODES,
+            dict_size / 2**20,
+            dict_size / NODES,
+            100 * (1 - slotted_size / dict_size),
+        )
+    )
+
+
+def main():
+    # the specs are allocated before measuring, so that only the nodes built
+    # from them are counted, and kept alive by the dict classes
+    spec = filter_spec(NODES)
+    slotted_size, _ = measure(lambda: build_filters(spec))
+    with mock.patch.multiple(
+        filters_module, Filter=DictFilter, BooleanFilter=DictBooleanFilter
+    ):
+        dict_size, _ = measure(lambda: build_filters(spec))
+    report("filters", slotted_size, dict_size)
+
+    spec = [
+        {"model": "Foo", "field": "name", "direction": "asc", "nullslast": True}
+        for _ in range(NODES)
+    ]
+    slotted_size, _ = measure(lambda: [Sort(item) for item in spec])
+    dict_size, _ = measure(lambda: [DictSort(item) for item in spec])
+    report("sorts", slotted_size, dict_size)
+
+    spec = [{"model": "Foo", "fields": ["id", "name"]} for _ in range(NODES)]
+    slotted_size, _ = measure(lambda: [LoadOnly(item) for item in spec])
+    dict_size, _ = measure(lambda: [DictLoadOnly(item) for item in spec])
+    report("loads", slotted_size, dict_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
 # -*- coding: utf-8 -*-
 
-from .filters import apply_filters  # noqa: F401
+from .cache import ExpressionCache  # noqa: F401
+from .filters import (  # noqa: F401
+    SpecBudget,
+    apply_filters,
+    compile_filters,
+    is_known_empty,
+)
 from .loads import apply_loads  # noqa: F401
-from .pagination import apply_pagination  # noqa: F401
+from .pagination import apply_keyset_pagination, apply_pagination  # noqa: F401
+from .query import apply_query  # noqa: F401
 from .sorting import apply_sort  # noqa: F401
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import threading
+from collections import OrderedDict, namedtuple
+
+
+CacheStats = namedtuple(
+    "CacheStats", ["hits", "misses", "evictions", "size", "maxsize"]
+)
+
+
+class ExpressionCache(object):
+    """A bounded cache of the SQL expressions built from specs.
+
+    It may be passed to :func:`sa_filters.apply_filters`,
+    :func:`sa_filters.apply_sort` and :func:`sa_filters.apply_loads`, which
+    then build the expressions of a spec only once per set of statement
+    models and spec structure (see
+    :func:`sa_filters.filters.get_spec_fingerprint`). Later calls reuse
+    them, binding the new filter values. The least recently used entry is
+    evicted when the cache is full.
+
+    The cache is safe to share between threads.
+
+    :param maxsize:
+        Maximum number of entries (defaults to 1024).
+    """
+
+    def __init__(self, maxsize=1024):
+        if maxsize < 1:
+            raise ValueError("Cache size should be positive: {}".format(maxsize))
+
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the entry for `key`, or `None` if there is none."""
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store `value` for `key`, evicting the least recently used entry if
+        the cache is full.
+        """
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        """Remove every entry. The statistics are kept."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return a :class:`CacheStats` namedtuple with the number of
+        ``hits``, ``misses`` and ``evictions`` so far, the current ``size``
+        and the ``maxsize`` of the cache.
+        """
+        with self._lock:
+            return CacheStats(
+                self._hits,
+                self._misses,
+                self._evictions,
+                len(self._entries),
+                self.maxsize,
+            )
@@ -27,3 +27,11 @@ class BadQuery(Exception):
 
 class InvalidPage(Exception):
     pass
+
+
+class SpecTooComplex(Exception):
+    pass
+
+
+class InvalidCursor(Exception):
+    pass
@@ -1,21 +1,51 @@
 # -*- coding: utf-8 -*-
+import hashlib
+import json
 from collections import namedtuple
+from copy import copy
 from inspect import signature
 from itertools import chain
-from typing import Any, Dict, Iterable, Union
+from typing import Any, Dict, Iterable, Optional, Sized, Union
 
-from sqlalchemy import and_, func, not_, or_
-from sqlalchemy.orm import Query
-from sqlalchemy.sql import Select
+from sqlalchemy import (
+    all_,
+    and_,
+    any_,
+    bindparam,
+    false,
+    func,
+    literal_column,
+    not_,
+    or_,
+    select,
+    true,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Query, join
+from sqlalchemy.sql import ClauseElement, Select
+from sqlalchemy.sql.base import Immutable
+from sqlalchemy.sql.elements import False_, True_
+from sqlalchemy.types import TypeDecorator
 
-from .exceptions import BadFilterFormat, BadSpec
+from .cache import ExpressionCache
+from .exceptions import (
+    BadFilterFormat,
+    BadQuery,
+    BadSpec,
+    FieldNotFound,
+    SpecTooComplex,
+)
+from .loads import _canonical_load
 from .models import (
     Field,
+    ResolutionContext,
     auto_join,
     get_class_by_tablename,
-    get_default_model,
-    get_model_from_spec,
+    get_field_path,
+    get_join_path,
+    get_model,
 )
+from .sorting import _canonical_sort
 
 
 BooleanFunction = namedtuple(
@@ -32,48 +62,226 @@ Sqlalchemy boolean functions that can be parsed from the filter definition.
 
 
 class Operator(object):
-    OPERATORS = {
-        "is_null": lambda f: f.is_(None),
-        "is_not_null": lambda f: f.isnot(None),
-        "==": lambda f, a: f == a,
-        "eq": lambda f, a: f == a,
-        "!=": lambda f, a: f != a,
-        "ne": lambda f, a: f != a,
-        ">": lambda f, a: f > a,
-        "gt": lambda f, a: f > a,
-        "<": lambda f, a: f < a,
-        "lt": lambda f, a: f < a,
-        ">=": lambda f, a: f >= a,
-        "ge": lambda f, a: f >= a,
-        "<=": lambda f, a: f <= a,
-        "le": lambda f, a: f <= a,
-        "like": lambda f, a: f.like(a),
-        "ilike": lambda f, a: f.ilike(a),
-        "not_ilike": lambda f, a: ~f.ilike(a),
-        "in": lambda f, a: f.in_(a),
-        "not_in": lambda f, a: ~f.in_(a),
-        "any": lambda f, a: f.any(a),
-        "not_any": lambda f, a: func.not_(f.any(a)),
-    }
+    """A filter operator.
+
+    There is a single shared instance per operator, registered with
+    :func:`register_operator`. It knows the arity of the operator, so that
+    it doesn't have to be worked out for every filter, and may hold
+    implementations specific to some dialects.
+    """
+
+    __slots__ = ("name", "function", "arity", "dialect_functions")
 
-    def __init__(self, operator=None):
+    OPERATORS = {}
+    """Registered operators, by name."""
+
+    def __init__(self, name, function, arity=None, dialect_functions=None):
+        self.name = name
+        self.function = function
+        if arity is None:
+            arity = len(signature(function).parameters)
+        self.arity = arity
+        self.dialect_functions = dict(dialect_functions or {})
+
+    @classmethod
+    def get(cls, operator=None):
+        """Return the registered operator named `operator` (defaults to
+        ``==``).
+        """
         if not operator:
             operator = "=="
+        if isinstance(operator, Operator):
+            return operator
+
+        try:
+            return cls.OPERATORS[operator]
+        except (KeyError, TypeError):
+            raise BadFilterFormat("Operator `{}` not valid.".format(operator)) from None
+
+    def get_function(self, dialect=None):
+        """Return the function that builds the SQL expression of the operator
+        for the given `dialect`.
+        """
+        if dialect is not None and self.dialect_functions:
+            return self.dialect_functions.get(dialect.name, self.function)
+        return self.function
+
+
+def register_operator(name, function, arity=None, dialect_functions=None, aliases=()):
+    """Register a filter operator, or replace an existing one.
+
+    :param name:
+        The name of the operator in filter specs.
+
+    :param function:
+        A function that takes the SQLAlchemy field and, for binary operators,
+        the filter value, and returns an SQL expression.
+
+    :param arity:
+        The number of arguments of `function`. It is inspected from
+        `function` if not provided.
+
+    :param dialect_functions:
+        A dict of functions, by dialect name, to be used instead of
+        `function` when the dialect of the statement is known.
+
+    :param aliases:
+        Other names of the operator.
+
+    :returns:
+        The registered :class:`Operator`.
+
+    Example::
+
+        register_operator("startswith", lambda f, a: f.startswith(a))
+    """
+    operator = Operator(name, function, arity, dialect_functions)
+    for key in (name, *aliases):
+        Operator.OPERATORS[key] = operator
+    return operator
+
+
+LARGE_IN_THRESHOLD = 1000
+"""Number of values of an `in` / `not_in` filter above which they are bound
+as a single parameter instead of one parameter each, when the dialect of
+the statement is known to support it: as an array compared with ``ANY`` /
+``ALL`` on PostgreSQL, and as a JSON array joined with ``json_each`` on
+SQLite, unless the type of the field changes the values when they are
+bound.
+"""
+
+IN_CHUNK_SIZES = {"mariadb": 1000, "mysql": 1000, "oracle": 1000, "sqlite": 999}
+"""Maximum number of values of a single SQL ``IN``, by dialect name. Longer
+lists are split into chunks, combined with ``OR`` (``AND`` for `not_in`),
+when the dialect of the statement is known.
+"""
+
+
+def _unique_values(value):
+    if isinstance(value, (list, tuple)):
+        try:
+            return list(dict.fromkeys(value))
+        except TypeError:
+            # unhashable values are bound as they are
+            pass
+    return value
+
+
+def _in(field, value, chunk_size=None, negated=False):
+    value = _unique_values(value)
+    if (
+        chunk_size is None
+        or not isinstance(value, (list, tuple, set, frozenset))
+        or len(value) <= chunk_size
+    ):
+        return ~field.in_(value) if negated else field.in_(value)
 
-        if operator not in self.OPERATORS:
-            raise BadFilterFormat("Operator `{}` not valid.".format(operator))
+    value = list(value)
+    chunks = [value[i : i + chunk_size] for i in range(0, len(value), chunk_size)]
+    if negated:
+        return and_(*[~field.in_(chunk) for chunk in chunks])
+    return or_(*[field.in_(chunk) for chunk in chunks])
 
-        self.operator = operator
-        self.function = self.OPERATORS[operator]
-        self.arity = len(signature(self.function).parameters)
+
+def _in_chunks(dialect_name, negated=False):
+    def in_chunks(field, value):
+        return _in(field, value, IN_CHUNK_SIZES.get(dialect_name), negated)
+
+    return in_chunks
+
+
+def _is_large_list(value):
+    return (
+        isinstance(value, (list, tuple, set, frozenset))
+        and len(value) > LARGE_IN_THRESHOLD
+    )
+
+
+def _in_array(field, value, negated=False):
+    value = _unique_values(value)
+    if not _is_large_list(value):
+        return _in(field, value, negated=negated)
+
+    array = bindparam(None, list(value), type_=postgresql.ARRAY(field.type))
+    return field != all_(array) if negated else field == any_(array)
+
+
+_SQLITE_DIALECT = sqlite.dialect()
+
+
+def _is_bound_unchanged(field_type):
+    """Return whether the values of `field_type` are bound to SQLite as they
+    are, so that they may be serialized as JSON instead.
+    """
+    return (
+        not isinstance(field_type, TypeDecorator)
+        and field_type.bind_processor(_SQLITE_DIALECT) is None
+    )
+
+
+def _in_json_each(field, value, negated=False):
+    value = _unique_values(value)
+    if _is_large_list(value) and _is_bound_unchanged(field.type):
+        try:
+            values = json.dumps(list(value))
+        except TypeError:
+            # e.g. dates, which are not JSON serializable
+            pass
+        else:
+            table = func.json_each(values).table_valued("value")
+            semi_join = field.in_(select(table.c.value))
+            return ~semi_join if negated else semi_join
+    return _in(field, value, IN_CHUNK_SIZES.get("sqlite"), negated)
+
+
+register_operator("is_null", lambda f: f.is_(None))
+register_operator("is_not_null", lambda f: f.isnot(None))
+register_operator("==", lambda f, a: f == a, aliases=("eq",))
+register_operator("!=", lambda f, a: f != a, aliases=("ne",))
+register_operator(">", lambda f, a: f > a, aliases=("gt",))
+register_operator("<", lambda f, a: f < a, aliases=("lt",))
+register_operator(">=", lambda f, a: f >= a, aliases=("ge",))
+register_operator("<=", lambda f, a: f <= a, aliases=("le",))
+register_operator("like", lambda f, a: f.like(a))
+register_operator("ilike", lambda f, a: f.ilike(a))
+register_operator("not_ilike", lambda f, a: ~f.ilike(a))
+register_operator(
+    "in",
+    lambda f, a: _in(f, a),
+    dialect_functions={
+        **{name: _in_chunks(name) for name in ("mariadb", "mysql", "oracle")},
+        "postgresql": _in_array,
+        "sqlite": _in_json_each,
+    },
+)
+register_operator(
+    "not_in",
+    lambda f, a: _in(f, a, negated=True),
+    dialect_functions={
+        **{
+            name: _in_chunks(name, negated=True)
+            for name in ("mariadb", "mysql", "oracle")
+        },
+        "postgresql": lambda f, a: _in_array(f, a, negated=True),
+        "sqlite": lambda f, a: _in_json_each(f, a, negated=True),
+    },
+)
+register_operator("any", lambda f, a: f.any(a))
+register_operator("not_any", lambda f, a: func.not_(f.any(a)))
 
 
 class Filter(object):
-    def __init__(self, filter_spec):
-        self.filter_spec = filter_spec
+    """A filter on a single field.
+
+    Only the parsed attributes of the spec are kept: the names of its model
+    and table, if any, its field, operator and value.
+    """
 
+    __slots__ = ("model", "table", "field", "operator", "value")
+
+    def __init__(self, filter_spec):
         try:
-            filter_spec["field"]
+            self.field = filter_spec["field"]
         except KeyError:
             raise BadFilterFormat("`field` is a mandatory filter attribute.") from None
         except TypeError:
@@ -81,40 +289,59 @@ class Filter(object):
                 "Filter spec `{}` should be a dictionary.".format(filter_spec)
             ) from None
 
-        self.operator = Operator(filter_spec.get("op"))
+        self.operator = Operator.get(filter_spec.get("op"))
         self.value = filter_spec.get("value")
         value_present = True if "value" in filter_spec else False
         if not value_present and self.operator.arity == 2:
             raise BadFilterFormat("`value` must be provided.")
 
+        self.model = filter_spec.get("model")
+        self.table = filter_spec.get("table")
+
+    @property
+    def filter_spec(self):
+        """The spec of the filter, rebuilt from its parsed attributes."""
+        filter_spec = {"field": self.field, "op": self.operator.name}
+        if self.operator.arity == 2 or self.value is not None:
+            filter_spec["value"] = self.value
+        if self.model is not None:
+            filter_spec["model"] = self.model
+        if self.table is not None:
+            filter_spec["table"] = self.table
+        return filter_spec
+
     def get_named_models(self):
-        if all(k in self.filter_spec for k in ("model", "table")):
+        if self.model is not None and self.table is not None:
             raise BadFilterFormat("Only one field `model` or `table` must be provided.")
-        elif "model" in self.filter_spec:
-            return {self.filter_spec["model"]}
-        elif "table" in self.filter_spec:
-            model = get_class_by_tablename(self.filter_spec["table"])
+        elif self.model is not None:
+            return {self.model}
+        elif self.table is not None:
+            model = get_class_by_tablename(self.table)
             if model is None:
                 raise BadSpec(
-                    "The query does not contain table `{}`.".format(
-                        self.filter_spec["table"]
-                    )
+                    "The query does not contain table `{}`.".format(self.table)
                 )
             return {model.__name__}
         else:
             return set()
 
     def format_for_sqlalchemy(self, query, default_model):
-        filter_spec = self.filter_spec
         operator = self.operator
         value = self.value
 
-        model = get_model_from_spec(filter_spec, query, default_model)
+        model = get_model(query, self.model, self.table, default_model)
 
-        function = operator.function
+        # only a resolution context knows the dialect of the statement
+        function = operator.get_function(getattr(query, "dialect", None))
         arity = operator.arity
 
-        field_name = self.filter_spec["field"]
+        field_name = self.field
+        if _is_field_path(field_name):
+            field_path = get_field_path(model, field_name)
+            if arity == 1:
+                return field_path.format_for_sqlalchemy(function)
+            return field_path.format_for_sqlalchemy(lambda f: function(f, value))
+
         field = Field(model, field_name)
         sqlalchemy_field = field.get_sqlalchemy_field()
 
@@ -125,7 +352,13 @@ class Filter(object):
             return function(sqlalchemy_field, value)
 
 
+def _is_field_path(field_name):
+    return isinstance(field_name, str) and "." in field_name
+
+
 class BooleanFilter(object):
+    __slots__ = ("function", "filters")
+
     def __init__(self, function, *filters):
         self.function = function
         self.filters = filters
@@ -145,6 +378,68 @@ class BooleanFilter(object):
         )
 
 
+class ConstantFilter(object):
+    """A filter that is known to be always true, or always false.
+
+    It replaces `filters`, which are still checked against the query when
+    the filter is formatted, so that invalid specs keep being reported.
+    """
+
+    __slots__ = ("value", "filters")
+
+    def __init__(self, value, *filters):
+        self.value = value
+        self.filters = filters
+
+    def get_named_models(self):
+        models = set()
+        for filter in self.filters:
+            models.update(filter.get_named_models())
+        return models
+
+    def format_for_sqlalchemy(self, query, default_model):
+        for filter in self.filters:
+            filter.format_for_sqlalchemy(query, default_model)
+        return true() if self.value else false()
+
+
+class ExistsFilter(object):
+    """Filters on a model that is not in the query, checked with a
+    correlated ``EXISTS`` instead of joining the model.
+
+    `path` is the path joining the model to the query, as returned by
+    :func:`sa_filters.models.get_join_path`.
+    """
+
+    __slots__ = ("path", "filters")
+
+    def __init__(self, path, *filters):
+        self.path = path
+        self.filters = filters
+
+    def get_named_models(self):
+        # nothing has to be joined to the query
+        return set()
+
+    def format_for_sqlalchemy(self, query, default_model):
+        context = copy(query)
+        context.models = dict(query.models)
+        for model, _ in self.path:
+            context.add_model(model)
+
+        (model, correlation), *hops = self.path
+        from_clause = model
+        for model, onclause in hops:
+            from_clause = join(from_clause, model, onclause)
+
+        criteria = [
+            filter.format_for_sqlalchemy(context, default_model)
+            for filter in self.filters
+        ]
+        subquery = select(literal_column("1")).select_from(from_clause)
+        return subquery.where(correlation, *criteria).exists()
+
+
 def _is_iterable_filter(filter_spec):
     """`filter_spec` may be a list of nested filter specs, or a dict."""
     return isinstance(filter_spec, Iterable) and not isinstance(
@@ -152,42 +447,799 @@ def _is_iterable_filter(filter_spec):
     )
 
 
-def build_filters(filter_spec):
-    """Recursively process `filter_spec`"""
+def _get_boolean_function(filter_spec):
+    """Return the boolean function the dict `filter_spec` defines, and its
+    validated arguments, or `None` if it doesn't define one.
+    """
+    for boolean_function in BOOLEAN_FUNCTIONS:
+        if boolean_function.key in filter_spec:
+            # The filter spec is for a boolean-function
+            # Get the function argument definitions and validate
+            fn_args = filter_spec[boolean_function.key]
+
+            if not _is_iterable_filter(fn_args):
+                raise BadFilterFormat(
+                    "`{}` value must be an iterable across the function "
+                    "arguments".format(boolean_function.key)
+                )
+            if boolean_function.only_one_arg and len(fn_args) != 1:
+                raise BadFilterFormat(
+                    "`{}` must have one argument".format(boolean_function.key)
+                )
+            if not boolean_function.only_one_arg and len(fn_args) < 1:
+                raise BadFilterFormat(
+                    "`{}` must have one or more arguments".format(boolean_function.key)
+                )
+            return boolean_function, fn_args
+    return None
+
+
+def build_filters(filter_spec, max_depth=None):
+    """Process `filter_spec` into a list of filters.
+
+    The spec is walked with an explicit stack instead of recursively, so
+    that deep specs don't hit the recursion limit of Python.
+
+    :param max_depth:
+        If given, the maximum depth of the spec: the number of boolean
+        functions a filter may be nested in, plus one. Specs of any depth
+        are built by default.
+
+    :raise BadFilterFormat:
+        If the spec is not valid, or is deeper than `max_depth`.
+    """
+    filters = []
+    # each frame holds the specs left to process at one level, the list
+    # their filters go to, their depth, and the boolean function and list
+    # of filters of the level above, if any
+    stack = [(iter((filter_spec,)), filters, 1, None)]
+    while stack:
+        specs, level_filters, depth, parent = stack[-1]
+        too_deep = max_depth is not None and depth > max_depth
+        for spec in specs:
+            # dicts are checked first, as checking for an iterable is slower
+            if isinstance(spec, dict):
+                boolean_function = _get_boolean_function(spec)
+            elif _is_iterable_filter(spec):
+                # the filters of a list are part of the same level
+                stack.append((iter(spec), level_filters, depth, None))
+                break
+            else:
+                boolean_function = None
+
+            if too_deep:
+                raise BadFilterFormat(
+                    "Filter spec is nested deeper than {} levels.".format(max_depth)
+                )
+
+            if boolean_function is None:
+                level_filters.append(Filter(spec))
+                continue
+
+            boolean_function, fn_args = boolean_function
+            stack.append(
+                (iter(fn_args), [], depth + 1, (boolean_function, level_filters))
+            )
+            break
+        else:
+            stack.pop()
+            if parent is not None:
+                boolean_function, parent_filters = parent
+                parent_filters.append(
+                    BooleanFilter(boolean_function.sqlalchemy_fn, *level_filters)
+                )
+
+    return filters
+
+
+class SpecBudget(object):
+    """Limits on the complexity of the filter specs accepted by
+    :func:`apply_filters`, e.g. for specs sent by untrusted clients.
+
+    The raw spec is checked in a single pass, before any filter is built,
+    and rejected as soon as a limit is exceeded. Limits that are `None` are
+    not checked.
+
+    :param max_nodes:
+        Maximum number of filters and boolean functions.
+
+    :param max_depth:
+        Maximum depth, counted as for :func:`build_filters`.
+
+    :param max_in_size:
+        Maximum number of values of an `in` or `not_in` filter.
+
+    :param max_models:
+        Maximum number of distinct models and tables named by the filters.
+
+    :param max_joins:
+        Maximum number of joins the filters may add: one for each model
+        joined to reach the named models that are not in the query (one
+        for each named model without a context), and one for each
+        relationship followed by the dotted fields.
+    """
+
+    def __init__(
+        self,
+        max_nodes=None,
+        max_depth=None,
+        max_in_size=None,
+        max_models=None,
+        max_joins=None,
+    ):
+        self.max_nodes = max_nodes
+        self.max_depth = max_depth
+        self.max_in_size = max_in_size
+        self.max_models = max_models
+        self.max_joins = max_joins
+
+    def check(self, filter_spec, context=None):
+        """Check `filter_spec` against the limits of the budget.
+
+        :param context:
+            The :class:`sa_filters.models.ResolutionContext` of the query to
+            be filtered. Without it, every named model counts as a join.
+
+        :raise SpecTooComplex:
+            If the spec exceeds a limit.
+        """
+        max_nodes = self.max_nodes
+        max_depth = self.max_depth
+
+        nodes = 0
+        models = set()
+        relationships = set()
+        stack = [(filter_spec, 1)]
+        while stack:
+            spec, depth = stack.pop()
+            if _is_iterable_filter(spec):
+                stack.extend((item, depth) for item in spec)
+                continue
+
+            nodes += 1
+            if max_nodes is not None and nodes > max_nodes:
+                raise SpecTooComplex(
+                    "Filter spec has more than {} nodes.".format(max_nodes)
+                )
+            if max_depth is not None and depth > max_depth:
+                raise SpecTooComplex(
+                    "Filter spec is nested deeper than {} levels.".format(max_depth)
+                )
+            if not isinstance(spec, dict):
+                # left to be reported by `build_filters`
+                continue
+
+            for boolean_function in BOOLEAN_FUNCTIONS:
+                if boolean_function.key in spec:
+                    fn_args = spec[boolean_function.key]
+                    if _is_iterable_filter(fn_args):
+                        stack.append((fn_args, depth + 1))
+                    break
+            else:
+                self._check_filter(spec, models, relationships)
+
+        self._check_joins(models, relationships, context)
 
+    def _check_filter(self, spec, models, relationships):
+        value = spec.get("value")
+        if (
+            self.max_in_size is not None
+            and _canonical_operator(spec.get("op")) in ("in", "not_in")
+            and isinstance(value, Sized)
+            and not isinstance(value, str)
+            and len(value) > self.max_in_size
+        ):
+            raise SpecTooComplex(
+                "`{}` filter has more than {} values.".format(
+                    _canonical_operator(spec["op"]), self.max_in_size
+                )
+            )
+
+        model = ("table", spec["table"]) if "table" in spec else None
+        if "model" in spec:
+            model = ("model", spec["model"])
+        if model is not None and model not in models:
+            models.add(model)
+            if self.max_models is not None and len(models) > self.max_models:
+                raise SpecTooComplex(
+                    "Filter spec names more than {} models.".format(self.max_models)
+                )
+
+        field_name = spec.get("field")
+        if _is_field_path(field_name):
+            path = field_name.split(".")[:-1]
+            for position in range(1, len(path) + 1):
+                relationships.add((model, tuple(path[:position])))
+            if self.max_joins is not None and len(relationships) > self.max_joins:
+                raise SpecTooComplex(
+                    "Filter spec requires more than {} joins.".format(self.max_joins)
+                )
+
+    def _check_joins(self, models, relationships, context):
+        if self.max_joins is None:
+            return
+
+        joins = len(relationships)
+        # the models joined on the way to the named ones, each joined once
+        joined_models = set()
+        for kind, name in models:
+            if kind == "table":
+                model = get_class_by_tablename(name)
+                name = model.__name__ if model is not None else name
+            if context is None:
+                joins += 1
+            elif name not in context.models:
+                path = get_join_path(context, name)
+                if path:
+                    joined_models.update(model for model, _ in path)
+                else:
+                    joins += 1
+        joins += len(joined_models)
+        if joins > self.max_joins:
+            raise SpecTooComplex(
+                "Filter spec requires more than {} joins.".format(self.max_joins)
+            )
+
+
+def _canonical_operator(operator):
+    if isinstance(operator, Operator):
+        return operator.name
+    try:
+        return Operator.OPERATORS[operator].name
+    except (KeyError, TypeError):
+        return operator
+
+
+def _canonical_value(value, include_values):
+    if include_values:
+        return repr(value)
+    # `None` changes the SQL that is generated (e.g. `IS NULL` for `==`)
+    return "null" if value is None else "?"
+
+
+def _canonical_filter(filter_spec, include_values):
+    """Return `filter_spec` as a string that does not depend on the order
+    of the dict keys nor on the order of the `and` / `or` arguments.
+
+    The filter specs with a value that is not `None` are returned as well,
+    in the order they appear in the string.
+    """
     if _is_iterable_filter(filter_spec):
-        return list(chain.from_iterable(build_filters(item) for item in filter_spec))
+        return _canonical_boolean("and", filter_spec, True, include_values)
+
+    if not isinstance(filter_spec, dict):
+        return repr(filter_spec), []
+
+    for boolean_function in BOOLEAN_FUNCTIONS:
+        if boolean_function.key in filter_spec:
+            fn_args = filter_spec[boolean_function.key]
+            if not _is_iterable_filter(fn_args):
+                return repr(filter_spec), []
+            return _canonical_boolean(
+                boolean_function.key,
+                fn_args,
+                not boolean_function.only_one_arg,
+                include_values,
+            )
+
+    items = []
+    for key in sorted(filter_spec):
+        if key == "value":
+            value = _canonical_value(filter_spec[key], include_values)
+        elif key == "op":
+            value = repr(_canonical_operator(filter_spec[key]))
+        else:
+            value = repr(filter_spec[key])
+        items.append("{}={}".format(key, value))
+
+    leaves = [filter_spec] if filter_spec.get("value") is not None else []
+    return "{{{}}}".format(",".join(items)), leaves
+
+
+def _canonical_boolean(key, fn_args, commutative, include_values):
+    args = [_canonical_filter(item, include_values) for item in fn_args]
+    if commutative:
+        args.sort(key=lambda arg: arg[0])
+
+    leaves = []
+    for _, arg_leaves in args:
+        leaves.extend(arg_leaves)
+    return "{}({})".format(key, ",".join(arg for arg, _ in args)), leaves
+
+
+def get_spec_fingerprint(
+    filter_spec: Any = None,
+    sort_spec: Any = None,
+    load_spec: Any = None,
+    include_values: bool = False,
+) -> str:
+    """Return a fingerprint of the structure of the given specs.
+
+    The fingerprint is a short string that is the same for specs that
+    differ only in their filter values, in the order of their dict keys or
+    in the order of the arguments of `and` / `or` (and of the filters of a
+    list, which are combined with `and`). Operator aliases such as ``eq``
+    and ``==`` are considered equal. The order of the sort criteria is
+    significant. A `None` filter value is part of the structure, as it
+    changes the SQL that is generated.
+
+    It works on the raw specs, before they are validated or built, and may
+    be used as a cache key.
+
+    :param filter_spec:
+        A filter spec as accepted by :func:`apply_filters`.
+
+    :param sort_spec:
+        A sort spec as accepted by :func:`sa_filters.apply_sort`.
+
+    :param load_spec:
+        A load spec as accepted by :func:`sa_filters.apply_loads`.
+
+    :param include_values:
+        Whether the filter values are part of the fingerprint too.
+
+    :returns:
+        A hexadecimal string.
+    """
+    parts = []
+    if filter_spec is not None:
+        parts.append(_canonical_filter(filter_spec, include_values)[0])
+    if sort_spec is not None:
+        parts.append(_canonical_sort(sort_spec))
+    if load_spec is not None:
+        parts.append(_canonical_load(load_spec))
+
+    canonical = ";".join(parts).encode("utf-8")
+    return hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+def _map_filter_specs(filter_spec, function):
+    """Return a copy of `filter_spec` where `function` has been applied to
+    every spec that does not define a boolean function.
+    """
+    if _is_iterable_filter(filter_spec):
+        return [_map_filter_specs(item, function) for item in filter_spec]
 
     if isinstance(filter_spec, dict):
-        # Check if filter spec defines a boolean function.
         for boolean_function in BOOLEAN_FUNCTIONS:
             if boolean_function.key in filter_spec:
-                # The filter spec is for a boolean-function
-                # Get the function argument definitions and validate
-                fn_args = filter_spec[boolean_function.key]
-
-                if not _is_iterable_filter(fn_args):
-                    raise BadFilterFormat(
-                        "`{}` value must be an iterable across the function "
-                        "arguments".format(boolean_function.key)
-                    )
-                if boolean_function.only_one_arg and len(fn_args) != 1:
-                    raise BadFilterFormat(
-                        "`{}` must have one argument".format(boolean_function.key)
-                    )
-                if not boolean_function.only_one_arg and len(fn_args) < 1:
-                    raise BadFilterFormat(
-                        "`{}` must have one or more arguments".format(
-                            boolean_function.key
-                        )
-                    )
-                return [
-                    BooleanFilter(
-                        boolean_function.sqlalchemy_fn, *build_filters(fn_args)
-                    )
-                ]
+                return {
+                    key: _map_filter_specs(value, function)
+                    if key == boolean_function.key
+                    else value
+                    for key, value in filter_spec.items()
+                }
+        return function(filter_spec)
+
+    return filter_spec
+
 
-    return [Filter(filter_spec)]
+def _value_param_name(position):
+    return "sa_filters_{}".format(position)
+
+
+def _replace_values(filter_spec, leaves):
+    """Return a copy of `filter_spec` where the value of every spec in
+    `leaves` is replaced by a bind parameter named after its position.
+    """
+    positions = {id(leaf): position for position, leaf in enumerate(leaves)}
+
+    def replace_value(spec):
+        if id(spec) not in positions:
+            return spec
+        return dict(spec, value=bindparam(_value_param_name(positions[id(spec)])))
+
+    return _map_filter_specs(filter_spec, replace_value)
+
+
+def _get_constant_value(filter):
+    """Return whether `filter` is always true or always false, or `None` if
+    that is not known.
+    """
+    if filter.operator.name in ("in", "not_in") and isinstance(
+        filter.value, (list, tuple, set, frozenset)
+    ):
+        if not filter.value:
+            value = filter.operator.name == "not_in"
+            # a related field is only true if there is a related row
+            if value and _is_field_path(filter.field):
+                return None
+            return value
+    return None
+
+
+def _simplify(filter, coalesce=True, negated=False, get_python_type=None):
+    """Return a simplified `filter`, a key that is the same for filters that
+    are equivalent and, for `and` / `or` functions, the same 3-tuples for
+    each of their arguments.
+
+    `negated` tells whether `filter` is under an odd number of `not`.
+    `get_python_type` returns the Python type of the values of the field of
+    a filter, see :func:`_coalesce`.
+    """
+    if isinstance(filter, Filter):
+        value = _get_constant_value(filter)
+        if value is not None:
+            return ConstantFilter(value, filter), repr(value), None
+        return filter, _canonical_filter(filter.filter_spec, True)[0], None
+
+    if isinstance(filter, ConstantFilter):
+        return filter, repr(filter.value), None
+
+    if filter.function is not_:
+        (arg,) = filter.filters
+        arg, key, _ = _simplify(arg, coalesce, not negated, get_python_type)
+        if isinstance(arg, ConstantFilter):
+            return ConstantFilter(not arg.value, arg), repr(not arg.value), None
+        if isinstance(arg, BooleanFilter) and arg.function is not_:
+            return _simplify(arg.filters[0], coalesce, negated, get_python_type)
+        return BooleanFilter(not_, arg), "not({})".format(key), None
+
+    return _simplify_arguments(
+        filter.function, filter.filters, coalesce, negated, get_python_type
+    )
+
+
+def _simplify_arguments(
+    function, filters, coalesce=True, negated=False, get_python_type=None
+):
+    """Simplify the `filters` combined with `function`, which is either
+    `and_` or `or_`.
+    """
+    # `false` absorbs everything in an `and`, and `true` does in an `or`
+    absorbing = function is or_
+
+    args = {}
+    # the constants that are left out, which are still validated
+    dropped = []
+    for filter in filters:
+        simplified = _simplify(filter, coalesce, negated, get_python_type)
+        filter, _, simplified_args = simplified
+        if isinstance(filter, BooleanFilter) and filter.function is function:
+            nested = simplified_args
+        else:
+            nested = [simplified]
+
+        for arg in nested:
+            if not isinstance(arg[0], ConstantFilter):
+                args.setdefault(arg[1], arg)
+            elif arg[0].value is absorbing:
+                return ConstantFilter(absorbing, *filters), repr(absorbing), None
+            else:
+                dropped.append(arg[0])
+
+    if coalesce:
+        args = _coalesce(function, args, negated, get_python_type)
+    for filter, _, _ in args.values():
+        if isinstance(filter, ConstantFilter) and filter.value is absorbing:
+            return ConstantFilter(absorbing, *filters), repr(absorbing), None
+    dropped.extend(
+        filter for filter, _, _ in args.values() if isinstance(filter, ConstantFilter)
+    )
+    args = {
+        key: simplified
+        for key, simplified in args.items()
+        if not isinstance(simplified[0], ConstantFilter)
+    }
+
+    if not args:
+        return ConstantFilter(not absorbing, *filters), repr(not absorbing), None
+    if dropped:
+        # neutral in `function`, so only the validation of the filters is kept
+        key = repr(not absorbing)
+        args[key] = ConstantFilter(not absorbing, *dropped), key, None
+    if len(args) == 1:
+        (simplified,) = args.values()
+        return simplified
+
+    name = "or" if absorbing else "and"
+    key = "{}({})".format(name, ",".join(sorted(args)))
+    filter = BooleanFilter(function, *[arg for arg, _, _ in args.values()])
+    return filter, key, list(args.values())
+
+
+_BETWEEN = Operator("between", lambda f, a: f.between(*a))
+"""Only used for the ranges built by :func:`_coalesce`, so not registered."""
+
+_LOWER_BOUNDS = (">", ">=")
+_UPPER_BOUNDS = ("<", "<=")
+_MEMBERSHIPS = ("==", "in")
+_EXCLUSIONS = ("!=", "not_in")
+_NULL_CHECKS = ("is_null", "is_not_null")
+
+
+def _is_coalescible(filter, function, python_type):
+    operator = filter.operator.name
+    value = filter.value
+    if function is and_ and _is_field_path(filter.field):
+        # each filter may be true for a different related row
+        return False
+    if operator in _NULL_CHECKS:
+        return function is and_
+    if operator in _EXCLUSIONS and function is not and_:
+        return False
+
+    if operator in ("in", "not_in"):
+        # `in` a list with `None` never matches a null field, but `==` does
+        if not isinstance(value, (list, tuple, set, frozenset)) or None in value:
+            return False
+        values = value
+    elif operator in _MEMBERSHIPS or operator in _EXCLUSIONS:
+        values = [value]
+    elif operator in _LOWER_BOUNDS or operator in _UPPER_BOUNDS:
+        values = [value]
+    else:
+        return False
+
+    if function is or_ and operator in _MEMBERSHIPS:
+        # the values are only merged into a single `in`, not compared
+        return all(
+            value is not None and not isinstance(value, ClauseElement)
+            for value in values
+        )
+    return all(_is_of_type(value, python_type) for value in values)
+
+
+def _is_of_type(value, python_type):
+    """Return whether `value` compares in Python as it does in the database,
+    as a value of the Python type of its field.
+    """
+    if python_type is None or not isinstance(value, python_type):
+        return False
+    return python_type is bool or not isinstance(value, bool)
+
+
+def _get_python_type(sqlalchemy_field):
+    """Return the Python type of the values of `sqlalchemy_field`, or `None`
+    if its values may not compare in Python as they do in the database.
+
+    Strings are never compared, as the collation of the column may be case
+    insensitive, nor are the values of custom types, which may be changed
+    when they are bound.
+    """
+    field_type = getattr(sqlalchemy_field, "type", None)
+    if field_type is None or isinstance(field_type, TypeDecorator):
+        return None
+    try:
+        python_type = field_type.python_type
+    except NotImplementedError:
+        return None
+    if issubclass(python_type, str):
+        return None
+    return python_type
+
+
+def _python_type_getter(context, default_model):
+    """Return a function that returns the Python type of the values of the
+    field of a filter, if it is a column of a model of `context`.
+    """
+
+    def get_python_type(filter):
+        if _is_field_path(filter.field):
+            return None
+        try:
+            model = get_model(context, filter.model, filter.table, default_model)
+            sqlalchemy_field = Field(model, filter.field).get_sqlalchemy_field()
+        except (BadQuery, BadSpec, FieldNotFound):
+            # e.g. a model that is not joined yet, reported when formatted
+            return None
+        return _get_python_type(sqlalchemy_field)
+
+    return get_python_type
+
+
+def _coalesce(function, args, negated=False, get_python_type=None):
+    """Merge the arguments of `function` that are filters on the same field
+    into as few filters as possible: a single `in` for `==` / `in` filters,
+    the tightest (`and`) or loosest (`or`) bound for ranges, and `between`
+    for a closed range.
+
+    Filters on the same field that can't be true together are replaced by
+    a false :class:`ConstantFilter`. As they are unknown rather than false
+    for a null field, that is only done if not `negated`.
+
+    Values are only compared with each other if they are of the Python type
+    of their field, as returned by `get_python_type` for a filter, and
+    filters whose values can't be compared are left as they are.
+    """
+    groups = {}
+    for key, (filter, _, _) in args.items():
+        if not isinstance(filter, Filter):
+            continue
+        python_type = None if get_python_type is None else get_python_type(filter)
+        if _is_coalescible(filter, function, python_type):
+            field = (filter.model, filter.table, filter.field)
+            groups.setdefault(field, []).append(key)
+
+    replacements = {}
+    for keys in groups.values():
+        if len(keys) < 2:
+            continue
+        filters = [args[key][0] for key in keys]
+        try:
+            if function is and_:
+                coalesced = _coalesce_and(filters)
+            else:
+                coalesced = _coalesce_or(filters)
+        except TypeError:
+            # e.g. unhashable values, or values of different types
+            continue
+
+        contradiction = any(isinstance(f, ConstantFilter) for f in coalesced)
+        if contradiction and negated:
+            continue
+        replacements[keys[0]] = coalesced
+        replacements.update((key, []) for key in keys[1:])
+
+    if not replacements:
+        return args
+
+    coalesced_args = {}
+    for key, simplified in args.items():
+        if key not in replacements:
+            coalesced_args.setdefault(key, simplified)
+            continue
+        for filter in replacements[key]:
+            simplified = _simplify(filter)
+            coalesced_args.setdefault(simplified[1], simplified)
+    return coalesced_args
+
+
+def _coalesced_filter(filter, operator, value):
+    coalesced = copy(filter)
+    coalesced.operator = Operator.get(operator)
+    coalesced.value = value
+    return coalesced
+
+
+def _coalesce_and(filters):
+    members = None
+    excluded = {}
+    exclusions = []
+    not_null = []
+    lower = upper = None
+    for filter in filters:
+        operator = filter.operator.name
+        if operator == "is_null":
+            # a null field doesn't match any other filter
+            return [ConstantFilter(False, *filters)]
+        elif operator == "is_not_null":
+            not_null.append(filter)
+        elif operator in _MEMBERSHIPS:
+            values = [filter.value] if operator == "==" else filter.value
+            if members is None:
+                members = list(dict.fromkeys(values))
+            else:
+                values = set(values)
+                members = [value for value in members if value in values]
+        elif operator in _EXCLUSIONS:
+            values = [filter.value] if operator == "!=" else filter.value
+            excluded.update(dict.fromkeys(values))
+            exclusions.append(filter)
+        elif operator in _LOWER_BOUNDS:
+            bound = (filter.value, operator == ">")
+            if lower is None or _is_tighter_lower(bound, lower[0]):
+                lower = (bound, filter)
+        else:
+            bound = (filter.value, operator == "<")
+            if upper is None or _is_tighter_upper(bound, upper[0]):
+                upper = (bound, filter)
+
+    if lower is not None and upper is not None:
+        (low, low_strict), (high, high_strict) = lower[0], upper[0]
+        if low > high or (low == high and (low_strict or high_strict)):
+            return [ConstantFilter(False, *filters)]
+        if low == high:
+            members = [value for value in members or [low] if value == low]
+
+    if members is not None:
+        # the other filters are checked against the values
+        members = [value for value in members if value not in excluded]
+        if lower is not None:
+            members = [value for value in members if _above(value, lower[0])]
+        if upper is not None:
+            members = [value for value in members if _below(value, upper[0])]
+        if not members:
+            return [ConstantFilter(False, *filters)]
+        if len(members) == 1:
+            return [_coalesced_filter(filters[0], "==", members[0]), *not_null]
+        return [_coalesced_filter(filters[0], "in", members), *not_null]
+
+    if len(exclusions) > 1:
+        exclusions = [_coalesced_filter(exclusions[0], "not_in", list(excluded))]
+
+    if lower is not None and upper is not None:
+        (low, low_strict), (high, high_strict) = lower[0], upper[0]
+        if not low_strict and not high_strict:
+            between = _coalesced_filter(filters[0], _BETWEEN, (low, high))
+            return [between, *exclusions, *not_null]
+    bounds = [bound[1] for bound in (lower, upper) if bound is not None]
+    return [*bounds, *exclusions, *not_null]
+
+
+def _coalesce_or(filters):
+    members = None
+    lower = upper = None
+    for filter in filters:
+        operator = filter.operator.name
+        if operator in _MEMBERSHIPS:
+            values = [filter.value] if operator == "==" else filter.value
+            members = dict.fromkeys(chain(members or (), values))
+        elif operator in _LOWER_BOUNDS:
+            bound = (filter.value, operator == ">")
+            if lower is None or _is_tighter_lower(lower[0], bound):
+                lower = (bound, filter)
+        else:
+            bound = (filter.value, operator == "<")
+            if upper is None or _is_tighter_upper(upper[0], bound):
+                upper = (bound, filter)
+
+    coalesced = []
+    if members is not None:
+        members = list(members)
+        if len(members) == 1:
+            coalesced.append(_coalesced_filter(filters[0], "==", members[0]))
+        else:
+            coalesced.append(_coalesced_filter(filters[0], "in", members))
+    coalesced.extend(bound[1] for bound in (lower, upper) if bound is not None)
+    return coalesced
+
+
+def _is_tighter_lower(bound, other):
+    value, strict = bound
+    other_value = other[0]
+    return value > other_value or (value == other_value and strict)
+
+
+def _is_tighter_upper(bound, other):
+    value, strict = bound
+    other_value = other[0]
+    return value < other_value or (value == other_value and strict)
+
+
+def _above(value, bound):
+    bound_value, strict = bound
+    return value > bound_value if strict else value >= bound_value
+
+
+def _below(value, bound):
+    bound_value, strict = bound
+    return value < bound_value if strict else value <= bound_value
+
+
+def simplify_filters(filters, coalesce=True, context=None, default_model=None):
+    """Simplify a list of filters, as returned by :func:`build_filters`.
+
+    Nested `and` / `or` functions are flattened, functions with a single
+    argument are replaced by the argument, duplicated filters are removed
+    and `not(not(x))` becomes `x`. Filters that are known to be always true
+    or always false (e.g. `in` an empty list, or `==` two different values)
+    are folded into the functions that contain them.
+
+    If `coalesce` is true, the filters of an `and` / `or` function on the
+    same field are merged too: `==` and `in` filters into a single `in`,
+    and ranges into the tightest (or loosest) one, or a `between`, and the
+    filters that can't be true together (e.g. `==` two different values)
+    are folded. The values of a field are only compared if the field is a
+    column of a model of `context`, a :class:`ResolutionContext`, and if
+    they are of its Python type.
+
+    :returns:
+        A list of filters, to be combined with `and`.
+    """
+    get_python_type = None
+    if coalesce and context is not None:
+        get_python_type = _python_type_getter(context, default_model)
+    filter, _, _ = _simplify_arguments(
+        and_, filters, coalesce, get_python_type=get_python_type
+    )
+
+    if isinstance(filter, ConstantFilter) and filter.value:
+        # nothing to filter, but the filters are still validated
+        return [filter] if filter.filters else []
+    if isinstance(filter, BooleanFilter) and filter.function is and_:
+        return list(filter.filters)
+    return [filter]
 
 
 def get_named_models(filters):
@@ -201,6 +1253,12 @@ def apply_filters(
     stmt: Union[Select, Query],
     filter_spec: Union[Iterable[Dict[str, Any]], Dict[str, Any]],
     do_auto_join: bool = True,
+    context: Optional[ResolutionContext] = None,
+    cache: Optional[ExpressionCache] = None,
+    coalesce: bool = True,
+    relationship_filters: str = "join",
+    budget: Optional[SpecBudget] = None,
+    dialect: Any = None,
 ) -> Union[Select, Query]:
     """Apply filters to a SQLAlchemy query or Select object.
 
@@ -237,24 +1295,354 @@ def apply_filters(
     :param do_auto_join:
         Allow or not auto join.
 
+    :param context:
+        The :class:`sa_filters.models.ResolutionContext` of `stmt`, which
+        may be shared with other ``apply_*`` calls on the same statement.
+        A new one is created if not provided.
+
+    :param cache:
+        An optional :class:`sa_filters.cache.ExpressionCache` to reuse the
+        filters built for specs of the same structure.
+
+    :param coalesce:
+        Merge the filters on the same field into as few filters as
+        possible, e.g. `==` filters combined with `or` into a single `in`,
+        or `>=` and `<=` filters combined with `and` into a `between`, and
+        fold the filters that can't be true together (defaults to `True`).
+        See :func:`simplify_filters`.
+
+    :param relationship_filters:
+        How the filters on a model that is not in the query are applied,
+        when `do_auto_join` is true. With ``join`` (the default), the model
+        is joined to the query. With ``exists``, the filters that refer to
+        the model alone are checked with a correlated ``EXISTS`` instead,
+        so that the rows of the query are not repeated for each matching
+        row of the model. ``auto`` does the same only for the models that
+        may match several rows, e.g. through a one-to-many relationship.
+
+    :param budget:
+        An optional :class:`SpecBudget` the spec is checked against before
+        the filters are built.
+
+    :param dialect:
+        The :class:`sqlalchemy.engine.Dialect` the statement will be run
+        with, which chooses the implementations of the operators specific
+        to a dialect, as for :class:`sa_filters.models.ResolutionContext`.
+        Ignored if `context` is given.
+
     :returns:
         The :class:`sqlalchemy.sql.Select` object or
         the :class:`sqlalchemy.orm.Query` object
         after all the filters have been applied.
+
+    :raise SpecTooComplex:
+        If the spec exceeds a limit of `budget`.
     """
-    filters = build_filters(filter_spec)
+    if context is None:
+        context = ResolutionContext(stmt, dialect)
 
-    default_model = get_default_model(stmt)
+    filter_models, format_filters = _build_sqlalchemy_filters(
+        filter_spec,
+        context,
+        context.default_model,
+        do_auto_join,
+        cache,
+        coalesce,
+        relationship_filters,
+        budget=budget,
+    )
 
-    filter_models = get_named_models(filters)
     if do_auto_join:
-        stmt = auto_join(stmt, *filter_models)
-
-    sqlalchemy_filters = [
-        filter.format_for_sqlalchemy(stmt, default_model) for filter in filters
-    ]
+        stmt = auto_join(stmt, *filter_models, context=context)
 
+    sqlalchemy_filters = format_filters()
     if sqlalchemy_filters:
         stmt = stmt.filter(*sqlalchemy_filters)
 
     return stmt
+
+
+RELATIONSHIP_FILTERS = ("join", "exists", "auto")
+
+
+def _use_exists(filters, context, named_models, relationship_filters, joined_models):
+    """Replace the filters on each model that is not in the query by an
+    :class:`ExistsFilter`, when all the filters of `filters` that refer to
+    the model refer to it alone.
+
+    Models in `joined_models` are joined anyway, so their filters are left
+    as they are, and so are the ones of models that are named by filters
+    that have been simplified away. With ``auto`` `relationship_filters`,
+    only the models that may match several rows for each row of the query
+    are checked with ``EXISTS``.
+
+    :returns:
+        A 2-tuple with the new list of filters and the names of the models
+        that don't need to be joined any more.
+    """
+    other_models = set(joined_models)
+    other_models.update(named_models - get_named_models(filters))
+
+    filters_by_model = {}
+    for filter in filters:
+        models = filter.get_named_models()
+        if len(models) == 1:
+            (model_name,) = models
+            filters_by_model.setdefault(model_name, []).append(filter)
+        else:
+            other_models.update(models)
+
+    exists_filters = {}
+    for model_name, model_filters in filters_by_model.items():
+        if model_name in other_models:
+            continue
+        path = get_join_path(
+            context, model_name, to_many_only=relationship_filters == "auto"
+        )
+        if path:
+            exists_filters[model_name] = ExistsFilter(path, *model_filters)
+
+    if not exists_filters:
+        return filters, set()
+
+    new_filters = []
+    for filter in filters:
+        models = filter.get_named_models()
+        model_name = next(iter(models)) if len(models) == 1 else None
+        if model_name not in exists_filters:
+            new_filters.append(filter)
+        elif exists_filters[model_name].filters[0] is filter:
+            new_filters.append(exists_filters[model_name])
+    return new_filters, set(exists_filters)
+
+
+def is_known_empty(stmt: Union[Select, Query]) -> bool:
+    """Return whether the filters of `stmt` are known to match no rows.
+
+    That is the case when :func:`apply_filters` finds filters that can never
+    be true, such as `in` an empty list, `==` two different values or an
+    empty range on the same field: the whole filter spec is replaced by
+    `false()`, and the statement doesn't need to be executed.
+
+    :param stmt:
+        A :class:`sqlalchemy.sql.Select` object or
+        a :class:`sqlalchemy.orm.Query` object.
+    """
+    whereclause = stmt.whereclause
+    # the clause may be wrapped to be used as a boolean
+    whereclause = getattr(whereclause, "element", whereclause)
+    return isinstance(whereclause, False_)
+
+
+def _build_sqlalchemy_filters(
+    filter_spec,
+    context,
+    default_model,
+    do_auto_join,
+    cache,
+    coalesce=True,
+    relationship_filters="join",
+    joined_models=(),
+    budget=None,
+):
+    """Build the filters of `filter_spec`, or take them from `cache`.
+
+    `joined_models` are the names of the models that will be joined to the
+    query for other reasons than these filters. `filter_spec` is checked
+    against `budget` first, if any.
+
+    :returns:
+        A 2-tuple with the names of the models the filters refer to, which
+        have to be joined first, and a function that returns the SQLAlchemy
+        filters once they have been.
+    """
+    if relationship_filters not in RELATIONSHIP_FILTERS:
+        raise ValueError(
+            "Relationship filters should be one of {}: {}".format(
+                RELATIONSHIP_FILTERS, relationship_filters
+            )
+        )
+
+    # the spec is walked more than once, so an iterator has to be read first
+    if _is_iterable_filter(filter_spec):
+        filter_spec = list(filter_spec)
+
+    if budget is not None:
+        budget.check(filter_spec, context)
+
+    cache_key = cached = values = None
+    if cache is not None:
+        canonical, leaves = _canonical_filter(filter_spec, False)
+        values = {
+            _value_param_name(position): leaf["value"]
+            for position, leaf in enumerate(leaves)
+        }
+        if all(_is_cacheable_value(value) for value in values.values()):
+            cache_key = (
+                "filters",
+                frozenset(context.models.values()),
+                getattr(context.dialect, "name", None),
+                do_auto_join,
+                coalesce,
+                relationship_filters,
+                frozenset(joined_models),
+                canonical,
+            )
+            cached = cache.get(cache_key)
+            filter_spec = _replace_values(filter_spec, leaves)
+
+    if cached is None:
+        filters = build_filters(filter_spec)
+        # the models are taken before simplifying, as the joins they require
+        # may change the results even if their filters are folded
+        filter_models = get_named_models(filters)
+        filters = simplify_filters(filters, coalesce, context, default_model)
+        if do_auto_join and relationship_filters != "join":
+            filters, exists_models = _use_exists(
+                filters, context, filter_models, relationship_filters, joined_models
+            )
+            filter_models -= exists_models
+    else:
+        filter_models = cached[0]
+
+    def format_filters():
+        if cached is None:
+            sqlalchemy_filters = [
+                filter.format_for_sqlalchemy(context, default_model)
+                for filter in filters
+            ]
+            # filters that always match are left out once they are validated
+            sqlalchemy_filters = [
+                sqlalchemy_filter
+                for sqlalchemy_filter in sqlalchemy_filters
+                if not isinstance(sqlalchemy_filter, True_)
+            ]
+            if cache_key is not None:
+                cache.put(cache_key, (filter_models, sqlalchemy_filters))
+        else:
+            sqlalchemy_filters = cached[1]
+
+        if cache_key is not None and values:
+            # constants, e.g. folded filters, have no parameters and can't
+            # be copied
+            sqlalchemy_filters = [
+                sqlalchemy_filter
+                if isinstance(sqlalchemy_filter, Immutable)
+                else sqlalchemy_filter.unique_params(values)
+                for sqlalchemy_filter in sqlalchemy_filters
+            ]
+        return sqlalchemy_filters
+
+    return filter_models, format_filters
+
+
+def _is_cacheable_value(value):
+    """Return whether `value` may be bound to the filters built for other
+    values of a spec of the same structure.
+
+    SQL expressions can't be bound, and the filters of empty lists, which
+    are folded, and of lists above :data:`LARGE_IN_THRESHOLD`, which are
+    bound another way, depend on the value.
+    """
+    if isinstance(value, ClauseElement):
+        return False
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return 0 < len(value) <= LARGE_IN_THRESHOLD
+    return True
+
+
+class FilterPlan(object):
+    """Filters built once and applied many times with different values.
+
+    The statement of a plan holds a named bind parameter in place of each
+    filter value, so applying the plan only substitutes the parameters: no
+    filters are built again, and SQLAlchemy_ finds the statement in its
+    compiled cache every time.
+
+    .. _SQLAlchemy: https://www.sqlalchemy.org/
+    """
+
+    def __init__(self, statement, params):
+        self.statement = statement
+        self.params = params
+
+    def apply(self, values):
+        """Return the statement of the plan with `values` bound to it.
+
+        :param values:
+            A dict with a value for every parameter of the plan.
+
+        :raise BadFilterFormat:
+            If a parameter of the plan has no value.
+        """
+        missing = [name for name in self.params if name not in values]
+        if missing:
+            raise BadFilterFormat(
+                "Missing value for parameter `{}`.".format(missing[0])
+            )
+        return self.statement.params(values)
+
+
+def _bind_params(spec_shape, params):
+    """Return a copy of `spec_shape` where every ``param`` is replaced by a
+    ``value`` holding a bind parameter of that name.
+    """
+
+    def bind_param(spec):
+        if "param" not in spec:
+            return spec
+        spec = dict(spec)
+        name = spec.pop("param")
+        if name not in params:
+            params.append(name)
+        spec["value"] = bindparam(name)
+        return spec
+
+    return _map_filter_specs(spec_shape, bind_param)
+
+
+def compile_filters(
+    model_or_stmt: Any,
+    spec_shape: Union[Iterable[Dict[str, Any]], Dict[str, Any]],
+    do_auto_join: bool = True,
+) -> FilterPlan:
+    """Build the filters of a spec once, to be applied with many values.
+
+    :param model_or_stmt:
+        A model, or the :class:`sqlalchemy.sql.Select` object or
+        the :class:`sqlalchemy.orm.Query` object to be filtered.
+
+    :param spec_shape:
+        A filter spec as accepted by :func:`apply_filters`, where the
+        filters with a variable value name a bind parameter with ``param``
+        instead of giving a ``value``.
+
+        Example::
+
+            spec_shape = [
+                {'field': 'name', 'op': '==', 'param': 'name'},
+                {'model': 'Bar', 'field': 'count', 'op': '>=', 'param': 'count'},
+            ]
+
+    :param do_auto_join:
+        Allow or not auto join.
+
+    :returns:
+        A :class:`FilterPlan`.
+
+    Basic usage::
+
+        >>> plan = compile_filters(Foo, spec_shape)
+        >>> stmt = plan.apply({'name': 'name_1', 'count': 5})
+        >>> result = session.execute(stmt).all()
+    """
+    if isinstance(model_or_stmt, (Select, Query)):
+        stmt = model_or_stmt
+    else:
+        stmt = select(model_or_stmt)
+
+    params = []
+    filter_spec = _bind_params(spec_shape, params)
+    stmt = apply_filters(stmt, filter_spec, do_auto_join=do_auto_join)
+
+    return FilterPlan(stmt, tuple(params))
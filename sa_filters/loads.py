@@ -1,16 +1,17 @@
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Union
 
 from sqlalchemy.orm import Load, Query
 from sqlalchemy.sql import Select
 
+from .cache import ExpressionCache
 from .exceptions import BadLoadFormat
-from .models import Field, auto_join, get_default_model, get_model_from_spec
+from .models import Field, ResolutionContext, auto_join, get_model
 
 
 class LoadOnly(object):
-    def __init__(self, load_spec):
-        self.load_spec = load_spec
+    __slots__ = ("model", "table", "field_names")
 
+    def __init__(self, load_spec):
         try:
             field_names = load_spec["fields"]
         except KeyError:
@@ -20,18 +21,19 @@ class LoadOnly(object):
                 "Load spec `{}` should be a dictionary.".format(load_spec)
             ) from None
 
+        self.model = load_spec.get("model")
+        self.table = load_spec.get("table")
         self.field_names = field_names
 
     def get_named_models(self):
-        if "model" in self.load_spec:
-            return {self.load_spec["model"]}
+        if self.model is not None:
+            return {self.model}
         return set()
 
     def format_for_sqlalchemy(self, query, default_model):
-        load_spec = self.load_spec
         field_names = self.field_names
 
-        model = get_model_from_spec(load_spec, query, default_model)
+        model = get_model(query, self.model, self.table, default_model)
         fields = [Field(model, field_name) for field_name in field_names]
 
         return Load(model).load_only(
@@ -39,6 +41,27 @@ class LoadOnly(object):
         )
 
 
+def _canonical_load(load_spec):
+    if isinstance(load_spec, list) and all(
+        map(lambda item: isinstance(item, str), load_spec)
+    ):
+        load_spec = {"fields": load_spec}
+    if isinstance(load_spec, dict):
+        load_spec = [load_spec]
+
+    loads = []
+    for item in load_spec:
+        if isinstance(item, dict):
+            item = {
+                key: sorted(value) if key == "fields" else value
+                for key, value in item.items()
+            }
+            loads.append(repr(sorted(item.items())))
+        else:
+            loads.append(repr(item))
+    return "load({})".format(",".join(sorted(loads)))
+
+
 def get_named_models(loads):
     models = set()
     for load in loads:
@@ -49,6 +72,8 @@ def get_named_models(loads):
 def apply_loads(
     stmt: Union[Select, Query],
     load_spec: Union[List[Dict[str, Any]], Dict[str, Any], List[str]],
+    context: Optional[ResolutionContext] = None,
+    cache: Optional[ExpressionCache] = None,
 ) -> Union[Select, Query]:
     """Apply load restrictions to a :class:`sqlalchemy.sql.Select` object
     or a :class:`sqlalchemy.orm.Query` object.
@@ -73,11 +98,44 @@ def apply_loads(
 
             load_spec = ['id', 'name']
 
+    :param context:
+        The :class:`sa_filters.models.ResolutionContext` of `stmt`, which
+        may be shared with other ``apply_*`` calls on the same statement.
+        A new one is created if not provided.
+
+    :param cache:
+        An optional :class:`sa_filters.cache.ExpressionCache` to reuse the
+        load options built for specs of the same structure.
+
     :returns:
         The :class:`sqlalchemy.sql.Select` object or
         a :class:`sqlalchemy.orm.Query` object
         after the load restrictions have been applied.
     """
+    if context is None:
+        context = ResolutionContext(stmt)
+
+    load_models, format_loads = _build_sqlalchemy_loads(
+        load_spec, context, context.default_model, cache
+    )
+
+    stmt = auto_join(stmt, *load_models, context=context)
+
+    sqlalchemy_loads = format_loads()
+    if sqlalchemy_loads:
+        stmt = stmt.options(*sqlalchemy_loads)
+
+    return stmt
+
+
+def _build_sqlalchemy_loads(load_spec, context, default_model, cache):
+    """Build the load options of `load_spec`, or take them from `cache`.
+
+    :returns:
+        A 2-tuple with the names of the models the options refer to, which
+        have to be joined first, and a function that returns the SQLAlchemy
+        options once they have been.
+    """
     if isinstance(load_spec, list) and all(
         map(lambda item: isinstance(item, str), load_spec)
     ):
@@ -86,17 +144,28 @@ def apply_loads(
     if isinstance(load_spec, dict):
         load_spec = [load_spec]
 
-    loads = [LoadOnly(item) for item in load_spec]
+    cache_key = cached = None
+    if cache is not None:
+        cache_key = (
+            "loads",
+            frozenset(context.models.values()),
+            _canonical_load(load_spec),
+        )
+        cached = cache.get(cache_key)
 
-    default_model = get_default_model(stmt)
+    if cached is not None:
+        load_models, sqlalchemy_loads = cached
+        return load_models, lambda: sqlalchemy_loads
 
+    loads = [LoadOnly(item) for item in load_spec]
     load_models = get_named_models(loads)
-    stmt = auto_join(stmt, *load_models)
 
-    sqlalchemy_loads = [
-        load.format_for_sqlalchemy(stmt, default_model) for load in loads
-    ]
-    if sqlalchemy_loads:
-        stmt = stmt.options(*sqlalchemy_loads)
+    def format_loads():
+        sqlalchemy_loads = [
+            load.format_for_sqlalchemy(context, default_model) for load in loads
+        ]
+        if cache_key is not None:
+            cache.put(cache_key, (load_models, sqlalchemy_loads))
+        return sqlalchemy_loads
 
-    return stmt
+    return load_models, format_loads
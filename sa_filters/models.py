@@ -1,36 +1,94 @@
+import threading
 import types
+from collections import deque, namedtuple
 
-from sqlalchemy import Table
-from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy import Table, event
+from sqlalchemy.exc import ArgumentError, UnboundExecutionError
 from sqlalchemy.ext.hybrid import hybrid_method, hybrid_property
 from sqlalchemy.inspection import inspect
-from sqlalchemy.orm import Query, mapperlib
-from sqlalchemy.sql.util import find_tables
+from sqlalchemy.orm import Mapper, Query, configure_mappers, mapperlib
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BooleanClauseList, ColumnClause
+from sqlalchemy.sql.util import find_tables, join_condition
 
 from .exceptions import BadQuery, BadSpec, FieldNotFound
 
 
 class Field(object):
+    __slots__ = ("model", "field_name")
+
     def __init__(self, model, field_name):
         self.model = model
         self.field_name = field_name
 
     def get_sqlalchemy_field(self):
-        if self.field_name not in self._get_valid_field_names():
-            raise FieldNotFound(
-                "Model {} has no column `{}`.".format(self.model, self.field_name)
-            )
-        sqlalchemy_field = getattr(self.model, self.field_name)
+        return _get_model_fields(self.model).get(self.field_name)
 
-        # If it's a hybrid method, then we call it so that we can work with
-        # the result of the execution and not with the method object itself
-        if isinstance(sqlalchemy_field, types.MethodType):
-            sqlalchemy_field = sqlalchemy_field()
 
-        return sqlalchemy_field
+class FieldPath(object):
+    """A field reached from a model through its relationships, such as
+    ``bar.name`` from ``Foo``.
+
+    :param relationships:
+        The relationship attributes followed from the first model.
+
+    :param model:
+        The model the field belongs to.
+
+    :param field_name:
+        The name of the field on `model`.
+    """
+
+    __slots__ = ("relationships", "model", "field_name")
+
+    def __init__(self, relationships, model, field_name):
+        self.relationships = relationships
+        self.model = model
+        self.field_name = field_name
+
+    def format_for_sqlalchemy(self, function):
+        """Return the SQL expression `function` builds from the field, for
+        any related row, through ``any()`` or ``has()`` on each relationship.
+        """
+        field = Field(self.model, self.field_name).get_sqlalchemy_field()
+        criterion = function(field)
+        for relationship in reversed(self.relationships):
+            if relationship.property.uselist:
+                criterion = relationship.any(criterion)
+            else:
+                criterion = relationship.has(criterion)
+        return criterion
+
+
+def get_field_path(model, path):
+    """Return the :class:`FieldPath` of the dotted `path` from `model`.
+
+    Each path is resolved once per model.
+
+    :raise FieldNotFound:
+        If a name of `path` is not a relationship, or the last one is not a
+        field, of the model it applies to.
+    """
+    return _get_model_fields(model).get_path(path)
+
+
+def _get_model_fields(model):
+    try:
+        return _field_cache[model]
+    except KeyError:
+        fields = _field_cache[model] = _ModelFields(model)
+    return fields
+
+
+class _ModelFields(object):
+    """The fields that specs may refer to on a single model.
 
-    def _get_valid_field_names(self):
-        inspect_mapper = inspect(self.model)
+    Valid names are collected once per model, and each field is resolved the
+    first time it is requested, so later lookups are a single dict access.
+    """
+
+    def __init__(self, model):
+        inspect_mapper = inspect(model)
         columns = inspect_mapper.columns
         orm_descriptors = inspect_mapper.all_orm_descriptors
 
@@ -41,17 +99,270 @@ class Field(object):
             if type(item) in [hybrid_property, hybrid_method]
         ]
 
-        return set(column_names) | set(hybrid_names)
+        self.model = model
+        self.names = set(column_names) | set(hybrid_names)
+        self.resolved = {}
+        self.paths = {}
 
+    def get(self, field_name):
+        try:
+            return self.resolved[field_name]
+        except KeyError:
+            pass
 
-def get_model_from_table(table):  # pragma: nocover
-    """Resolve model class from table object"""
+        if field_name not in self.names:
+            raise FieldNotFound(
+                "Model {} has no column `{}`.".format(self.model, field_name)
+            )
+        sqlalchemy_field = getattr(self.model, field_name)
 
-    for registry in mapperlib._all_registries():
-        for mapper in registry.mappers:
-            if table in mapper.tables:
-                return mapper.class_
-    return None
+        # If it's a hybrid method, then we call it so that we can work with
+        # the result of the execution and not with the method object itself
+        if isinstance(sqlalchemy_field, types.MethodType):
+            sqlalchemy_field = sqlalchemy_field()
+
+        self.resolved[field_name] = sqlalchemy_field
+        return sqlalchemy_field
+
+    def get_path(self, path):
+        try:
+            return self.paths[path]
+        except KeyError:
+            pass
+
+        relationships = []
+        model = self.model
+        *relationship_names, field_name = path.split(".")
+        for name in relationship_names:
+            prop = inspect(model).relationships.get(name)
+            if prop is None:
+                raise FieldNotFound(
+                    "Model {} has no relationship `{}`.".format(model, name)
+                )
+            relationships.append(prop.class_attribute)
+            model = prop.mapper.class_
+
+        # the field is checked now, so that invalid paths are never cached
+        _get_model_fields(model).get(field_name)
+
+        field_path = FieldPath(tuple(relationships), model, field_name)
+        self.paths[path] = field_path
+        return field_path
+
+
+_Index = namedtuple(
+    "_Index", ["mappers", "mappers_by_table", "classes_by_tablename", "classes_by_name"]
+)
+
+
+class _RegistryIndex(object):
+    """Lookup tables over the mappers of every registry.
+
+    The index is built on first use and cleared whenever a mapper is
+    instrumented or configured, or a class is disposed of (e.g. by
+    ``registry.dispose()`` or ``clear_mappers()``), so lookups are plain
+    dict accesses instead of a walk over every mapper of every registry.
+
+    The tables are built apart and published at once, and only if the
+    index hasn't been cleared meanwhile, e.g. by another thread mapping a
+    model, so that a stale index is never kept.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._index = None
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._index = None
+
+    def _get_index(self):
+        index = self._index
+        if index is not None:
+            return index
+
+        with self._lock:
+            generation = self._generation
+        index = self._build()
+        with self._lock:
+            if self._generation == generation:
+                self._index = index
+        return index
+
+    def _build(self):
+        index = _Index([], {}, {}, {})
+        for registry in mapperlib._all_registries():
+            names = index.classes_by_name.setdefault(id(registry._class_registry), {})
+            for mapper in registry.mappers:
+                index.mappers.append(mapper)
+                model = mapper.class_
+                for table in mapper.tables:
+                    index.mappers_by_table.setdefault(table, mapper)
+                tablename = getattr(model, "__tablename__", None)
+                index.classes_by_tablename.setdefault(tablename, model)
+                names.setdefault(model.__name__, model)
+        return index
+
+    def mappers(self):
+        return self._get_index().mappers
+
+    def mapper_for_table(self, table):
+        return self._get_index().mappers_by_table.get(table)
+
+    def class_for_tablename(self, tablename):
+        return self._get_index().classes_by_tablename.get(tablename)
+
+    def classes_by_name(self, class_registry):
+        return self._get_index().classes_by_name.get(id(class_registry))
+
+
+class _JoinGraph(object):
+    """The models that may be joined to each other, and how.
+
+    Two models are connected when the foreign keys between their tables give
+    a single join condition or, failing that, when the relationships between
+    them that don't go through a secondary table all have the same one.
+    The graph is built on first use and cleared with the other mapper caches,
+    so whether a join is possible can be told without compiling anything.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self._built = False
+        self._edges = {}
+        self._paths = {}
+
+    def _add_edge(self, left, right, onclause):
+        self._edges.setdefault(left, {})[right] = onclause
+        self._edges.setdefault(right, {})[left] = onclause
+
+    def _build(self):
+        # relationships are only known once the mappers are configured, and
+        # configuring them clears this graph, so it has to happen first
+        configure_mappers()
+
+        fk_pairs = {}
+        for mapper in _registry_index.mappers():
+            for table in mapper.tables:
+                for fk in table.foreign_keys:
+                    other = _registry_index.mapper_for_table(fk.column.table)
+                    if other is not None:
+                        key = (mapper.class_, other.class_)
+                        fk_pairs.setdefault(key, (fk.parent.table, fk.column.table))
+
+        edges = {}
+        for (left, right), (left_table, right_table) in fk_pairs.items():
+            try:
+                onclause = join_condition(left_table, right_table)
+            except ArgumentError:
+                onclause = None  # ambiguous, can't be joined implicitly
+            edges.setdefault(frozenset((left, right)), onclause)
+
+        relationships = {}
+        for mapper in _registry_index.mappers():
+            for prop in mapper.relationships:
+                if prop.secondary is None:
+                    key = frozenset((mapper.class_, prop.mapper.class_))
+                    relationships.setdefault(key, []).append(prop.primaryjoin)
+
+        for key, (onclause, *others) in relationships.items():
+            # several relationships with different conditions are ambiguous,
+            # but the two sides of a single one are not
+            if edges.get(key) is None and all(
+                onclause.compare(other) for other in others
+            ):
+                edges[key] = onclause
+
+        for key, onclause in edges.items():
+            if onclause is not None and len(key) == 2:
+                self._add_edge(*key, onclause)
+        self._built = True
+
+    def neighbours(self, model):
+        """Return a dict of the models `model` can be joined to, with the
+        join condition of each.
+        """
+        if not self._built:
+            self._build()
+        return self._edges.get(model, {})
+
+    def find_path(self, models, target):
+        """Return the shortest path joining `target` to `models`.
+
+        The path is a tuple of ``(model, onclause)`` hops, in the order they
+        have to be joined, ending with `target`. `None` is returned if
+        `target` can't be reached from `models`, or if there is more than
+        one shortest path to it. Paths are cached per set of models.
+        """
+        key = (frozenset(models), target)
+        try:
+            return self._paths[key]
+        except KeyError:
+            pass
+
+        path = self._plan(key[0], target)
+        self._paths[key] = path
+        return path
+
+    def _plan(self, models, target):
+        distances = dict.fromkeys(models, 0)
+        counts = dict.fromkeys(models, 1)
+        parents = {}
+        queue = deque(models)
+
+        while queue:
+            model = queue.popleft()
+            if target in distances and distances[model] >= distances[target]:
+                break
+            for neighbour, onclause in self.neighbours(model).items():
+                if neighbour not in distances:
+                    distances[neighbour] = distances[model] + 1
+                    counts[neighbour] = counts[model]
+                    parents[neighbour] = (model, onclause)
+                    queue.append(neighbour)
+                elif distances[neighbour] == distances[model] + 1:
+                    counts[neighbour] += counts[model]
+
+        if target not in parents or counts[target] > 1:
+            return None
+
+        path = []
+        model = target
+        while model in parents:
+            parent, onclause = parents[model]
+            path.append((model, onclause))
+            model = parent
+        return tuple(reversed(path))
+
+
+_registry_index = _RegistryIndex()
+_field_cache = {}
+_join_graph = _JoinGraph()
+
+
+def _clear_mapper_caches(*args):
+    """Forget everything derived from the mappers, as they have changed."""
+    _registry_index.clear()
+    _field_cache.clear()
+    _join_graph.clear()
+
+
+event.listen(Mapper, "instrument_class", _clear_mapper_caches)
+event.listen(Mapper, "mapper_configured", _clear_mapper_caches)
+# disposed registries don't tell their mappers, only their classes
+event.listen(object, "class_uninstrument", _clear_mapper_caches, propagate=True)
+
+
+def get_model_from_table(table):
+    """Resolve model class from table object"""
+    mapper = _registry_index.mapper_for_table(table)
+    if mapper is None:
+        return None
+    return mapper.class_
 
 
 def get_class_by_tablename(tablename):
@@ -60,12 +371,7 @@ def get_class_by_tablename(tablename):
     :param tablename: String with name of table.
     :return: Class reference or None.
     """
-    for registry in mapperlib._all_registries():
-        for mapper in registry.mappers:
-            model = mapper.class_
-            if model.__tablename__ == tablename:
-                return model
-    return None
+    return _registry_index.class_for_tablename(tablename)
 
 
 def get_query_models(query):
@@ -94,6 +400,63 @@ def get_query_models(query):
     return {model.__name__: model for model in models if model}
 
 
+class ResolutionContext(object):
+    """The models of a statement, resolved once.
+
+    Finding the models of a statement means walking all of it, so the
+    ``apply_*`` functions do it once and share the result through a context.
+    :func:`auto_join` keeps it up to date as models are joined in, which
+    means the same context may be passed along to several ``apply_*`` calls
+    on the same statement.
+
+    Example::
+
+        context = ResolutionContext(stmt)
+        stmt = apply_filters(stmt, filter_spec, context=context)
+        stmt = apply_sort(stmt, sort_spec, context=context)
+
+    :param stmt:
+        A :class:`sqlalchemy.sql.Select` or a
+        :class:`sqlalchemy.orm.Query` instance.
+
+    :param dialect:
+        The :class:`sqlalchemy.engine.Dialect` the statement will be run
+        with, if known. Defaults to the dialect of the session of a
+        :class:`sqlalchemy.orm.Query` with a bound session.
+    """
+
+    def __init__(self, stmt, dialect=None):
+        self.models = get_query_models(stmt)
+        if dialect is None and isinstance(stmt, Query):
+            dialect = _get_query_dialect(stmt)
+        self.dialect = dialect
+
+    @property
+    def default_model(self):
+        if len(self.models) == 1:
+            (default_model,) = self.models.values()
+            return default_model
+        return None
+
+    def add_model(self, model):
+        self.models[model.__name__] = model
+
+
+def _get_query_dialect(query):
+    if query.session is None:
+        return None
+    try:
+        return query.session.get_bind().dialect
+    except UnboundExecutionError:
+        return None
+
+
+def _get_context(query):
+    if isinstance(query, ResolutionContext):
+        return query
+    return ResolutionContext(query)
+
+
 def get_model_from_spec(spec, query, default_model=None):
     """Determine the model to which a spec applies on a given query.
 
@@ -102,7 +465,8 @@ def get_model_from_spec(spec, query, default_model=None):
     which it applies, and that model must be present in the query.
 
     :param query:
-        A :class:`sqlalchemy.orm.Query` instance.
+        A :class:`sqlalchemy.orm.Query` instance, or the
+        :class:`ResolutionContext` of one.
 
     :param spec:
         A dictionary that may or may not contain a model name to resolve
@@ -118,23 +482,29 @@ def get_model_from_spec(spec, query, default_model=None):
         If the query contains no models.
 
     """
-    models = get_query_models(query)
+    return get_model(query, spec.get("model"), spec.get("table"), default_model)
+
+
+def get_model(query, model_name=None, table_name=None, default_model=None):
+    """Determine the model named `model_name`, or mapped to the table
+    `table_name`, on a given query, as :func:`get_model_from_spec` does for
+    a spec with these ``model`` and ``table`` keys.
+    """
+    models = _get_context(query).models
     if not models:
         raise BadQuery("The query does not contain any models.")
 
-    model_name = spec.get("model")
-    if "table" in spec:
-        model = get_class_by_tablename(spec.get("table"))
+    if table_name is not None:
+        model = get_class_by_tablename(table_name)
         model_name = model.__name__
 
     if model_name is not None:
-        models = [v for (k, v) in models.items() if k == model_name]
-        if not models:
+        model = models.get(model_name)
+        if model is None:
             raise BadSpec("The query does not contain model `{}`.".format(model_name))
-        model = models[0]
     else:
         if len(models) == 1:
-            model = list(models.values())[0]
+            (model,) = models.values()
         elif default_model is not None:
             return default_model
         else:
@@ -145,6 +515,10 @@ def get_model_from_spec(spec, query, default_model=None):
 
 def get_model_class_by_name(registry, name):
     """Return the model class matching `name` in the given `registry`."""
+    classes = _registry_index.classes_by_name(registry)
+    if classes is not None:
+        return classes.get(name)
+
     for cls in registry.values():
         if getattr(cls, "__name__", None) == name:
             return cls
@@ -153,36 +527,102 @@ def get_model_class_by_name(registry, name):
 def get_default_model(query):
     """Return the singular model from `query`, or `None` if `query` contains
     multiple models.
+
+    `query` may also be the :class:`ResolutionContext` of a query.
     """
-    query_models = get_query_models(query).values()
-    if len(query_models) == 1:
-        (default_model,) = iter(query_models)
-    else:
-        default_model = None
-    return default_model
+    return _get_context(query).default_model
+
+
+def _get_join_path(context, model_name):
+    # every model has access to the registry, so we can use any from the query
+    model_registry = list(context.models.values())[-1].registry._class_registry
+
+    model = get_model_class_by_name(model_registry, model_name)
+    if model and context.models.get(model.__name__) is not model:
+        return _join_graph.find_path(context.models.values(), model)
+    return None
+
+
+def _is_same_table(table, other):
+    """Return whether `table` and `other` are the same table or alias, even
+    if one of them is annotated by the ORM.
+    """
+    return table.is_derived_from(other) and other.is_derived_from(table)
+
+
+def _is_to_one(primary_key, onclause):
+    """Return whether `onclause` matches at most one row of the table of
+    `primary_key`, i.e. whether its conditions combined with `and` include
+    one that each column of `primary_key` is equal to something.
+    """
+    clauses = [onclause]
+    if isinstance(onclause, BooleanClauseList) and onclause.operator is operators.and_:
+        clauses = onclause.clauses
+
+    columns = []
+    for clause in clauses:
+        if isinstance(clause, BinaryExpression) and clause.operator is operators.eq:
+            columns.extend(
+                element
+                for element in (clause.left, clause.right)
+                if isinstance(element, ColumnClause) and element.table is not None
+            )
+    primary_key = list(primary_key)
+    return bool(primary_key) and all(
+        any(
+            column.name == other.name and _is_same_table(column.table, other.table)
+            for other in columns
+        )
+        for column in primary_key
+    )
 
 
-def auto_join(query, *model_names):
+def get_join_path(context, model_name, to_many_only=False):
+    """Return the path :func:`auto_join` would follow to join the model
+    named `model_name` to the models of `context`.
+
+    :param context:
+        A :class:`ResolutionContext`.
+
+    :param to_many_only:
+        Only return a path if joining it may match several rows for each
+        row of the query, e.g. through a one-to-many relationship.
+
+    :returns:
+        A tuple of ``(model, onclause)`` hops, ending with the model, or
+        `None` if the model is already in the query or can't be joined
+        implicitly.
+    """
+    if not context.models:
+        return None
+
+    path = _get_join_path(context, model_name)
+    if path and to_many_only:
+        if all(
+            _is_to_one(inspect(model).primary_key, onclause) for model, onclause in path
+        ):
+            return None
+    return path
+
+
+def auto_join(query, *model_names, context=None):
     """Automatically join models to `query` if they're not already present
     and the join can be done implicitly.
+
+    A model can be joined implicitly when there is a single shortest path to
+    it from the models in `query`, following foreign keys and relationships.
+    Every model along the path is joined, each with an explicit ON clause.
+
+    If a :class:`ResolutionContext` of `query` is given, it is used instead
+    of walking `query` again, and the joined models are added to it.
     """
-    # every model has access to the registry, so we can use any from the query
-    query_models = get_query_models(query).values()
-    model_registry = list(query_models)[-1].registry._class_registry
+    if context is None:
+        context = ResolutionContext(query)
+    if not context.models:
+        return query
 
     for name in model_names:
-        model = get_model_class_by_name(model_registry, name)
-        if model and (model not in get_query_models(query).values()):
-            try:
-                # https://docs.sqlalchemy.org/en/14/changelog/migration_14.html
-                # Many Core and ORM statement objects now perform much of
-                # their construction and validation in the compile phase
-                tmp = query.join(model)
-                if isinstance(query, Query):
-                    tmp.statement.compile()
-                else:
-                    tmp.compile()
-                query = tmp
-            except InvalidRequestError:
-                pass  # can't be autojoined
+        for hop, onclause in _get_join_path(context, name) or ():
+            query = query.join(hop, onclause)
+            context.add_model(hop)
     return query
@@ -1,24 +1,88 @@
 # -*- coding: utf-8 -*-
+import base64
+import binascii
+import datetime
 import math
+import struct
+import uuid
 from collections import namedtuple
-from typing import Optional, Union
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Union
 
+from sqlalchemy import (
+    and_,
+    false,
+    func,
+    inspect,
+    literal_column,
+    or_,
+    select,
+    tuple_,
+)
+from sqlalchemy.engine import Result, Row
 from sqlalchemy.orm import Query
+from sqlalchemy.orm.interfaces import LoaderOption
 from sqlalchemy.sql import Select
+from sqlalchemy.sql.selectable import Join
+from sqlalchemy.sql.util import find_tables
+
+from .exceptions import BadSortFormat, InvalidCursor, InvalidPage
+from .filters import get_spec_fingerprint, is_known_empty
+from .models import (
+    Field,
+    ResolutionContext,
+    _is_same_table,
+    _is_to_one,
+    get_model,
+)
+from .sorting import SORT_ASCENDING, SORT_DESCENDING, Sort, apply_sort
+
+
+class Pagination(
+    namedtuple("Pagination", ["page_number", "page_size", "num_pages", "total_results"])
+):
+    __slots__ = ()
+
+    is_capped = False
+    """Whether there are more results than ``total_results``, which is then
+    the cap of the count, see :class:`CappedPagination`.
+    """
+
+
+class CappedPagination(Pagination):
+    """The pagination of results that were counted up to a cap, and found
+    to be more than the cap. ``total_results`` is the cap, and ``num_pages``
+    the number of pages of the cap.
+    """
+
+    __slots__ = ()
 
-from .exceptions import InvalidPage
+    is_capped = True
 
 
-Pagination = namedtuple(
-    "Pagination", ["page_number", "page_size", "num_pages", "total_results"]
+KeysetPagination = namedtuple(
+    "KeysetPagination", ["page_size", "next_key", "previous_key"]
 )
 
+NULLS_LARGEST_DIALECTS = ("oracle", "postgresql")
+"""Dialects where nulls sort after every value, unless told otherwise. They
+sort before every value on the other known dialects.
+"""
+
+ROW_VALUE_DIALECTS = ("mariadb", "mysql", "postgresql", "sqlite")
+"""Dialects that compare row values, e.g. ``(a, b) > (1, 2)``. The seek
+predicate of the other dialects, and of an unknown dialect, is always
+expanded with ``OR``.
+"""
+
 
 def apply_pagination(
     stmt: Union[Select, Query],
     page_number: Optional[int] = None,
     page_size: Optional[int] = None,
-    total_results: int = 0,
+    total_results: Optional[int] = None,
+    session: Any = None,
+    count_cap: Optional[int] = None,
 ) -> tuple[Union[Select, Query], Pagination]:
     """Apply pagination to a SQLAlchemy :class:`sqlalchemy.sql.Select` object
     or a :class:`sqlalchemy.orm.Query` object.
@@ -34,7 +98,19 @@ def apply_pagination(
         to the total results).
 
     :param total_results:
-        Total results (defaults to 0).
+        Total results (defaults to 0, or to the results counted with
+        `session`).
+
+    :param session:
+        A :class:`sqlalchemy.orm.Session` or a connection to count the
+        results of `stmt` with :func:`count_results`, if `total_results`
+        is not given.
+
+    :param count_cap:
+        If given, the results counted with `session` are counted up to
+        `count_cap`. If there are more, ``total_results`` is `count_cap`
+        and a :class:`CappedPagination` is returned, whose ``is_capped`` is
+        true.
 
     :returns:
         A 2-tuple with the paginated SQLAlchemy :class:`sqlalchemy.sql.Select`
@@ -62,6 +138,15 @@ def apply_pagination(
         22
         >>> page_number, page_size, num_pages, total_results = pagination
     """
+    pagination_class = Pagination
+    if total_results is None:
+        total_results = (
+            0 if session is None else count_results(session, stmt, count_cap)
+        )
+        if count_cap is not None and total_results > count_cap:
+            total_results = count_cap
+            pagination_class = CappedPagination
+
     stmt = _limit(stmt, page_size)
 
     # Page size defaults to total results
@@ -76,7 +161,261 @@ def apply_pagination(
 
     num_pages = _calculate_num_pages(page_number, page_size, total_results)
 
-    return stmt, Pagination(page_number, page_size, num_pages, total_results)
+    return stmt, pagination_class(page_number, page_size, num_pages, total_results)
+
+
+def get_count_stmt(stmt: Union[Select, Query], cap: Optional[int] = None) -> Select:
+    """Return the cheapest statement that counts the rows of `stmt`.
+
+    The count doesn't depend on the order of the rows, on the loader options
+    or on the outer joins to at most one row of tables that are not
+    filtered, so they are left out, and only the primary key of the model
+    is counted. Statements that are grouped, distinct or limited are counted
+    as a subquery.
+
+    :param stmt:
+        A :class:`sqlalchemy.sql.Select` object or
+        a :class:`sqlalchemy.orm.Query` object.
+
+    :param cap:
+        If given, at most ``cap + 1`` rows are counted, in a subquery with a
+        ``LIMIT``, so that the database stops reading rows once it is known
+        that there are more than `cap`.
+
+    :returns:
+        A :class:`sqlalchemy.sql.Select` object returning the count.
+    """
+    if isinstance(stmt, Query):
+        stmt = stmt.statement
+    stmt = _without_loader_options(stmt.order_by(None))
+    options = stmt._with_options
+
+    if (
+        stmt._group_by_clauses
+        or stmt._having_criteria
+        or stmt._distinct
+        or stmt._limit_clause is not None
+        or stmt._offset_clause is not None
+        or stmt._fetch_clause is not None
+    ):
+        column = whereclause = None
+        froms = [stmt.subquery()]
+        options = ()
+    else:
+        column = _get_counted_column(stmt)
+        whereclause = stmt.whereclause
+        referenced = []
+        for clause in (column, whereclause):
+            if clause is not None:
+                referenced.extend(
+                    find_tables(clause, check_columns=True, include_aliases=True)
+                )
+        froms = [
+            _strip_joins(from_clause, referenced)
+            for from_clause in stmt.get_final_froms()
+        ]
+
+    if cap is None:
+        count_stmt = select(func.count() if column is None else func.count(column))
+    else:
+        # the primary key is selected rather than 1 for the ORM to apply
+        # the criteria of the options to the model in the subquery
+        count_stmt = select(literal_column("1") if column is None else column)
+    count_stmt = count_stmt.select_from(*froms)
+    if whereclause is not None:
+        count_stmt = count_stmt.where(whereclause)
+    if cap is not None:
+        count_stmt = select(func.count()).select_from(
+            count_stmt.limit(cap + 1).subquery()
+        )
+    if options:
+        count_stmt = count_stmt.options(*options)
+    return count_stmt
+
+
+def count_results(
+    session: Any, stmt: Union[Select, Query], cap: Optional[int] = None
+) -> int:
+    """Count the rows of `stmt` with the statement of :func:`get_count_stmt`.
+
+    No statement is executed if the filters of `stmt` are known to match no
+    rows (see :func:`sa_filters.is_known_empty`).
+
+    :param session:
+        A :class:`sqlalchemy.orm.Session` or a connection.
+
+    :param cap:
+        If given, at most ``cap + 1`` rows are counted: a count greater
+        than `cap` tells that there are more than `cap` rows.
+    """
+    if is_known_empty(stmt):
+        return 0
+    return session.execute(get_count_stmt(stmt, cap)).scalar_one()
+
+
+def execute_pagination(
+    session: Any,
+    stmt: Union[Select, Query],
+    page_number: Optional[int],
+    page_size: int,
+) -> tuple[Result, Pagination]:
+    """Execute a page of `stmt` and count its results in a single query.
+
+    The statement selects a ``count(*) OVER ()`` window column as well, so
+    that every row carries the total results. The total results of an
+    empty page are counted with :func:`count_results`, unless it is the
+    first page, as are the results of statements that are distinct or
+    that eagerly load collections with a join, since the window would
+    count the rows before they are made unique, and the results of pages
+    of size 0, which have no rows. The database must support window
+    functions.
+
+    :param session:
+        A :class:`sqlalchemy.orm.Session` or a connection.
+
+    :param stmt:
+        The statement to be paginated.
+
+    :param page_number:
+        Page to be returned (starts and defaults to 1).
+
+    :param page_size:
+        Maximum number of results to be returned in the page.
+
+    :returns:
+        A 2-tuple with the :class:`sqlalchemy.engine.Result` of the page,
+        without the window column, and a pagination namedtuple, as returned
+        by :func:`apply_pagination`.
+
+    Basic usage::
+
+        >>> result, pagination = execute_pagination(session, stmt, 3, 10)
+        >>> foos = result.scalars().all()
+        >>> len(foos)
+        2
+        >>> pagination.total_results
+        22
+    """
+    if isinstance(stmt, Query):
+        stmt = stmt.statement
+
+    paginated_stmt = _offset(_limit(stmt, page_size), page_number, page_size)
+    if stmt._distinct or page_size == 0:
+        total_results = count_results(session, stmt)
+        result = session.execute(paginated_stmt)
+    else:
+        result = session.execute(
+            paginated_stmt.add_columns(func.count().over().label("total_results"))
+        )
+        if _has_joined_collections(result):
+            # the rows have to be made unique before any of them is read
+            total_results = count_results(session, stmt)
+        else:
+            frozen_result = result.freeze()
+            first_row = frozen_result().first()
+            if first_row is not None:
+                total_results = first_row[-1]
+            elif page_number is None or page_number == 1:
+                total_results = 0
+            else:
+                total_results = count_results(session, stmt)
+            result = frozen_result()
+        result = result.columns(*range(len(result.keys()) - 1))
+
+    if page_number is None:
+        page_number = 1
+    if page_size > total_results > 0:
+        page_size = total_results
+    num_pages = _calculate_num_pages(page_number, page_size, total_results)
+
+    return result, Pagination(page_number, page_size, num_pages, total_results)
+
+
+def _has_joined_collections(result):
+    """Return whether the statement of `result` loads collections with a
+    join, which returns a row per item of the collections.
+    """
+    # the cursor result of an ORM result is its raw result
+    cursor_result = getattr(result, "raw", None) or result
+    compile_state = cursor_result.context.compiled.compile_state
+    return getattr(compile_state, "multi_row_eager_loaders", False)
+
+
+def _without_loader_options(stmt):
+    options = tuple(
+        option for option in stmt._with_options if not isinstance(option, LoaderOption)
+    )
+    if len(options) == len(stmt._with_options):
+        return stmt
+    # there is no public way to remove the options of a statement
+    stmt = stmt._generate()
+    stmt._with_options = options
+    return stmt
+
+
+def _get_counted_column(stmt):
+    """Return the primary key of the model selected by `stmt` to be counted,
+    or ``None`` to count the rows if it may be null or there is none.
+    """
+    descriptions = stmt.column_descriptions
+    entity = descriptions[0]["entity"] if len(descriptions) == 1 else None
+    froms = stmt.get_final_froms()
+    if entity is None or len(froms) != 1:
+        return None
+
+    entity_info = inspect(entity)
+    mapper = entity_info.mapper
+    from_clause = froms[0]
+    while isinstance(from_clause, Join):
+        from_clause = from_clause.left
+    # the model may be on the nullable side of an outer join otherwise
+    if (
+        not _is_same_table(from_clause, entity_info.selectable)
+        or len(mapper.primary_key) != 1
+    ):
+        return None
+
+    (column,) = mapper.primary_key
+    key = mapper.get_property_by_column(column).key
+    return getattr(entity, key)
+
+
+def _strip_joins(from_clause, referenced):
+    """Return `from_clause` without the outer joins to at most one row of
+    the tables that are not in `referenced`, which don't change the number
+    of rows. The tables of the joins that are kept are added to
+    `referenced`.
+    """
+    if not isinstance(from_clause, Join):
+        return from_clause
+
+    tables = find_tables(from_clause.right, include_aliases=True)
+    if (
+        from_clause.isouter
+        and not from_clause.full
+        and not any(
+            # an alias and its table are told apart only if it doesn't matter
+            table.is_derived_from(other) or other.is_derived_from(table)
+            for table in tables
+            for other in referenced
+            if other is not None
+        )
+        and _is_to_one(from_clause.right.primary_key, from_clause.onclause)
+    ):
+        return _strip_joins(from_clause.left, referenced)
+
+    referenced.extend(
+        find_tables(from_clause.onclause, check_columns=True, include_aliases=True)
+    )
+    left = _strip_joins(from_clause.left, referenced)
+    if left is from_clause.left:
+        return from_clause
+    return left.join(
+        from_clause.right,
+        from_clause.onclause,
+        isouter=from_clause.isouter,
+        full=from_clause.full,
+    )
 
 
 def _limit(stmt, page_size):
@@ -104,3 +443,498 @@ def _calculate_num_pages(page_number, page_size, total_results):
         return 0
 
     return math.ceil(float(total_results) / float(page_size))
+
+
+def apply_keyset_pagination(
+    stmt: Union[Select, Query],
+    sort_spec: Union[List[Dict[str, Any]], Dict[str, Any]],
+    page_size: int,
+    after: Optional[Sequence[Any]] = None,
+    before: Optional[Sequence[Any]] = None,
+    context: Optional[ResolutionContext] = None,
+) -> tuple[Union[Select, Query], "Keyset"]:
+    """Apply keyset pagination to a :class:`sqlalchemy.sql.Select` object
+    or a :class:`sqlalchemy.orm.Query` object.
+
+    Instead of skipping the rows of the previous pages with an offset, the
+    statement seeks the rows that are sorted after the last row of the
+    previous page (or before the first row of the next page), so that deep
+    pages cost as much as the first one, given an index on the sort fields.
+
+    :param stmt:
+        The statement to be processed. It is sorted by `sort_spec`.
+
+    :param sort_spec:
+        A sort spec, as accepted by :func:`sa_filters.apply_sort`. Its
+        fields must identify the rows, e.g. it should end with the primary
+        key.
+
+    :param page_size:
+        Maximum number of results to be returned in the page.
+
+    :param after:
+        The key of the row after which the page starts, i.e. the
+        ``next_key`` of the previous page. Defaults to the first page.
+
+    :param before:
+        The key of the row before which the page ends, i.e. the
+        ``previous_key`` of the next page.
+
+    :param context:
+        The :class:`sa_filters.models.ResolutionContext` of `stmt`. Its
+        dialect, if known, tells where nulls are sorted when the sort spec
+        doesn't, and whether row values may be compared.
+
+    :returns:
+        A 2-tuple with the paginated statement and a :class:`Keyset`, which
+        returns the rows of the page and a :class:`KeysetPagination`
+        namedtuple from the results of the statement.
+
+    :raise InvalidPage:
+        If `page_size` is negative, if both `after` and `before` are given
+        or if a key doesn't have a value for each field of `sort_spec`.
+
+    :raise BadSortFormat:
+        If a sorted field may be null, the dialect is not known and the
+        sort spec doesn't tell where nulls are sorted.
+
+    Basic usage::
+
+        >>> stmt, keyset = apply_keyset_pagination(
+        ...     select(Foo),
+        ...     [{'field': 'name', 'direction': 'asc'},
+        ...      {'field': 'id', 'direction': 'asc'}],
+        ...     page_size=10,
+        ...     after=next_key,
+        ... )
+        >>> foos, pagination = keyset.paginate(session.execute(stmt).scalars())
+        >>> next_key = pagination.next_key
+    """
+    if page_size < 0:
+        raise InvalidPage("Page size should not be negative: {}".format(page_size))
+    if after is not None and before is not None:
+        raise InvalidPage("Only one of `after` and `before` should be given.")
+
+    if context is None:
+        context = ResolutionContext(stmt)
+    if isinstance(sort_spec, dict):
+        sort_spec = [sort_spec]
+
+    backwards = before is not None
+    if backwards:
+        # the page is sorted the other way round, and reversed once fetched
+        sort_spec = [_reverse_sort(item) for item in sort_spec]
+    stmt = apply_sort(stmt, sort_spec, context)
+
+    keyset = Keyset(sort_spec, context, page_size, after, before)
+    key = before if backwards else after
+    if key is not None:
+        stmt = stmt.filter(keyset.get_seek_predicate(key))
+
+    # one more row tells whether there is another page
+    return stmt.limit(page_size + 1), keyset
+
+
+class Keyset(object):
+    """The sort fields of a page returned by :func:`apply_keyset_pagination`.
+
+    The key of a row is the tuple of the values of its sort fields.
+    """
+
+    def __init__(self, sort_spec, context, page_size, after=None, before=None):
+        default_model = context.default_model
+        dialect_name = getattr(context.dialect, "name", None)
+        self.fields = []
+        self.directions = []
+        self.nulls_last = []
+        for sort in map(Sort, sort_spec):
+            model = get_model(context, sort.model, sort.table, default_model)
+            if (
+                dialect_name is None
+                and not sort.nullsfirst
+                and not sort.nullslast
+                and _is_nullable(Field(model, sort.field_name).get_sqlalchemy_field())
+            ):
+                raise BadSortFormat(
+                    "Field `{}` may be null, and where nulls are sorted is not "
+                    "known without the dialect: `nullsfirst` or `nullslast` "
+                    "should be given.".format(sort.field_name)
+                )
+            self.fields.append((model, sort.field_name))
+            self.directions.append(sort.direction)
+            self.nulls_last.append(_nulls_last(sort, dialect_name))
+        self.dialect_name = dialect_name
+        self.page_size = page_size
+        self.after = after
+        self.before = before
+
+    def get_key(self, row):
+        """Return the key of `row`, an instance of the sorted model or a row
+        of the results of the statement.
+
+        :raise InvalidPage:
+            If the values of a sort field are not in `row`.
+        """
+        return tuple(
+            getattr(_get_row_values(row, model, field_name), field_name)
+            for model, field_name in self.fields
+        )
+
+    def get_seek_predicate(self, key):
+        """Return the filter matching the rows sorted after the row of `key`.
+
+        Row values are compared when the fields are all sorted in the same
+        direction and can't be null. Otherwise, the comparison is expanded
+        with ``OR``.
+        """
+        if len(key) != len(self.fields):
+            raise InvalidPage(
+                "Key should have {} values: {}".format(len(self.fields), key)
+            )
+
+        columns = [
+            Field(model, field_name).get_sqlalchemy_field()
+            for model, field_name in self.fields
+        ]
+        if (
+            len(columns) > 1
+            and self.dialect_name in ROW_VALUE_DIALECTS
+            and len(set(self.directions)) == 1
+            and None not in key
+            and not any(_is_nullable(column) for column in columns)
+        ):
+            if self.directions[0] == SORT_ASCENDING:
+                return tuple_(*columns) > tuple_(*key)
+            return tuple_(*columns) < tuple_(*key)
+
+        criteria = []
+        equal = []
+        for column, value, direction, nulls_last in zip(
+            columns, key, self.directions, self.nulls_last, strict=True
+        ):
+            after = _after(column, value, direction, nulls_last)
+            if after is not None:
+                criteria.append(and_(*equal, after))
+            equal.append(column.is_(None) if value is None else column == value)
+        if not criteria:
+            return false()
+        return or_(*criteria)
+
+    def paginate(self, rows):
+        """Return the rows of the page, out of the `rows` returned by the
+        statement, and a :class:`KeysetPagination` namedtuple.
+
+        The pagination holds the ``page_size``, and the ``next_key`` and
+        ``previous_key`` to be given as `after` and `before` for the next
+        and previous pages, or `None` if there are none.
+        """
+        rows = list(rows)
+        more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+
+        if self.before is not None:
+            rows.reverse()
+            has_previous, has_next = more, True
+        else:
+            has_previous, has_next = self.after is not None, more
+
+        next_key = previous_key = None
+        if rows:
+            if has_next:
+                next_key = self.get_key(rows[-1])
+            if has_previous:
+                previous_key = self.get_key(rows[0])
+        return rows, KeysetPagination(self.page_size, next_key, previous_key)
+
+
+def _get_row_values(row, model, field_name):
+    """Return what holds the value of the field `field_name` of `model` in
+    `row`: `row` itself if it is an instance of `model`, the instance of
+    `model` in a row of several entities, or a row of the selected columns.
+    """
+    if isinstance(row, model):
+        return row
+    instance = getattr(row, model.__name__, None)
+    if isinstance(instance, model):
+        return instance
+    if isinstance(row, Row) and field_name in row._fields:
+        return row
+    raise InvalidPage(
+        "The rows have no `{}` value of model `{}`.".format(field_name, model.__name__)
+    )
+
+
+def _reverse_sort(sort_spec):
+    sort_spec = dict(sort_spec)
+    if sort_spec.get("direction") == SORT_ASCENDING:
+        sort_spec["direction"] = SORT_DESCENDING
+    elif sort_spec.get("direction") == SORT_DESCENDING:
+        sort_spec["direction"] = SORT_ASCENDING
+    nullsfirst = sort_spec.pop("nullsfirst", None)
+    nullslast = sort_spec.pop("nullslast", None)
+    if nullsfirst:
+        sort_spec["nullslast"] = nullsfirst
+    if nullslast:
+        sort_spec["nullsfirst"] = nullslast
+    return sort_spec
+
+
+def _nulls_last(sort, dialect_name):
+    """Return whether nulls are sorted after every value by `sort`."""
+    if sort.nullsfirst:
+        return False
+    if sort.nullslast:
+        return True
+    nulls_largest = dialect_name in NULLS_LARGEST_DIALECTS
+    return nulls_largest == (sort.direction == SORT_ASCENDING)
+
+
+def _is_nullable(column):
+    # hybrid attributes and other expressions may be null
+    return getattr(getattr(column, "expression", column), "nullable", True)
+
+
+def _after(column, value, direction, nulls_last):
+    """Return the filter matching the values of `column` sorted after
+    `value`, or `None` if there are none.
+    """
+    if value is None:
+        return None if nulls_last else column.is_not(None)
+
+    if direction == SORT_ASCENDING:
+        after = column > value
+    else:
+        after = column < value
+    if nulls_last and _is_nullable(column):
+        return or_(after, column.is_(None))
+    return after
+
+
+_CURSOR_VERSION = 1
+_CURSOR_BEFORE = 1
+_CURSOR_HEADER = struct.Struct(">BB8s")
+_INT = struct.Struct(">q")
+_FLOAT = struct.Struct(">d")
+_DATE = struct.Struct(">I")
+
+
+def _pack_bytes(tag, data):
+    # the length is a little-endian base 128 varint
+    length = len(data)
+    prefix = bytearray(tag)
+    while length > 0x7F:
+        prefix.append(length & 0x7F | 0x80)
+        length >>= 7
+    prefix.append(length)
+    return bytes(prefix) + data
+
+
+def _pack_int(value):
+    if -(2**63) <= value < 2**63:
+        return b"i" + _INT.pack(value)
+    return _pack_bytes(b"I", str(value).encode("ascii"))
+
+
+_PACKERS = {
+    type(None): lambda value: b"N",
+    bool: lambda value: b"T" if value else b"F",
+    int: _pack_int,
+    float: lambda value: b"f" + _FLOAT.pack(value),
+    str: lambda value: _pack_bytes(b"s", value.encode("utf-8")),
+    bytes: lambda value: _pack_bytes(b"b", value),
+    Decimal: lambda value: _pack_bytes(b"D", str(value).encode("ascii")),
+    datetime.datetime: lambda value: _pack_bytes(
+        b"t", value.isoformat().encode("ascii")
+    ),
+    datetime.date: lambda value: b"d" + _DATE.pack(value.toordinal()),
+    datetime.time: lambda value: _pack_bytes(b"h", value.isoformat().encode("ascii")),
+    uuid.UUID: lambda value: b"u" + value.bytes,
+}
+
+
+def _pack(value):
+    packer = _PACKERS.get(type(value))
+    if packer is None:
+        # e.g. subclasses of the supported types, such as enums of strings
+        for value_type, type_packer in _PACKERS.items():
+            if isinstance(value, value_type):
+                packer = type_packer
+                break
+        else:
+            raise TypeError(
+                "Key value of type `{}` can't be encoded in a cursor.".format(
+                    type(value).__name__
+                )
+            )
+    return packer(value)
+
+
+def _unpack_bytes(data, position):
+    length = shift = 0
+    while True:
+        byte = data[position]
+        position += 1
+        length |= (byte & 0x7F) << shift
+        shift += 7
+        if byte < 0x80:
+            break
+    end = position + length
+    if end > len(data):
+        raise ValueError("Truncated value.")
+    return data[position:end], end
+
+
+def _unpack_fixed(unpacker):
+    def unpack(data, position):
+        end = position + unpacker.size
+        return unpacker.unpack_from(data, position)[0], end
+
+    return unpack
+
+
+def _unpack_string(function):
+    def unpack(data, position):
+        value, position = _unpack_bytes(data, position)
+        return function(value.decode("utf-8")), position
+
+    return unpack
+
+
+def _unpack_uuid(data, position):
+    end = position + 16
+    if end > len(data):
+        raise ValueError("Truncated value.")
+    return uuid.UUID(bytes=data[position:end]), end
+
+
+def _unpack_date(data, position):
+    ordinal, position = _unpack_fixed(_DATE)(data, position)
+    return datetime.date.fromordinal(ordinal), position
+
+
+_UNPACKERS = {
+    ord("N"): lambda data, position: (None, position),
+    ord("T"): lambda data, position: (True, position),
+    ord("F"): lambda data, position: (False, position),
+    ord("i"): _unpack_fixed(_INT),
+    ord("I"): _unpack_string(int),
+    ord("f"): _unpack_fixed(_FLOAT),
+    ord("s"): _unpack_string(str),
+    ord("b"): lambda data, position: _unpack_bytes(data, position),
+    ord("D"): _unpack_string(Decimal),
+    ord("t"): _unpack_string(datetime.datetime.fromisoformat),
+    ord("d"): _unpack_date,
+    ord("h"): _unpack_string(datetime.time.fromisoformat),
+    ord("u"): _unpack_uuid,
+}
+
+
+def _get_cursor_fingerprint(filter_spec, sort_spec):
+    fingerprint = get_spec_fingerprint(filter_spec, sort_spec, include_values=True)
+    return bytes.fromhex(fingerprint)[:8]
+
+
+def encode_cursor(
+    key: Sequence[Any],
+    filter_spec: Any = None,
+    sort_spec: Any = None,
+    before: bool = False,
+) -> str:
+    """Encode the key of a row, as returned by :func:`apply_keyset_pagination`,
+    into an opaque cursor that clients may pass back to get the next (or
+    previous) page.
+
+    The values of the key are packed in binary, along with a fingerprint of
+    the filter and sort specs of the page, and encoded in URL-safe base64.
+
+    :param key:
+        A key, e.g. the ``next_key`` of a :class:`KeysetPagination`. Its
+        values may be `None`, booleans, numbers, strings, bytes, decimals,
+        dates, times, datetimes or UUIDs.
+
+    :param filter_spec:
+        The filter spec of the page.
+
+    :param sort_spec:
+        The sort spec of the page.
+
+    :param before:
+        Whether the cursor points to the page before the key, e.g. for the
+        ``previous_key`` of a :class:`KeysetPagination`.
+
+    :raise TypeError:
+        If a value of the key can't be encoded.
+    """
+    parts = [
+        _CURSOR_HEADER.pack(
+            _CURSOR_VERSION,
+            _CURSOR_BEFORE if before else 0,
+            _get_cursor_fingerprint(filter_spec, sort_spec),
+        )
+    ]
+    parts.extend(map(_pack, key))
+    return base64.urlsafe_b64encode(b"".join(parts)).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(
+    cursor: str,
+    filter_spec: Any = None,
+    sort_spec: Any = None,
+) -> tuple[Optional[tuple], Optional[tuple]]:
+    """Decode a cursor returned by :func:`encode_cursor`.
+
+    :param filter_spec:
+        The filter spec of the requested page.
+
+    :param sort_spec:
+        The sort spec of the requested page.
+
+    :returns:
+        A 2-tuple with the `after` and `before` arguments of
+        :func:`apply_keyset_pagination`, one of which is `None`.
+
+    :raise InvalidCursor:
+        If the cursor is not valid, or was encoded for other specs, or
+        other filter values.
+
+    Basic usage::
+
+        >>> after, before = decode_cursor(cursor, filter_spec, sort_spec)
+        >>> stmt, keyset = apply_keyset_pagination(
+        ...     apply_filters(select(Foo), filter_spec),
+        ...     sort_spec,
+        ...     page_size=10,
+        ...     after=after,
+        ...     before=before,
+        ... )
+    """
+    try:
+        data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        version, flags, fingerprint = _CURSOR_HEADER.unpack_from(data)
+        if version != _CURSOR_VERSION:
+            raise ValueError("Unknown version.")
+
+        key = []
+        position = _CURSOR_HEADER.size
+        while position < len(data):
+            unpack = _UNPACKERS[data[position]]
+            value, position = unpack(data, position + 1)
+            key.append(value)
+    except (
+        ArithmeticError,
+        binascii.Error,
+        IndexError,
+        KeyError,
+        TypeError,
+        ValueError,
+        struct.error,
+    ):
+        raise InvalidCursor("Cursor is not valid: {}".format(cursor)) from None
+
+    if fingerprint != _get_cursor_fingerprint(filter_spec, sort_spec):
+        raise InvalidCursor("Cursor does not match the filter and sort specs.")
+
+    key = tuple(key)
+    if flags & _CURSOR_BEFORE:
+        return None, key
+    return key, None
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from sqlalchemy.orm import Query
+from sqlalchemy.sql import Select
+
+from .cache import ExpressionCache
+from .filters import SpecBudget, _build_sqlalchemy_filters
+from .loads import _build_sqlalchemy_loads
+from .models import ResolutionContext, auto_join
+from .pagination import Pagination, apply_pagination
+from .sorting import _build_sqlalchemy_sorts
+
+
+def apply_query(
+    stmt: Union[Select, Query],
+    filters: Optional[Union[Iterable[Dict[str, Any]], Dict[str, Any]]] = None,
+    sort: Optional[Union[List[Dict[str, Any]], Dict[str, Any]]] = None,
+    loads: Optional[Union[List[Dict[str, Any]], Dict[str, Any], List[str]]] = None,
+    page_number: Optional[int] = None,
+    page_size: Optional[int] = None,
+    total_results: Optional[int] = None,
+    do_auto_join: bool = True,
+    cache: Optional[ExpressionCache] = None,
+    coalesce: bool = True,
+    relationship_filters: str = "join",
+    budget: Optional[SpecBudget] = None,
+    session: Any = None,
+    count_cap: Optional[int] = None,
+    dialect: Any = None,
+) -> tuple[Union[Select, Query], Pagination]:
+    """Apply filters, sorting, load restrictions and pagination to a
+    :class:`sqlalchemy.sql.Select` object or a :class:`sqlalchemy.orm.Query`
+    object in a single pass.
+
+    The result is the same as calling :func:`sa_filters.apply_filters`,
+    :func:`sa_filters.apply_sort`, :func:`sa_filters.apply_loads` and
+    :func:`sa_filters.apply_pagination` one after the other, but the models
+    of `stmt` are resolved only once, and the models named by all the specs
+    are joined in one go. Specs that do not name a model apply to the single
+    model of the original `stmt`, even if other models have been joined.
+
+    :param stmt:
+        The statement to be processed.
+
+    :param filters:
+        A filter spec, as accepted by :func:`sa_filters.apply_filters`.
+
+    :param sort:
+        A sort spec, as accepted by :func:`sa_filters.apply_sort`.
+
+    :param loads:
+        A load spec, as accepted by :func:`sa_filters.apply_loads`.
+
+    :param page_number:
+        Page to be returned (starts and defaults to 1).
+
+    :param page_size:
+        Maximum number of results to be returned in the page (defaults
+        to the total results).
+
+    :param total_results:
+        Total results (defaults to 0, or to the results counted with
+        `session`).
+
+    :param do_auto_join:
+        Allow or not auto join for the models named by the filters.
+
+    :param cache:
+        An optional :class:`sa_filters.cache.ExpressionCache`.
+
+    :param coalesce:
+        Merge the filters on the same field, as :func:`sa_filters.apply_filters`
+        does.
+
+    :param relationship_filters:
+        How the filters on a model that is not in the query are applied, as
+        for :func:`sa_filters.apply_filters`. The models that the sort or
+        load specs refer to are always joined.
+
+    :param budget:
+        An optional :class:`sa_filters.filters.SpecBudget` the filter spec
+        is checked against, as for :func:`sa_filters.apply_filters`.
+
+    :param session:
+        A session or a connection to count the results of the filtered
+        statement with, as for :func:`sa_filters.apply_pagination`, if
+        `total_results` is not given.
+
+    :param count_cap:
+        The cap of the results counted with `session`, as for
+        :func:`sa_filters.apply_pagination`.
+
+    :param dialect:
+        The :class:`sqlalchemy.engine.Dialect` the statement will be run
+        with, as for :func:`sa_filters.apply_filters`.
+
+    :returns:
+        A 2-tuple with the processed statement and a pagination namedtuple,
+        as returned by :func:`sa_filters.apply_pagination`.
+
+    Basic usage::
+
+        >>> stmt, pagination = apply_query(
+        ...     select(Foo),
+        ...     filters=[{'model': 'Bar', 'field': 'count', 'op': '>=', 'value': 5}],
+        ...     sort=[{'field': 'name', 'direction': 'asc'}],
+        ...     loads=['id', 'name'],
+        ...     page_number=1,
+        ...     page_size=10,
+        ...     total_results=22,
+        ... )
+    """
+    context = ResolutionContext(stmt, dialect)
+    default_model = context.default_model
+
+    model_names = []
+    formatters = []
+
+    # sorts and loads are built first, as the models they join tell whether
+    # filters may use `EXISTS` instead of joins
+    if sort is not None:
+        sort_models, format_sorts = _build_sqlalchemy_sorts(
+            sort, context, default_model, cache
+        )
+        model_names.extend(sort_models)
+        formatters.append(("order_by", format_sorts))
+
+    if loads is not None:
+        load_models, format_loads = _build_sqlalchemy_loads(
+            loads, context, default_model, cache
+        )
+        model_names.extend(load_models)
+        formatters.append(("options", format_loads))
+
+    if filters is not None:
+        filter_models, format_filters = _build_sqlalchemy_filters(
+            filters,
+            context,
+            default_model,
+            do_auto_join,
+            cache,
+            coalesce,
+            relationship_filters,
+            joined_models=model_names,
+            budget=budget,
+        )
+        if do_auto_join:
+            model_names[:0] = filter_models
+        formatters.insert(0, ("filter", format_filters))
+
+    stmt = auto_join(stmt, *model_names, context=context)
+
+    for method, format_clauses in formatters:
+        clauses = format_clauses()
+        if clauses:
+            stmt = getattr(stmt, method)(*clauses)
+
+    return apply_pagination(
+        stmt, page_number, page_size, total_results, session, count_cap
+    )
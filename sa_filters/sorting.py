@@ -1,12 +1,13 @@
 # -*- coding: utf-8 -*-
 
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, List, Optional, Union
 
 from sqlalchemy.orm import Query
 from sqlalchemy.sql import Select
 
+from .cache import ExpressionCache
 from .exceptions import BadSortFormat
-from .models import Field, auto_join, get_default_model, get_model_from_spec
+from .models import Field, ResolutionContext, auto_join, get_model
 
 
 SORT_ASCENDING = "asc"
@@ -14,9 +15,16 @@ SORT_DESCENDING = "desc"
 
 
 class Sort(object):
-    def __init__(self, sort_spec):
-        self.sort_spec = sort_spec
+    __slots__ = (
+        "model",
+        "table",
+        "field_name",
+        "direction",
+        "nullsfirst",
+        "nullslast",
+    )
 
+    def __init__(self, sort_spec):
         try:
             field_name = sort_spec["field"]
             direction = sort_spec["direction"]
@@ -32,22 +40,23 @@ class Sort(object):
         if direction not in [SORT_ASCENDING, SORT_DESCENDING]:
             raise BadSortFormat("Direction `{}` not valid.".format(direction))
 
+        self.model = sort_spec.get("model")
+        self.table = sort_spec.get("table")
         self.field_name = field_name
         self.direction = direction
         self.nullsfirst = sort_spec.get("nullsfirst")
         self.nullslast = sort_spec.get("nullslast")
 
     def get_named_models(self):
-        if "model" in self.sort_spec:
-            return {self.sort_spec["model"]}
+        if self.model is not None:
+            return {self.model}
         return set()
 
     def format_for_sqlalchemy(self, query, default_model):
-        sort_spec = self.sort_spec
         direction = self.direction
         field_name = self.field_name
 
-        model = get_model_from_spec(sort_spec, query, default_model)
+        model = get_model(query, self.model, self.table, default_model)
 
         field = Field(model, field_name)
         sqlalchemy_field = field.get_sqlalchemy_field()
@@ -65,6 +74,18 @@ class Sort(object):
             return sort_fnc()
 
 
+def _canonical_sort(sort_spec):
+    if isinstance(sort_spec, dict):
+        sort_spec = [sort_spec]
+    # the order of the sort criteria matters, so it is kept
+    return "sort({})".format(
+        ",".join(
+            repr(sorted(item.items())) if isinstance(item, dict) else repr(item)
+            for item in sort_spec
+        )
+    )
+
+
 def get_named_models(sorts):
     models = set()
     for sort in sorts:
@@ -73,7 +94,10 @@ def get_named_models(sorts):
 
 
 def apply_sort(
-    stmt: Union[Select, Query], sort_spec: Union[List[Dict[str, Any]], Dict[str, Any]]
+    stmt: Union[Select, Query],
+    sort_spec: Union[List[Dict[str, Any]], Dict[str, Any]],
+    context: Optional[ResolutionContext] = None,
+    cache: Optional[ExpressionCache] = None,
 ) -> Union[Select, Query]:
     """Apply sorting to a SQLAlchemy :class:`sqlalchemy.sql.Select`
     object or a :class:`sqlalchemy.orm.Query` object.
@@ -107,26 +131,69 @@ def apply_sort(
         If the query being modified refers to a single model, the `model` key
         may be omitted from the sort spec.
 
+    :param context:
+        The :class:`sa_filters.models.ResolutionContext` of `stmt`, which
+        may be shared with other ``apply_*`` calls on the same statement.
+        A new one is created if not provided.
+
+    :param cache:
+        An optional :class:`sa_filters.cache.ExpressionCache` to reuse the
+        sort criteria built for specs of the same structure.
+
     :returns:
         The :class:`sqlalchemy.sql.Select` object or
         the :class:`sqlalchemy.orm.Query` object after the provided
         sorting has been applied.
     """
+    if context is None:
+        context = ResolutionContext(stmt)
+
+    sort_models, format_sorts = _build_sqlalchemy_sorts(
+        sort_spec, context, context.default_model, cache
+    )
+
+    stmt = auto_join(stmt, *sort_models, context=context)
+
+    sqlalchemy_sorts = format_sorts()
+    if sqlalchemy_sorts:
+        stmt = stmt.order_by(*sqlalchemy_sorts)
+
+    return stmt
+
+
+def _build_sqlalchemy_sorts(sort_spec, context, default_model, cache):
+    """Build the sort criteria of `sort_spec`, or take them from `cache`.
+
+    :returns:
+        A 2-tuple with the names of the models the criteria refer to, which
+        have to be joined first, and a function that returns the SQLAlchemy
+        criteria once they have been.
+    """
     if isinstance(sort_spec, dict):
         sort_spec = [sort_spec]
 
-    sorts = [Sort(item) for item in sort_spec]
+    cache_key = cached = None
+    if cache is not None:
+        cache_key = (
+            "sort",
+            frozenset(context.models.values()),
+            _canonical_sort(sort_spec),
+        )
+        cached = cache.get(cache_key)
 
-    default_model = get_default_model(stmt)
+    if cached is not None:
+        sort_models, sqlalchemy_sorts = cached
+        return sort_models, lambda: sqlalchemy_sorts
 
+    sorts = [Sort(item) for item in sort_spec]
     sort_models = get_named_models(sorts)
-    stmt = auto_join(stmt, *sort_models)
-
-    sqlalchemy_sorts = [
-        sort.format_for_sqlalchemy(stmt, default_model) for sort in sorts
-    ]
 
-    if sqlalchemy_sorts:
-        stmt = stmt.order_by(*sqlalchemy_sorts)
+    def format_sorts():
+        sqlalchemy_sorts = [
+            sort.format_for_sqlalchemy(context, default_model) for sort in sorts
+        ]
+        if cache_key is not None:
+            cache.put(cache_key, (sort_models, sqlalchemy_sorts))
+        return sqlalchemy_sorts
 
-    return stmt
+    return sort_models, format_sorts
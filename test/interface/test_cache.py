@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+
+from unittest import mock
+
+import pytest
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects import sqlite
+
+from sa_filters import (
+    ExpressionCache,
+    apply_filters,
+    apply_loads,
+    apply_sort,
+    is_known_empty,
+)
+from sa_filters.cache import CacheStats
+from sa_filters.models import ResolutionContext
+from test.models import Bar, Foo
+
+
+@pytest.fixture
+def multiple_foos_inserted(session):
+    bar_1 = Bar(id=1, name="name_1", count=5)
+    bar_2 = Bar(id=2, name="name_2", count=10)
+    foo_1 = Foo(id=1, bar_id=1, name="name_1", count=50)
+    foo_2 = Foo(id=2, bar_id=2, name="name_2", count=100)
+    foo_3 = Foo(id=3, bar_id=1, name="name_1", count=None)
+    session.add_all([bar_1, bar_2, foo_1, foo_2, foo_3])
+    session.commit()
+
+
+class TestExpressionCache:
+    def test_get_and_put(self):
+        cache = ExpressionCache()
+
+        assert cache.get("key") is None
+        cache.put("key", "value")
+        assert cache.get("key") == "value"
+
+        assert cache.stats() == CacheStats(
+            hits=1, misses=1, evictions=0, size=1, maxsize=1024
+        )
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ExpressionCache(maxsize=2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == 1
+        assert cache.get("c") == 3
+        assert len(cache) == 2
+        assert cache.stats().evictions == 1
+
+    def test_clear(self):
+        cache = ExpressionCache()
+        cache.put("a", 1)
+        cache.get("a")
+
+        cache.clear()
+
+        assert len(cache) == 0
+        assert cache.stats() == CacheStats(
+            hits=1, misses=0, evictions=0, size=0, maxsize=1024
+        )
+
+    @pytest.mark.parametrize("maxsize", [0, -1])
+    def test_invalid_size(self, maxsize):
+        with pytest.raises(ValueError) as err:
+            ExpressionCache(maxsize)
+
+        expected_error = "Cache size should be positive: {}".format(maxsize)
+        assert expected_error == err.value.args[0]
+
+
+class TestCachedFilters:
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_generator_spec(self, session):
+        filters = [{"field": "id", "op": "==", "value": 2}]
+
+        filtered_stmt = apply_filters(
+            select(Foo), (spec for spec in filters), cache=ExpressionCache()
+        )
+
+        result = session.execute(filtered_stmt).scalars().all()
+        assert [foo.id for foo in result] == [2]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_values_are_rebound(self, session):
+        cache = ExpressionCache()
+        filters = [
+            {"field": "name", "op": "==", "value": "name_1"},
+            {"model": "Bar", "field": "count", "op": "in", "value": [5]},
+        ]
+
+        first = apply_filters(select(Foo), filters, cache=cache)
+        filters = [
+            {"model": "Bar", "value": [10, 20], "field": "count", "op": "in"},
+            {"field": "name", "op": "==", "value": "name_2"},
+        ]
+        second = apply_filters(select(Foo), filters, cache=cache)
+
+        assert cache.stats().hits == 1
+        assert cache.stats().misses == 1
+        assert str(first) == str(second)
+        assert {foo.id for foo in session.execute(first).scalars()} == {1, 3}
+        assert {foo.id for foo in session.execute(second).scalars()} == {2}
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_commutative_arguments_are_rebound(self, session):
+        cache = ExpressionCache()
+        name = {"field": "name", "op": "==", "value": "name_2"}
+        count = {"field": "count", "op": "==", "value": 50}
+
+        apply_filters(select(Foo), {"or": [name, count]}, cache=cache)
+        stmt = apply_filters(
+            select(Foo),
+            {"or": [dict(count, value=100), dict(name, value="name_1")]},
+            cache=cache,
+        )
+
+        assert cache.stats().hits == 1
+        assert {foo.id for foo in session.execute(stmt).scalars()} == {1, 2, 3}
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_filters_applied_twice(self, session):
+        cache = ExpressionCache()
+        stmt = select(Foo)
+
+        stmt = apply_filters(
+            stmt, {"field": "name", "op": "==", "value": "name_1"}, cache=cache
+        )
+        stmt = apply_filters(
+            stmt, {"field": "count", "op": "==", "value": 50}, cache=cache
+        )
+        stmt = apply_filters(
+            stmt, {"field": "name", "op": "==", "value": "name_1"}, cache=cache
+        )
+
+        assert cache.stats().hits == 1
+        assert {foo.id for foo in session.execute(stmt).scalars()} == {1}
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_null_values(self, session):
+        cache = ExpressionCache()
+        filters = {"field": "count", "op": "==", "value": None}
+
+        apply_filters(select(Foo), dict(filters, value=50), cache=cache)
+        stmt = apply_filters(select(Foo), filters, cache=cache)
+
+        assert cache.stats().misses == 2
+        assert {foo.id for foo in session.execute(stmt).scalars()} == {3}
+
+    def test_different_models(self, session):
+        cache = ExpressionCache()
+        filters = {"field": "name", "op": "==", "value": "name_1"}
+
+        apply_filters(select(Foo), filters, cache=cache)
+        apply_filters(select(Bar), filters, cache=cache)
+
+        assert cache.stats().misses == 2
+        assert len(cache) == 2
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_sql_expression_values_are_not_cached(self, session):
+        cache = ExpressionCache()
+        filters = {"field": "name", "op": "==", "value": bindparam("name")}
+
+        stmt = apply_filters(select(Foo), filters, cache=cache)
+
+        assert len(cache) == 0
+        result = session.execute(stmt, {"name": "name_2"}).scalars()
+        assert {foo.id for foo in result} == {2}
+
+    def test_folded_filters_are_rebound(self, session):
+        cache = ExpressionCache()
+        filters = [
+            {"field": "count", "op": "is_null"},
+            {"field": "count", "op": "is_not_null"},
+            {"field": "id", "op": "==", "value": 1},
+        ]
+
+        apply_filters(select(Foo), filters, cache=cache)
+        stmt = apply_filters(select(Foo), filters, cache=cache)
+
+        assert cache.stats().hits == 1
+        assert is_known_empty(stmt)
+        assert session.execute(stmt).all() == []
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_empty_lists_are_not_cached(self, session):
+        cache = ExpressionCache()
+        filters = {"field": "id", "op": "in", "value": []}
+
+        stmt = apply_filters(select(Foo), filters, cache=cache)
+
+        assert len(cache) == 0
+        assert is_known_empty(stmt)
+        assert session.execute(stmt).all() == []
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_large_lists_are_not_cached(self, session):
+        cache = ExpressionCache()
+        context = ResolutionContext(select(Foo), dialect=sqlite.dialect())
+        filters = {"field": "id", "op": "in", "value": [1, 2, 3]}
+
+        with mock.patch("sa_filters.filters.LARGE_IN_THRESHOLD", 2):
+            stmt = apply_filters(select(Foo), filters, context=context, cache=cache)
+
+        assert len(cache) == 0
+        assert "json_each" in str(stmt.compile(dialect=sqlite.dialect()))
+        assert {foo.id for foo in session.execute(stmt).scalars()} == {1, 2, 3}
+
+
+class TestCachedSortAndLoads:
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_sort(self, session):
+        cache = ExpressionCache()
+        sort_spec = [
+            {"model": "Bar", "field": "name", "direction": "desc"},
+            {"field": "id", "direction": "asc"},
+        ]
+
+        first = apply_sort(select(Foo), sort_spec, cache=cache)
+        second = apply_sort(select(Foo), sort_spec, cache=cache)
+
+        assert cache.stats().hits == 1
+        assert str(first) == str(second)
+        assert [foo.id for foo in session.execute(second).scalars()] == [2, 1, 3]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_loads(self, session):
+        cache = ExpressionCache()
+
+        first = apply_loads(select(Foo), ["id", "name"], cache=cache)
+        second = apply_loads(select(Foo), {"fields": ["name", "id"]}, cache=cache)
+
+        assert cache.stats().hits == 1
+        assert str(first) == str(second)
+        assert len(session.execute(second).scalars().all()) == 3
@@ -1,19 +1,72 @@
 # -*- coding: utf-8 -*-
 
 import datetime
+from decimal import Decimal
+from unittest import mock
 
 import pytest
-from sqlalchemy import func, select
-from sqlalchemy.orm import joinedload
-
-from sa_filters import apply_filters
-from sa_filters.exceptions import BadFilterFormat, BadSpec, FieldNotFound
-from test.models import Bar, Corge, Foo, Qux
+from sqlalchemy import (
+    JSON,
+    Column,
+    Integer,
+    and_,
+    bindparam,
+    false,
+    func,
+    not_,
+    select,
+    tuple_,
+)
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import declarative_base, joinedload
+from sqlalchemy.types import NullType, TypeDecorator
+
+from sa_filters import SpecBudget, apply_filters, compile_filters, is_known_empty
+from sa_filters.exceptions import (
+    BadFilterFormat,
+    BadSpec,
+    FieldNotFound,
+    SpecTooComplex,
+)
+from sa_filters.filters import (
+    BooleanFilter,
+    ConstantFilter,
+    ExistsFilter,
+    Filter,
+    Operator,
+    build_filters,
+    get_spec_fingerprint,
+    register_operator,
+    simplify_filters,
+)
+from sa_filters.models import ResolutionContext, get_field_path, get_join_path
+from test.models import Bar, Corge, Foo, Quux, Qux
 
 
 ARRAY_NOT_SUPPORTED = "ARRAY type and operators supported only by PostgreSQL"
 
 
+class Doubled(TypeDecorator):
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else value * 2
+
+
+class Thud(declarative_base()):
+    """A model that is never created, with fields whose values are not
+    compared in Python.
+    """
+
+    __tablename__ = "thud"
+
+    id = Column(Integer, primary_key=True)
+    data = Column(JSON)
+    doubled = Column(Doubled)
+    untyped = Column(NullType)
+
+
 STRING_DATE_TIME_NOT_SUPPORTED = (
     "TODO: String Time / DateTime values currently not working as filters by SQLite"
 )
@@ -229,6 +282,22 @@ class TestAutoJoin:
         assert result[0].bar_id == 3
         assert result[0].bar.count is None
 
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_auto_join_multiple_hops(self, session):
+        session.add_all(
+            [Quux(id=1, foo_id=1, name="name_1"), Quux(id=2, foo_id=2, name="name_2")]
+        )
+        session.commit()
+
+        stmt = select(Bar)
+        filters = [{"model": "Quux", "field": "name", "op": "==", "value": "name_2"}]
+
+        filtered_stmt = apply_filters(stmt, filters)
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert len(result) == 1
+        assert result[0].id == 2
+
     @pytest.mark.usefixtures("multiple_foos_inserted")
     def test_do_not_auto_join(self, session):
 
@@ -306,6 +375,299 @@ class TestAutoJoin:
         assert result[0].bar.count is None
 
 
+class TestRelationshipFilters:
+    @pytest.fixture
+    def more_foos_inserted(self, session, multiple_foos_inserted):
+        session.add_all(
+            [
+                Foo(id=5, bar_id=1, name="name_1", count=100),
+                Foo(id=6, bar_id=2, name="name_6", count=100),
+            ]
+        )
+        session.commit()
+
+    @pytest.mark.usefixtures("more_foos_inserted")
+    def test_join(self, session):
+        filters = [{"model": "Foo", "field": "name", "op": "==", "value": "name_1"}]
+
+        filtered_stmt = apply_filters(select(Bar), filters)
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert sorted(bar.id for bar in result) == [1, 1, 3]
+
+    @pytest.mark.usefixtures("more_foos_inserted")
+    def test_exists(self, session):
+        filters = [{"model": "Foo", "field": "name", "op": "==", "value": "name_1"}]
+
+        filtered_stmt = apply_filters(
+            select(Bar), filters, relationship_filters="exists"
+        )
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert "EXISTS (SELECT 1 \nFROM foo \nWHERE bar.id = foo.bar_id" in str(
+            filtered_stmt
+        )
+        assert "JOIN" not in str(filtered_stmt)
+        assert sorted(bar.id for bar in result) == [1, 3]
+
+    @pytest.mark.usefixtures("more_foos_inserted")
+    def test_filters_on_the_same_row(self, session):
+        filters = [
+            {"model": "Foo", "field": "name", "op": "==", "value": "name_1"},
+            {"field": "name", "op": "!=", "value": "name_3"},
+            {"model": "Foo", "field": "count", "op": "==", "value": 100},
+        ]
+
+        filtered_stmt = apply_filters(
+            select(Bar), filters, relationship_filters="exists"
+        )
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert str(filtered_stmt).count("EXISTS") == 1
+        assert [bar.id for bar in result] == [1]
+
+    @pytest.mark.usefixtures("more_foos_inserted")
+    def test_filters_on_the_query_model(self, session):
+        filters = {
+            "or": [
+                {"model": "Foo", "field": "count", "op": ">", "value": 100},
+                {"field": "name", "op": "==", "value": "name_2"},
+            ]
+        }
+
+        filtered_stmt = apply_filters(
+            select(Bar), filters, relationship_filters="exists"
+        )
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert "JOIN" not in str(filtered_stmt)
+        assert sorted(bar.id for bar in result) == [2, 4]
+
+    @pytest.mark.usefixtures("more_foos_inserted")
+    def test_multiple_hops(self, session):
+        session.add_all(
+            [
+                Quux(id=1, foo_id=1, name="name_1"),
+                Quux(id=2, foo_id=5, name="name_1"),
+                Quux(id=3, foo_id=2, name="name_2"),
+            ]
+        )
+        session.commit()
+        filters = [{"model": "Quux", "field": "name", "op": "==", "value": "name_1"}]
+
+        filtered_stmt = apply_filters(
+            select(Bar), filters, relationship_filters="exists"
+        )
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert "FROM foo JOIN quux ON foo.id = quux.foo_id" in str(filtered_stmt)
+        assert [bar.id for bar in result] == [1]
+
+    @pytest.mark.usefixtures("more_foos_inserted")
+    def test_filters_on_several_models_are_joined(self, session):
+        session.add(Quux(id=1, foo_id=6, name="name_1"))
+        session.commit()
+        filters = {
+            "or": [
+                {"model": "Foo", "field": "name", "op": "==", "value": "name_4"},
+                {"model": "Quux", "field": "name", "op": "==", "value": "name_1"},
+            ]
+        }
+
+        filtered_stmt = apply_filters(
+            select(Bar), filters, relationship_filters="exists"
+        )
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert "EXISTS" not in str(filtered_stmt)
+        assert [bar.id for bar in result] == [2]
+
+    @pytest.mark.usefixtures("more_foos_inserted")
+    def test_auto(self, session):
+        bar_filters = [{"model": "Bar", "field": "count", "op": ">", "value": 5}]
+        foo_filters = [{"model": "Foo", "field": "count", "op": "==", "value": 100}]
+
+        foo_stmt = apply_filters(select(Foo), bar_filters, relationship_filters="auto")
+        bar_stmt = apply_filters(select(Bar), foo_filters, relationship_filters="auto")
+
+        assert "JOIN bar" in str(foo_stmt)
+        assert "EXISTS" in str(bar_stmt)
+        foo_result = session.execute(foo_stmt).scalars().all()
+        assert sorted(foo.id for foo in foo_result) == [2, 4, 6]
+        bar_result = session.execute(bar_stmt).scalars().all()
+        assert sorted(bar.id for bar in bar_result) == [1, 2]
+
+    @pytest.mark.usefixtures("more_foos_inserted")
+    def test_folded_filters(self, session):
+        session.add(Bar(id=5, name="name_5"))
+        session.commit()
+        filters = [{"model": "Foo", "field": "id", "op": "not_in", "value": []}]
+
+        filtered_stmt = apply_filters(
+            select(Bar), filters, relationship_filters="exists"
+        )
+        result = session.execute(filtered_stmt).scalars().all()
+
+        # like a join, it requires a related row
+        assert "EXISTS" in str(filtered_stmt)
+        assert sorted(bar.id for bar in result) == [1, 2, 3, 4]
+
+    def test_nothing_to_join(self):
+        context = ResolutionContext(select(Bar))
+        filter = Filter({"model": "Foo", "field": "id", "op": "==", "value": 1})
+
+        exists_filter = ExistsFilter(get_join_path(context, "Foo"), filter)
+
+        assert filter.get_named_models() == {"Foo"}
+        assert exists_filter.get_named_models() == set()
+
+    @pytest.mark.usefixtures("more_foos_inserted")
+    def test_query(self, session):
+        filters = [{"model": "Foo", "field": "name", "op": "==", "value": "name_1"}]
+
+        query = apply_filters(
+            session.query(Bar), filters, relationship_filters="exists"
+        )
+
+        assert sorted(bar.id for bar in query.all()) == [1, 3]
+
+    def test_do_not_auto_join(self, session):
+        filters = [{"model": "Foo", "field": "name", "op": "==", "value": "name_1"}]
+
+        with pytest.raises(BadSpec) as err:
+            apply_filters(
+                select(Bar),
+                filters,
+                do_auto_join=False,
+                relationship_filters="exists",
+            )
+
+        assert "The query does not contain model `Foo`." == err.value.args[0]
+
+    def test_invalid_mode(self, session):
+        with pytest.raises(ValueError) as err:
+            apply_filters(select(Bar), [], relationship_filters="semi")
+
+        expected_error = (
+            "Relationship filters should be one of ('join', 'exists', 'auto'): semi"
+        )
+        assert expected_error == err.value.args[0]
+
+
+class TestFieldPaths:
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_to_one_relationship(self, session):
+        filters = [{"field": "bar.name", "op": "==", "value": "name_1"}]
+
+        filtered_stmt = apply_filters(select(Foo), filters)
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert "EXISTS" in str(filtered_stmt)
+        assert sorted(foo.id for foo in result) == [1, 3]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_to_many_relationship(self, session):
+        session.add(Foo(id=5, bar_id=1, name="name_1"))
+        session.commit()
+        filters = [{"field": "foos.name", "op": "==", "value": "name_1"}]
+
+        filtered_stmt = apply_filters(select(Bar), filters)
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert sorted(bar.id for bar in result) == [1, 3]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_several_relationships(self, session):
+        session.add(Foo(id=5, bar_id=1, name="name_5"))
+        session.commit()
+        filters = [{"field": "bar.foos.name", "op": "==", "value": "name_5"}]
+
+        filtered_stmt = apply_filters(select(Foo), filters)
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert sorted(foo.id for foo in result) == [1, 5]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_unary_operator_and_hybrid_attribute(self, session):
+        filters = {
+            "or": [
+                {"field": "bar.count", "op": "is_null"},
+                {"field": "bar.count_square", "op": ">=", "value": 200},
+            ]
+        }
+
+        filtered_stmt = apply_filters(select(Foo), filters)
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert sorted(foo.id for foo in result) == [3, 4]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_model_of_the_spec(self, session):
+        filters = [
+            {"model": "Bar", "field": "foos.count", "op": ">=", "value": 100},
+            {"model": "Foo", "field": "name", "op": "!=", "value": "name_4"},
+        ]
+
+        filtered_stmt = apply_filters(select(Foo, Bar).join(Bar), filters)
+        result = session.execute(filtered_stmt).all()
+
+        assert [(foo.id, bar.id) for foo, bar in result] == [(2, 2)]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_filters_on_different_related_rows(self, session):
+        session.add(Foo(id=5, bar_id=1, name="name_4"))
+        session.commit()
+        filters = [
+            {"field": "foos.name", "op": "==", "value": "name_1"},
+            {"field": "foos.name", "op": "==", "value": "name_4"},
+        ]
+
+        filtered_stmt = apply_filters(select(Bar), filters)
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert [bar.id for bar in result] == [1]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_empty_lists(self, session):
+        session.add(Bar(id=5, name="name_5"))
+        session.commit()
+        in_filters = [{"field": "foos.id", "op": "in", "value": []}]
+        not_in_filters = [{"field": "foos.id", "op": "not_in", "value": []}]
+
+        in_stmt = apply_filters(select(Bar), in_filters)
+        not_in_stmt = apply_filters(select(Bar), not_in_filters)
+
+        assert is_known_empty(in_stmt)
+        result = session.execute(not_in_stmt).scalars().all()
+        assert sorted(bar.id for bar in result) == [1, 2, 3, 4]
+
+    def test_path_is_resolved_once(self):
+        field_path = get_field_path(Foo, "bar.foos.name")
+
+        assert get_field_path(Foo, "bar.foos.name") is field_path
+        assert field_path.relationships == (Foo.bar, Bar.foos)
+        assert field_path.model is Foo
+        assert field_path.field_name == "name"
+
+    def test_invalid_relationship(self, session):
+        filters = [{"field": "baz.name", "op": "==", "value": "name_1"}]
+
+        with pytest.raises(FieldNotFound) as err:
+            apply_filters(select(Foo), filters)
+
+        expected_error = "Model {} has no relationship `baz`.".format(Foo)
+        assert expected_error == err.value.args[0]
+
+    def test_invalid_field(self, session):
+        filters = [{"field": "bar.invalid", "op": "==", "value": "name_1"}]
+
+        with pytest.raises(FieldNotFound) as err:
+            apply_filters(select(Foo), filters)
+
+        expected_error = "Model {} has no column `invalid`.".format(Bar)
+        assert expected_error == err.value.args[0]
+
+
 class TestApplyIsNullFilter:
     @pytest.mark.usefixtures("multiple_bars_inserted")
     def test_filter_field_with_null_values(self, session):
@@ -712,6 +1074,169 @@ class TestApplyNotInFilter:
         assert result[1].id == 2
 
 
+class TestLargeInFilter:
+    @pytest.fixture(autouse=True)
+    def threshold(self):
+        with mock.patch("sa_filters.filters.LARGE_IN_THRESHOLD", 2):
+            yield
+
+    def compile(self, filters, dialect):
+        context = ResolutionContext(select(Bar), dialect=dialect)
+        filtered_stmt = apply_filters(select(Bar), filters, context=context)
+        return str(filtered_stmt.compile(dialect=dialect))
+
+    def test_postgresql(self):
+        dialect = postgresql.dialect()
+
+        in_sql = self.compile(
+            [{"field": "id", "op": "in", "value": [1, 2, 3]}], dialect
+        )
+        not_in_sql = self.compile(
+            [{"field": "id", "op": "not_in", "value": [1, 2, 3]}], dialect
+        )
+
+        assert "bar.id = ANY (%(param_1)s::INTEGER[])" in in_sql
+        assert "bar.id != ALL (%(param_1)s::INTEGER[])" in not_in_sql
+
+    def test_sqlite(self):
+        dialect = sqlite.dialect()
+
+        in_sql = self.compile(
+            [{"field": "id", "op": "in", "value": [1, 2, 3]}], dialect
+        )
+        not_in_sql = self.compile(
+            [{"field": "id", "op": "not_in", "value": [1, 2, 3]}], dialect
+        )
+
+        assert "bar.id IN (SELECT anon_1.value \nFROM json_each(?)" in in_sql
+        assert "bar.id NOT IN (SELECT anon_1.value \nFROM json_each(?)" in (not_in_sql)
+
+    @pytest.mark.parametrize("dialect", [postgresql.dialect(), sqlite.dialect()])
+    def test_below_threshold(self, dialect):
+        sql = self.compile([{"field": "id", "op": "in", "value": [1, 2]}], dialect)
+
+        assert "bar.id IN (__[POSTCOMPILE_id_1])" in sql
+
+    def test_values_that_are_not_json(self):
+        value = [Decimal(5), Decimal(10), Decimal(15)]
+
+        sql = self.compile(
+            [{"field": "count", "op": "in", "value": value}], sqlite.dialect()
+        )
+
+        assert "json_each" not in sql
+
+    def test_values_changed_when_bound(self):
+        dialect = sqlite.dialect()
+        context = ResolutionContext(select(Thud), dialect=dialect)
+
+        filtered_stmt = apply_filters(
+            select(Thud),
+            [{"field": "doubled", "op": "in", "value": [1, 2, 3]}],
+            context=context,
+        )
+
+        sql = str(filtered_stmt.compile(dialect=dialect))
+        assert "json_each" not in sql
+        assert "IN (__[POSTCOMPILE_" in sql
+
+    def test_unknown_dialect(self):
+        filters = [{"field": "id", "op": "in", "value": [1, 2, 3]}]
+
+        filtered_stmt = apply_filters(select(Bar), filters)
+
+        assert str(filtered_stmt) == str(select(Bar).filter(Bar.id.in_([1, 2, 3])))
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_in(self, session):
+        filters = [{"field": "name", "op": "in", "value": ["name_1", "name_4", "x"]}]
+
+        result = apply_filters(session.query(Bar), filters).all()
+
+        assert {bar.id for bar in result} == {1, 3, 4}
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_not_in(self, session):
+        filters = [{"field": "count", "op": "not_in", "value": [1, 5, 10]}]
+
+        result = apply_filters(session.query(Bar), filters).all()
+
+        assert {bar.id for bar in result} == {4}
+
+
+class TestInChunks:
+    @pytest.fixture(autouse=True)
+    def chunk_sizes(self):
+        with mock.patch.dict(
+            "sa_filters.filters.IN_CHUNK_SIZES", {"sqlite": 2, "mysql": 2}
+        ):
+            yield
+
+    def test_chunks(self):
+        filters = [{"field": "id", "op": "in", "value": [1, 2, 3, 4, 5]}]
+        context = ResolutionContext(select(Bar), dialect=mysql.dialect())
+
+        filtered_stmt = apply_filters(select(Bar), filters, context=context)
+
+        expected_stmt = select(Bar).filter(
+            Bar.id.in_([1, 2]) | Bar.id.in_([3, 4]) | Bar.id.in_([5])
+        )
+        assert str(filtered_stmt) == str(expected_stmt)
+
+    def test_not_in_chunks(self):
+        filters = [{"field": "id", "op": "not_in", "value": [1, 2, 3]}]
+        context = ResolutionContext(select(Bar), dialect=mysql.dialect())
+
+        filtered_stmt = apply_filters(select(Bar), filters, context=context)
+
+        expected_stmt = select(Bar).filter(Bar.id.not_in([1, 2]), Bar.id.not_in([3]))
+        assert str(filtered_stmt) == str(expected_stmt)
+
+    def test_duplicates_are_removed(self):
+        filters = [{"field": "id", "op": "in", "value": [1, 2, 1, 2, 2]}]
+        context = ResolutionContext(select(Bar), dialect=mysql.dialect())
+
+        filtered_stmt = apply_filters(select(Bar), filters, context=context)
+
+        assert filtered_stmt.whereclause.right.value == [1, 2]
+
+    def test_unhashable_values(self):
+        in_operator = Operator.get("in")
+
+        expression = in_operator.function(
+            tuple_(Bar.id, Bar.name), [[1, "name_1"], [1, "name_1"]]
+        )
+
+        assert expression.right.value == [[1, "name_1"], [1, "name_1"]]
+
+    def test_unknown_dialect(self):
+        filters = [{"field": "id", "op": "in", "value": [1, 2, 3, 1]}]
+
+        filtered_stmt = apply_filters(select(Bar), filters)
+
+        assert str(filtered_stmt) == str(select(Bar).filter(Bar.id.in_([1, 2, 3])))
+        assert filtered_stmt.whereclause.right.value == [1, 2, 3]
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_select(self, session):
+        filters = [{"field": "name", "op": "in", "value": ["name_1", "x", "name_4"]}]
+        context = ResolutionContext(select(Bar), dialect=sqlite.dialect())
+
+        filtered_stmt = apply_filters(select(Bar), filters, context=context)
+
+        assert " OR " in str(filtered_stmt)
+        result = session.execute(filtered_stmt).scalars().all()
+        assert {bar.id for bar in result} == {1, 3, 4}
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_query(self, session):
+        filters = [{"field": "count", "op": "not_in", "value": [1, 5, 5, 10]}]
+
+        result = apply_filters(session.query(Bar), filters).all()
+
+        assert {bar.id for bar in result} == {4}
+
+
 class TestDateFields:
     @pytest.mark.parametrize(
         "value", [datetime.date(2016, 7, 14), datetime.date(2016, 7, 14).isoformat()]
@@ -1279,3 +1804,1136 @@ class TestTableField:
             apply_filters(stmt, filters)
 
         assert "The query does not contain table `nope`." == err.value.args[0]
+
+
+class TestCompileFilters:
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_apply_with_different_values(self, session):
+        plan = compile_filters(Bar, [{"field": "name", "op": "==", "param": "name"}])
+
+        assert plan.params == ("name",)
+
+        result = session.execute(plan.apply({"name": "name_1"})).scalars().all()
+        assert {bar.id for bar in result} == {1, 3}
+
+        result = session.execute(plan.apply({"name": "name_4"})).scalars().all()
+        assert {bar.id for bar in result} == {4}
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_statement_is_reused(self, session):
+        plan = compile_filters(
+            select(Bar), {"field": "count", "op": ">=", "param": "count"}
+        )
+
+        first = plan.apply({"count": 5})
+        second = plan.apply({"count": 10})
+
+        assert str(first) == str(second) == str(plan.statement)
+        result = session.execute(plan.statement, {"count": 10}).scalars().all()
+        assert {bar.id for bar in result} == {2, 4}
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_nested_filters_and_auto_join(self, session):
+        spec_shape = {
+            "or": [
+                {"field": "name", "op": "==", "param": "name"},
+                {"model": "Bar", "field": "count", "op": "in", "param": "counts"},
+                {"model": "Bar", "field": "count", "op": "is_null"},
+            ]
+        }
+        plan = compile_filters(Foo, spec_shape)
+
+        assert plan.params == ("name", "counts")
+
+        stmt = plan.apply({"name": "name_2", "counts": [15]})
+        result = session.execute(stmt).scalars().all()
+        assert {foo.id for foo in result} == {2, 3, 4}
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_fixed_values_and_repeated_params(self, session):
+        spec_shape = [
+            {"field": "name", "op": "==", "value": "name_1"},
+            {"or": [{"field": "id", "param": "id"}, {"field": "count", "param": "id"}]},
+        ]
+        plan = compile_filters(Bar, spec_shape)
+
+        assert plan.params == ("id",)
+
+        result = session.execute(plan.apply({"id": 1})).scalars().all()
+        assert {bar.id for bar in result} == {1}
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_query_object(self, session):
+        plan = compile_filters(
+            session.query(Bar), {"field": "name", "op": "!=", "param": "name"}
+        )
+
+        result = plan.apply({"name": "name_1"}).all()
+        assert {bar.id for bar in result} == {2, 4}
+
+    def test_missing_value(self, session):
+        plan = compile_filters(Bar, {"field": "name", "op": "==", "param": "name"})
+
+        with pytest.raises(BadFilterFormat) as err:
+            plan.apply({})
+
+        assert "Missing value for parameter `name`." == err.value.args[0]
+
+    def test_invalid_spec(self, session):
+        with pytest.raises(BadFilterFormat) as err:
+            compile_filters(Bar, ["invalid"])
+
+        expected_error = "Filter spec `invalid` should be a dictionary."
+        assert expected_error == err.value.args[0]
+
+
+class TestSpecFingerprint:
+    def test_values_are_ignored(self):
+        first = {"field": "name", "op": "==", "value": "name_1"}
+        second = {"field": "name", "op": "==", "value": "name_2"}
+
+        assert get_spec_fingerprint(first) == get_spec_fingerprint(second)
+        assert get_spec_fingerprint(first, include_values=True) != get_spec_fingerprint(
+            second, include_values=True
+        )
+
+    def test_null_value_is_part_of_the_structure(self):
+        first = {"field": "name", "op": "==", "value": "name_1"}
+        second = {"field": "name", "op": "==", "value": None}
+
+        assert get_spec_fingerprint(first) != get_spec_fingerprint(second)
+
+    def test_unknown_operator(self):
+        first = {"field": "name", "op": "unknown", "value": "name_1"}
+        second = {"field": "name", "op": "==", "value": "name_1"}
+
+        assert get_spec_fingerprint(first) == get_spec_fingerprint(dict(first))
+        assert get_spec_fingerprint(first) != get_spec_fingerprint(second)
+
+    def test_key_order_and_operator_aliases(self):
+        first = {"model": "Foo", "field": "count", "op": "ge", "value": 1}
+        second = {"value": 2, "op": ">=", "field": "count", "model": "Foo"}
+
+        assert get_spec_fingerprint(first) == get_spec_fingerprint(second)
+
+    def test_operator_instances(self):
+        first = {"field": "count", "op": Operator.get(">="), "value": 1}
+        second = {"field": "count", "op": ">=", "value": 1}
+
+        assert get_spec_fingerprint(first) == get_spec_fingerprint(second)
+
+    def test_commutative_arguments(self):
+        name = {"field": "name", "op": "==", "value": "name_1"}
+        count = {"field": "count", "op": ">", "value": 5}
+        null = {"field": "count", "op": "is_null"}
+
+        first = [{"or": [name, {"and": [count, null]}]}, null]
+        second = [null, {"or": [{"and": [null, count]}, name]}]
+
+        assert get_spec_fingerprint(first) == get_spec_fingerprint(second)
+
+    def test_structure_changes(self):
+        name = {"field": "name", "op": "==", "value": "name_1"}
+        count = {"field": "count", "op": ">", "value": 5}
+
+        fingerprints = {
+            get_spec_fingerprint({"or": [name, count]}),
+            get_spec_fingerprint({"and": [name, count]}),
+            get_spec_fingerprint({"not": [name]}),
+            get_spec_fingerprint(name),
+            get_spec_fingerprint(dict(name, model="Bar")),
+            get_spec_fingerprint(dict(name, op="!=")),
+        }
+        assert len(fingerprints) == 6
+
+    def test_invalid_specs(self):
+        assert get_spec_fingerprint({"or": "a"}) != get_spec_fingerprint(["a"])
+
+    def test_sort_spec(self):
+        by_name = {"field": "name", "direction": "asc"}
+        by_id = {"field": "id", "direction": "desc"}
+
+        assert get_spec_fingerprint(sort_spec=[by_name]) == get_spec_fingerprint(
+            sort_spec=by_name
+        )
+        assert get_spec_fingerprint(sort_spec=[by_name, by_id]) != get_spec_fingerprint(
+            sort_spec=[by_id, by_name]
+        )
+        assert get_spec_fingerprint(sort_spec=["id"]) != get_spec_fingerprint(
+            sort_spec=["name"]
+        )
+
+    def test_load_spec(self):
+        first = [{"model": "Foo", "fields": ["id", "name"]}, {"model": "Bar"}]
+        second = [{"model": "Bar"}, {"fields": ["name", "id"], "model": "Foo"}]
+
+        assert get_spec_fingerprint(load_spec=first) == get_spec_fingerprint(
+            load_spec=second
+        )
+        assert get_spec_fingerprint(load_spec=["id"]) == get_spec_fingerprint(
+            load_spec={"fields": ["id"]}
+        )
+        assert get_spec_fingerprint(load_spec=["id"]) != get_spec_fingerprint(
+            load_spec=[1]
+        )
+
+    def test_combined_specs(self):
+        filter_spec = {"field": "name", "op": "==", "value": "name_1"}
+        sort_spec = {"field": "name", "direction": "asc"}
+
+        assert get_spec_fingerprint(filter_spec, sort_spec) != get_spec_fingerprint(
+            filter_spec
+        )
+        assert get_spec_fingerprint(filter_spec, sort_spec) == get_spec_fingerprint(
+            filter_spec=dict(filter_spec, value="name_2"), sort_spec=sort_spec
+        )
+
+
+class TestOperators:
+    def test_operators_are_shared(self):
+        assert Operator.get("==") is Operator.get("eq") is Operator.get()
+        assert Operator.get("==").name == "=="
+        assert Operator.get("is_null").arity == 1
+        assert Operator.get("in").arity == 2
+
+    @pytest.mark.parametrize("operator", ["op_not_valid", ["=="]])
+    def test_invalid_operator(self, operator):
+        with pytest.raises(BadFilterFormat) as err:
+            Operator.get(operator)
+
+        assert "Operator `{}` not valid.".format(operator) == err.value.args[0]
+
+    def test_arity_is_not_inspected_per_filter(self, session):
+        filters = [{"field": "name", "op": "==", "value": "name_1"}] * 10
+
+        with mock.patch("sa_filters.filters.signature") as signature:
+            apply_filters(select(Bar), filters)
+
+        assert signature.call_count == 0
+
+    @pytest.fixture
+    def custom_operator(self):
+        def startswith(f, a):
+            return f.startswith(a)
+
+        def startswith_sqlite(f, a):
+            return f.like(a + "%")
+
+        operator = register_operator(
+            "startswith",
+            startswith,
+            dialect_functions={"sqlite": startswith_sqlite},
+            aliases=("sw",),
+        )
+        yield operator
+        del Operator.OPERATORS["startswith"]
+        del Operator.OPERATORS["sw"]
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_register_operator(self, session, custom_operator):
+        assert custom_operator.arity == 2
+        assert Operator.get("sw") is custom_operator
+
+        stmt = select(Bar)
+        filtered_stmt = apply_filters(
+            stmt, [{"field": "name", "op": "startswith", "value": "name_"}]
+        )
+
+        assert "LIKE" in str(filtered_stmt)
+        assert len(session.execute(filtered_stmt).all()) == 4
+
+    def test_dialect_function(self, session, custom_operator):
+        sqlite = mock.Mock()
+        sqlite.name = "sqlite"
+        stmt = select(Bar)
+        filters = [{"field": "name", "op": "startswith", "value": "name_"}]
+
+        filtered_stmt = apply_filters(
+            stmt, filters, context=ResolutionContext(stmt, dialect=sqlite)
+        )
+
+        assert str(filtered_stmt) == str(
+            select(Bar).filter(Bar.name.like("name_" + "%"))
+        )
+        assert str(apply_filters(stmt, filters, dialect=sqlite)) == str(filtered_stmt)
+
+
+def nested_spec(depth):
+    """A spec with `depth - 1` nested `and` and `or` functions."""
+    spec = {"field": "id", "op": "==", "value": 0}
+    for position in range(1, depth):
+        key = "and" if position % 2 else "or"
+        spec = {key: [[spec], {"field": "id", "op": "==", "value": position}]}
+    return spec
+
+
+class TestBuildFilters:
+    def test_lists_are_flattened(self):
+        name = {"field": "name", "op": "==", "value": "name_1"}
+        count = {"field": "count", "op": ">", "value": 5}
+
+        filters = build_filters([[name], [[count], {"not": [[name]]}]])
+
+        assert [type(filter) for filter in filters] == [Filter, Filter, BooleanFilter]
+        assert [filter.filter_spec for filter in filters[:2]] == [name, count]
+        assert filters[2].filters[0].filter_spec == name
+
+    def test_nested_functions(self):
+        (filter,) = build_filters(nested_spec(4))
+
+        assert filter.function is and_
+        values = []
+        while isinstance(filter, BooleanFilter):
+            filter, last = filter.filters
+            values.append(last.filter_spec["value"])
+        values.append(filter.filter_spec["value"])
+        assert values == [3, 2, 1, 0]
+
+    def test_deep_spec(self):
+        filters = build_filters(nested_spec(5000))
+
+        assert len(filters) == 1
+
+    def test_max_depth(self):
+        build_filters(nested_spec(3), max_depth=3)
+
+        with pytest.raises(BadFilterFormat) as err:
+            build_filters(nested_spec(3), max_depth=1)
+
+        expected_error = "Filter spec is nested deeper than 1 levels."
+        assert expected_error == err.value.args[0]
+
+    def test_only_parsed_attributes_are_kept(self):
+        (filter,) = build_filters(
+            {"not": [{"model": "Bar", "field": "count", "op": "ge", "value": 5}]}
+        )
+
+        assert not hasattr(filter, "__dict__")
+        assert not hasattr(filter.filters[0], "__dict__")
+        assert not hasattr(filter.filters[0].operator, "__dict__")
+        assert filter.filters[0].filter_spec == {
+            "model": "Bar",
+            "field": "count",
+            "op": ">=",
+            "value": 5,
+        }
+
+    def test_spec_of_unary_filter(self):
+        (filter,) = build_filters({"table": "bar", "field": "count", "op": "is_null"})
+
+        assert filter.filter_spec == {"table": "bar", "field": "count", "op": "is_null"}
+
+    def test_invalid_nested_function(self):
+        with pytest.raises(BadFilterFormat) as err:
+            build_filters({"and": [nested_spec(10), {"or": []}]})
+
+        expected_error = "`or` must have one or more arguments"
+        assert expected_error == err.value.args[0]
+
+
+class TestSpecBudget:
+    NAME = {"field": "name", "op": "==", "value": "name_1"}
+
+    def check(self, filter_spec, **limits):
+        with pytest.raises(SpecTooComplex) as err:
+            apply_filters(select(Foo), filter_spec, budget=SpecBudget(**limits))
+        return err.value.args[0]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_within_budget(self, session):
+        budget = SpecBudget(
+            max_nodes=5, max_depth=2, max_in_size=2, max_models=1, max_joins=2
+        )
+        filters = [
+            {"or": [self.NAME, {"field": "id", "op": "in", "value": [3, 4]}]},
+            {"model": "Bar", "field": "count", "op": "is_not_null"},
+            {"field": "bar.name", "op": "!=", "value": "name_2"},
+        ]
+
+        filtered_stmt = apply_filters(select(Foo), filters, budget=budget)
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert sorted(foo.id for foo in result) == [1, 4]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_generator_spec(self, session):
+        filters = [self.NAME, {"field": "id", "op": "<", "value": 3}]
+
+        filtered_stmt = apply_filters(
+            select(Foo), (spec for spec in filters), budget=SpecBudget(max_nodes=2)
+        )
+        result = session.execute(filtered_stmt).scalars().all()
+
+        assert [foo.id for foo in result] == [1]
+
+    def test_max_nodes(self):
+        filters = [[self.NAME], {"not": [self.NAME]}]
+
+        assert self.check(filters, max_nodes=2) == (
+            "Filter spec has more than 2 nodes."
+        )
+
+    def test_max_depth(self):
+        filters = [{"and": [{"or": [self.NAME, {"not": [self.NAME]}]}]}]
+
+        assert self.check(filters, max_depth=3) == (
+            "Filter spec is nested deeper than 3 levels."
+        )
+
+    def test_max_in_size(self):
+        filters = {
+            "or": [
+                {"field": "id", "op": "in", "value": [1, 2]},
+                {"field": "id", "op": "not_in", "value": range(3)},
+            ]
+        }
+
+        assert self.check(filters, max_in_size=2) == (
+            "`not_in` filter has more than 2 values."
+        )
+
+    def test_max_models(self):
+        filters = [
+            {"model": "Foo", "field": "name", "op": "is_null"},
+            {"model": "Bar", "field": "name", "op": "is_null"},
+            {"table": "bar", "field": "name", "op": "is_null"},
+        ]
+
+        assert self.check(filters, max_models=2) == (
+            "Filter spec names more than 2 models."
+        )
+
+    def test_max_joins(self):
+        filters = [
+            {"model": "Foo", "field": "name", "op": "is_null"},
+            {"table": "bar", "field": "name", "op": "is_null"},
+            {"model": "Qux", "field": "name", "op": "is_null"},
+        ]
+
+        assert self.check(filters, max_joins=1) == (
+            "Filter spec requires more than 1 joins."
+        )
+
+    def test_max_joins_of_field_paths(self):
+        filters = [
+            {"field": "bar.name", "op": "is_null"},
+            {"field": "bar.foos.name", "op": "is_null"},
+            {"field": "bar.foos.count", "op": "is_null"},
+        ]
+
+        assert self.check(filters, max_joins=1) == (
+            "Filter spec requires more than 1 joins."
+        )
+        SpecBudget(max_joins=2).check(filters)
+
+    def test_without_context(self):
+        budget = SpecBudget(max_joins=1)
+        filters = [
+            {"model": "Foo", "field": "name", "op": "is_null"},
+            {"model": "Bar", "field": "name", "op": "is_null"},
+        ]
+
+        budget.check(filters, ResolutionContext(select(Foo)))
+        with pytest.raises(SpecTooComplex):
+            budget.check(filters)
+
+    def test_max_joins_of_join_paths(self):
+        filters = [
+            {"model": "Quux", "field": "name", "op": "is_null"},
+            {"model": "Foo", "field": "name", "op": "is_null"},
+        ]
+        context = ResolutionContext(select(Bar))
+
+        # Quux is joined through Foo, which is joined once
+        SpecBudget(max_joins=2).check(filters, context)
+        with pytest.raises(SpecTooComplex) as err:
+            SpecBudget(max_joins=1).check(filters[:1], context)
+
+        assert err.value.args[0] == "Filter spec requires more than 1 joins."
+
+    def test_checked_before_filters_are_built(self):
+        filters = [self.NAME, {"field": "id", "op": "unknown"}]
+
+        with mock.patch("sa_filters.filters.Filter") as filter_mock:
+            assert self.check(filters, max_nodes=1) == (
+                "Filter spec has more than 1 nodes."
+            )
+
+        assert filter_mock.call_count == 0
+
+    def test_no_default_max_depth(self):
+        spec = {"field": "id", "op": "==", "value": 0}
+        for position in range(1, 250):
+            spec = {"and": [spec, {"field": "count", "op": ">", "value": position}]}
+
+        filtered_stmt = apply_filters(select(Bar), spec, budget=SpecBudget())
+
+        assert "bar.count" in str(filtered_stmt)
+
+    def test_invalid_specs_are_left_to_build_filters(self):
+        budget = SpecBudget(max_nodes=10, max_depth=2)
+
+        with pytest.raises(BadFilterFormat) as err:
+            apply_filters(select(Foo), [{"or": self.NAME}, "name"], budget=budget)
+
+        expected_error = "`or` value must be an iterable across the function arguments"
+        assert expected_error == err.value.args[0]
+
+
+class TestSimplifyFilters:
+    NAME = {"field": "name", "op": "==", "value": "name_1"}
+    COUNT = {"field": "count", "op": ">", "value": 5}
+    ID = {"field": "id", "op": "!=", "value": 3}
+
+    def simplify(self, filter_spec, coalesce=True):
+        return simplify_filters(
+            build_filters(filter_spec), coalesce, ResolutionContext(select(Bar))
+        )
+
+    def test_nested_functions_are_flattened(self):
+        filters = self.simplify(
+            {"or": [self.NAME, {"or": [self.COUNT, {"or": [self.ID]}]}]}
+        )
+
+        (filter,) = filters
+        assert isinstance(filter, BooleanFilter)
+        assert [f.filter_spec for f in filter.filters] == [
+            self.NAME,
+            self.COUNT,
+            self.ID,
+        ]
+
+    def test_single_argument_wrappers_and_duplicates(self):
+        filters = self.simplify(
+            [{"and": [{"and": [{"or": [self.NAME]}]}, self.COUNT]}, self.NAME]
+        )
+
+        assert [f.filter_spec for f in filters] == [self.NAME, self.COUNT]
+
+    def test_duplicates_in_any_order(self):
+        filters = self.simplify(
+            [
+                {"or": [self.NAME, self.COUNT]},
+                {"or": [dict(self.COUNT, op="gt"), self.NAME]},
+            ]
+        )
+
+        assert len(filters) == 1
+
+    def test_same_field_with_different_values_is_kept(self):
+        filters = self.simplify(
+            {"or": [self.NAME, dict(self.NAME, value="x")]}, coalesce=False
+        )
+
+        (filter,) = filters
+        assert len(filter.filters) == 2
+
+    def test_double_negation(self):
+        filters = self.simplify({"not": [{"not": [self.NAME]}]})
+
+        assert [f.filter_spec for f in filters] == [self.NAME]
+
+    def test_single_negation(self):
+        (filter,) = self.simplify({"not": [{"and": [self.NAME]}]})
+
+        assert filter.function is not_
+        assert filter.filters[0].filter_spec == self.NAME
+
+    def test_known_false(self):
+        empty_in = {"field": "id", "op": "in", "value": []}
+
+        (filter,) = self.simplify([self.NAME, {"or": [empty_in]}])
+
+        assert isinstance(filter, ConstantFilter)
+        assert filter.value is False
+
+    def test_known_true(self):
+        empty_not_in = {"field": "id", "op": "not_in", "value": []}
+
+        (filter,) = self.simplify({"or": [self.NAME, empty_not_in]})
+
+        assert isinstance(filter, ConstantFilter)
+        assert filter.value is True
+
+    def test_constants_are_folded(self):
+        empty_in = {"field": "id", "op": "in", "value": []}
+
+        filters = self.simplify(
+            [{"or": [self.NAME, empty_in]}, {"not": [empty_in]}, self.COUNT]
+        )
+
+        or_filter, count_filter, true_filter = filters
+        name_filter, false_filter = or_filter.filters
+        assert [name_filter.filter_spec, count_filter.filter_spec] == [
+            self.NAME,
+            self.COUNT,
+        ]
+        # the constants are left in place to be validated
+        assert isinstance(false_filter, ConstantFilter)
+        assert false_filter.value is False
+        assert isinstance(true_filter, ConstantFilter)
+        assert true_filter.value is True
+
+    def test_negated_constant(self):
+        empty_in = {"field": "id", "op": "in", "value": []}
+
+        (filter,) = self.simplify({"and": [{"not": [{"not": [empty_in]}]}]})
+
+        assert isinstance(filter, ConstantFilter)
+        assert filter.value is False
+
+    def test_no_filters(self):
+        assert self.simplify([]) == []
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_shorter_sql(self, session):
+        filter_spec = {"and": [{"and": [{"or": [self.NAME]}]}, self.NAME]}
+
+        filtered_stmt = apply_filters(select(Bar), filter_spec)
+
+        assert str(filtered_stmt) == str(select(Bar).filter(Bar.name == "name_1"))
+        assert len(session.execute(filtered_stmt).all()) == 2
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_known_false_filter(self, session):
+        filter_spec = [self.NAME, {"field": "id", "op": "in", "value": []}]
+
+        filtered_stmt = apply_filters(select(Bar), filter_spec)
+
+        assert str(filtered_stmt) == str(select(Bar).filter(false()))
+        assert session.execute(filtered_stmt).all() == []
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_known_true_filter(self, session):
+        filter_spec = {"field": "id", "op": "not_in", "value": []}
+
+        filtered_stmt = apply_filters(select(Bar), filter_spec)
+
+        assert str(filtered_stmt) == str(select(Bar))
+        assert len(session.execute(filtered_stmt).all()) == 4
+
+    def test_folded_filters_are_validated(self, session):
+        filter_spec = {"field": "missing", "op": "not_in", "value": []}
+
+        with pytest.raises(FieldNotFound):
+            apply_filters(select(Bar), filter_spec)
+
+    @pytest.mark.parametrize(
+        "filter_spec",
+        [
+            [NAME, {"field": "missing", "op": "not_in", "value": []}],
+            {"or": [NAME, {"field": "missing", "op": "in", "value": []}]},
+        ],
+    )
+    def test_dropped_filters_are_validated(self, filter_spec):
+        with pytest.raises(FieldNotFound):
+            apply_filters(select(Bar), filter_spec)
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_dropped_filters_sql(self, session):
+        empty_in = {"field": "id", "op": "in", "value": []}
+        filter_spec = [{"or": [self.NAME, empty_in]}, {"not": [empty_in]}]
+
+        filtered_stmt = apply_filters(select(Bar), filter_spec)
+
+        assert str(filtered_stmt) == str(select(Bar).filter(Bar.name == "name_1"))
+        assert len(session.execute(filtered_stmt).all()) == 2
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_folded_filters_are_joined(self, session):
+        filter_spec = {"model": "Bar", "field": "id", "op": "not_in", "value": []}
+
+        filtered_stmt = apply_filters(select(Foo), filter_spec)
+
+        assert "JOIN bar" in str(filtered_stmt)
+
+
+class TestCoalesceFilters:
+    def simplify(self, filter_spec, coalesce=True):
+        filters = simplify_filters(
+            build_filters(filter_spec), coalesce, ResolutionContext(select(Bar))
+        )
+        return [(f.operator.name, f.value) for f in filters]
+
+    def test_equalities_in_or(self):
+        filter_spec = {
+            "or": [
+                {"field": "id", "op": "==", "value": 1},
+                {"field": "id", "op": "in", "value": [2, 1]},
+                {"field": "id", "op": "eq", "value": 3},
+            ]
+        }
+
+        assert self.simplify(filter_spec) == [("in", [1, 2, 3])]
+
+    def test_memberships_in_and(self):
+        filter_spec = [
+            {"field": "id", "op": "in", "value": [1, 2, 3]},
+            {"field": "id", "op": "in", "value": [3, 2, 4]},
+            {"field": "id", "op": "<", "value": 3},
+        ]
+
+        assert self.simplify(filter_spec) == [("==", 2)]
+
+    def test_tightest_range(self):
+        filter_spec = [
+            {"field": "count", "op": ">", "value": 1},
+            {"field": "count", "op": ">=", "value": 5},
+            {"field": "count", "op": ">", "value": 5},
+            {"field": "count", "op": "<", "value": 20},
+        ]
+
+        assert self.simplify(filter_spec) == [(">", 5), ("<", 20)]
+
+    def test_between(self):
+        filter_spec = [
+            {"field": "count", "op": ">=", "value": 5},
+            {"field": "count", "op": "<=", "value": 20},
+            {"field": "count", "op": "<=", "value": 10},
+        ]
+
+        assert self.simplify(filter_spec) == [("between", (5, 10))]
+
+    def test_loosest_range_in_or(self):
+        filter_spec = {
+            "or": [
+                {"field": "count", "op": ">", "value": 5},
+                {"field": "count", "op": ">=", "value": 5},
+                {"field": "count", "op": "<", "value": 1},
+            ]
+        }
+
+        (filter,) = simplify_filters(
+            build_filters(filter_spec), context=ResolutionContext(select(Bar))
+        )
+
+        assert [(f.operator.name, f.value) for f in filter.filters] == [
+            (">=", 5),
+            ("<", 1),
+        ]
+
+    def test_single_value_in_or(self):
+        filter_spec = {
+            "or": [
+                {"field": "id", "op": "==", "value": 1},
+                {"field": "id", "op": "in", "value": [1]},
+                {"field": "id", "op": ">", "value": 5},
+            ]
+        }
+
+        (filter,) = simplify_filters(
+            build_filters(filter_spec), context=ResolutionContext(select(Bar))
+        )
+
+        assert [(f.operator.name, f.value) for f in filter.filters] == [
+            ("==", 1),
+            (">", 5),
+        ]
+
+    def test_different_fields_are_not_coalesced(self):
+        filter_spec = [
+            {"field": "count", "op": ">=", "value": 5},
+            {"field": "id", "op": "<=", "value": 10},
+            {"model": "Bar", "field": "id", "op": ">=", "value": 1},
+        ]
+
+        assert self.simplify(filter_spec) == [(">=", 5), ("<=", 10), (">=", 1)]
+
+    def test_values_that_cannot_be_compared(self):
+        filter_spec = [
+            {"field": "count", "op": ">=", "value": 5},
+            {"field": "count", "op": ">", "value": "10"},
+        ]
+
+        assert self.simplify(filter_spec) == [(">=", 5), (">", "10")]
+
+    def test_string_bounds_in_or(self):
+        filter_spec = {
+            "or": [
+                {"field": "count", "op": ">=", "value": "9"},
+                {"field": "count", "op": ">=", "value": "10"},
+            ]
+        }
+
+        (filter,) = simplify_filters(
+            build_filters(filter_spec), context=ResolutionContext(select(Bar))
+        )
+
+        assert [(f.operator.name, f.value) for f in filter.filters] == [
+            (">=", "9"),
+            (">=", "10"),
+        ]
+
+    @pytest.mark.parametrize("function", ["and", "or"])
+    def test_lists_with_none(self, function):
+        filter_spec = {
+            function: [
+                {"field": "id", "op": "in", "value": [None, 1]},
+                {"field": "id", "op": "in", "value": [None, 2]},
+            ]
+        }
+
+        filters = simplify_filters(
+            build_filters(filter_spec), context=ResolutionContext(select(Bar))
+        )
+        if function == "or":
+            (filter,) = filters
+            filters = filter.filters
+
+        assert [(f.operator.name, f.value) for f in filters] == [
+            ("in", [None, 1]),
+            ("in", [None, 2]),
+        ]
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_string_bounds_in_or_sql(self, session):
+        filter_spec = {
+            "or": [
+                {"field": "count", "op": ">=", "value": "9"},
+                {"field": "count", "op": ">=", "value": "10"},
+            ]
+        }
+
+        filtered_stmt = apply_filters(select(Bar), filter_spec)
+
+        result = session.execute(filtered_stmt).scalars().all()
+        assert {bar.id for bar in result} == {2, 4}
+
+    def test_sql_expression_values(self):
+        filter_spec = [
+            {"field": "count", "op": ">=", "value": 5},
+            {"field": "count", "op": "<=", "value": bindparam("count")},
+        ]
+
+        assert len(self.simplify(filter_spec)) == 2
+
+    def test_disabled(self):
+        filter_spec = [
+            {"field": "count", "op": ">=", "value": 5},
+            {"field": "count", "op": "<=", "value": 10},
+        ]
+
+        assert self.simplify(filter_spec, coalesce=False) == [
+            (">=", 5),
+            ("<=", 10),
+        ]
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_between_sql(self, session):
+        filter_spec = [
+            {"field": "count", "op": ">=", "value": 5},
+            {"field": "count", "op": "<=", "value": 10},
+        ]
+
+        filtered_stmt = apply_filters(select(Bar), filter_spec)
+
+        assert "BETWEEN" in str(filtered_stmt)
+        result = session.execute(filtered_stmt).scalars().all()
+        assert {bar.id for bar in result} == {1, 2}
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_in_sql(self, session):
+        filter_spec = {
+            "or": [
+                {"field": "name", "op": "==", "value": "name_1"},
+                {"field": "name", "op": "==", "value": "name_4"},
+            ]
+        }
+
+        filtered_stmt = apply_filters(select(Bar), filter_spec)
+        not_coalesced_stmt = apply_filters(select(Bar), filter_spec, coalesce=False)
+
+        assert " IN " in str(filtered_stmt)
+        assert " IN " not in str(not_coalesced_stmt)
+        result = session.execute(filtered_stmt).scalars().all()
+        assert {bar.id for bar in result} == {1, 3, 4}
+
+
+class TestContradictions:
+    def simplify(self, filter_spec, coalesce=True):
+        return simplify_filters(
+            build_filters(filter_spec), coalesce, ResolutionContext(select(Bar))
+        )
+
+    def assert_false(self, filter_spec, coalesce=True):
+        (filter,) = self.simplify(filter_spec, coalesce)
+        assert isinstance(filter, ConstantFilter)
+        assert filter.value is False
+
+    @pytest.mark.parametrize(
+        "filter_spec",
+        [
+            [
+                {"field": "id", "op": "==", "value": 1},
+                {"field": "id", "op": "==", "value": 2},
+            ],
+            [
+                {"field": "id", "op": "in", "value": [1, 2]},
+                {"field": "id", "op": "in", "value": [3]},
+            ],
+            [
+                {"field": "count", "op": ">", "value": 5},
+                {"field": "count", "op": "<", "value": 3},
+            ],
+            [
+                {"field": "count", "op": ">", "value": 5},
+                {"field": "count", "op": "<=", "value": 5},
+            ],
+            [
+                {"field": "id", "op": "==", "value": 1},
+                {"field": "id", "op": ">", "value": 1},
+            ],
+            [
+                {"field": "id", "op": "in", "value": [1, 2]},
+                {"field": "id", "op": "not_in", "value": [2]},
+                {"field": "id", "op": "!=", "value": 1},
+            ],
+            [
+                {"field": "count", "op": "is_null"},
+                {"field": "count", "op": "is_not_null"},
+            ],
+            [
+                {"field": "count", "op": "is_null"},
+                {"field": "count", "op": ">=", "value": 5},
+            ],
+            {"field": "id", "op": "in", "value": []},
+        ],
+    )
+    def test_contradictions(self, filter_spec):
+        self.assert_false(filter_spec)
+
+    def test_contradiction_in_or(self):
+        name = {"field": "name", "op": "==", "value": "name_1"}
+        filter_spec = {
+            "or": [
+                name,
+                {
+                    "and": [
+                        {"field": "count", "op": ">", "value": 5},
+                        {"field": "count", "op": "<", "value": 3},
+                    ]
+                },
+            ]
+        }
+
+        (filter,) = self.simplify(filter_spec)
+
+        name_filter, false_filter = filter.filters
+        assert name_filter.filter_spec == name
+        assert isinstance(false_filter, ConstantFilter)
+        assert false_filter.value is False
+
+    def test_contradiction_with_other_filters(self):
+        self.assert_false(
+            [
+                {"field": "name", "op": "==", "value": "name_1"},
+                {
+                    "or": [
+                        {"field": "id", "op": "==", "value": 1},
+                        {"field": "id", "op": "==", "value": 2},
+                    ]
+                },
+                {"field": "id", "op": ">=", "value": 3},
+            ]
+        )
+
+    def test_not_coalesced(self):
+        filters = self.simplify(
+            [
+                {"field": "id", "op": "==", "value": 1},
+                {"field": "id", "op": "==", "value": 2},
+            ],
+            coalesce=False,
+        )
+
+        assert [(f.operator.name, f.value) for f in filters] == [("==", 1), ("==", 2)]
+
+    @pytest.mark.parametrize(
+        "filter_spec",
+        [
+            # the database converts the values to the type of the column
+            [
+                {"field": "id", "op": "==", "value": "1"},
+                {"field": "id", "op": "==", "value": 1},
+            ],
+            [
+                {"field": "count", "op": ">=", "value": "5"},
+                {"field": "count", "op": "<=", "value": "10"},
+            ],
+            [
+                {"field": "count", "op": ">", "value": True},
+                {"field": "count", "op": "<", "value": 1},
+            ],
+            # the collation of the column may be case insensitive
+            [
+                {"field": "name", "op": "==", "value": "name_1"},
+                {"field": "name", "op": "==", "value": "NAME_1"},
+            ],
+        ],
+    )
+    def test_values_not_of_the_type_of_the_field(self, filter_spec):
+        assert len(self.simplify(filter_spec)) == 2
+
+    @pytest.mark.parametrize(
+        "field, values",
+        [
+            ("data", [{"a": 1}, {"a": 2}]),
+            ("doubled", [1, 2]),
+            ("untyped", [1, 2]),
+        ],
+    )
+    def test_fields_not_compared_in_python(self, field, values):
+        filters = simplify_filters(
+            build_filters([{"field": field, "op": "==", "value": v} for v in values]),
+            context=ResolutionContext(select(Thud)),
+        )
+
+        assert len(filters) == 2
+
+    def test_without_context(self):
+        filters = simplify_filters(
+            build_filters(
+                [
+                    {"field": "id", "op": "==", "value": 1},
+                    {"field": "id", "op": "==", "value": 2},
+                ]
+            )
+        )
+
+        assert len(filters) == 2
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_string_values_sql(self, session):
+        filter_spec = [
+            {"field": "count", "op": ">=", "value": "5"},
+            {"field": "count", "op": "<=", "value": "10"},
+        ]
+
+        filtered_stmt = apply_filters(select(Bar), filter_spec)
+
+        assert not is_known_empty(filtered_stmt)
+        result = session.execute(filtered_stmt).scalars().all()
+        assert {bar.id for bar in result} == {1, 2}
+
+    def test_not_folded_when_negated(self):
+        # a null `count` is neither greater nor lower than a value, so the
+        # negated filter is unknown for it rather than true
+        filter_spec = {
+            "not": [
+                {
+                    "and": [
+                        {"field": "count", "op": ">", "value": 5},
+                        {"field": "count", "op": "<", "value": 3},
+                    ]
+                }
+            ]
+        }
+
+        (filter,) = self.simplify(filter_spec)
+
+        assert filter.function is not_
+        assert len(filter.filters[0].filters) == 2
+
+    def test_folded_when_negated_twice(self):
+        self.assert_false(
+            {
+                "not": [
+                    {
+                        "not": [
+                            {
+                                "and": [
+                                    {"field": "count", "op": ">", "value": 5},
+                                    {"field": "count", "op": "<", "value": 3},
+                                ]
+                            }
+                        ]
+                    }
+                ]
+            }
+        )
+
+    def test_satisfiable(self):
+        filters = self.simplify(
+            [
+                {"field": "count", "op": ">=", "value": 5},
+                {"field": "count", "op": "<=", "value": 5},
+                {"field": "count", "op": "!=", "value": 3},
+            ]
+        )
+
+        assert [(f.operator.name, f.value) for f in filters] == [("==", 5)]
+
+    def test_values_excluded_from_a_list(self):
+        filters = self.simplify(
+            [
+                {"field": "id", "op": "in", "value": [1, 2, 3]},
+                {"field": "id", "op": "!=", "value": 2},
+                {"field": "id", "op": "is_not_null"},
+            ]
+        )
+
+        assert [(f.operator.name, f.value) for f in filters] == [
+            ("in", [1, 3]),
+            ("is_not_null", None),
+        ]
+
+    def test_exclusions(self):
+        filters = self.simplify(
+            [
+                {"field": "id", "op": "!=", "value": 1},
+                {"field": "id", "op": "not_in", "value": [2, 1]},
+                {"field": "id", "op": ">", "value": 0},
+            ]
+        )
+
+        assert [(f.operator.name, f.value) for f in filters] == [
+            (">", 0),
+            ("not_in", [1, 2]),
+        ]
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_is_known_empty(self, session):
+        filter_spec = [
+            {"field": "id", "op": "==", "value": 1},
+            {"field": "id", "op": "==", "value": 2},
+        ]
+        stmt = select(Bar).filter(Bar.name == "name_1")
+
+        filtered_stmt = apply_filters(stmt, filter_spec)
+
+        assert is_known_empty(filtered_stmt)
+        assert not is_known_empty(stmt)
+        assert session.execute(filtered_stmt).all() == []
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_is_known_empty_query(self, session):
+        filter_spec = [
+            {"field": "count", "op": ">", "value": 5},
+            {"field": "count", "op": "<", "value": 3},
+        ]
+        query = session.query(Bar)
+
+        filtered_query = apply_filters(query, filter_spec)
+
+        assert is_known_empty(filtered_query)
+        assert not is_known_empty(query)
+        assert filtered_query.all() == []
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_negated_contradiction_sql(self, session):
+        filter_spec = {
+            "not": [
+                {
+                    "and": [
+                        {"field": "count", "op": ">", "value": 5},
+                        {"field": "count", "op": "<", "value": 3},
+                    ]
+                }
+            ]
+        }
+
+        filtered_stmt = apply_filters(select(Bar), filter_spec)
+
+        assert not is_known_empty(filtered_stmt)
+        result = session.execute(filtered_stmt).scalars().all()
+        assert {bar.id for bar in result} == {1, 2, 4}
@@ -1,18 +1,45 @@
+from unittest import mock
+
 import pytest
 from packaging.version import Version
-from sqlalchemy import LABEL_STYLE_TABLENAME_PLUS_COL, func, select
-from sqlalchemy.orm import joinedload
+from sqlalchemy import (
+    LABEL_STYLE_TABLENAME_PLUS_COL,
+    Column,
+    ForeignKey,
+    Integer,
+    MetaData,
+    Table,
+    func,
+    inspect,
+    select,
+)
+from sqlalchemy.orm import (
+    Query,
+    Session,
+    declarative_base,
+    joinedload,
+    mapperlib,
+    relationship,
+)
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.util import find_tables
 
-from sa_filters.exceptions import BadQuery, BadSpec
+from sa_filters.exceptions import BadQuery, BadSpec, FieldNotFound
 from sa_filters.models import (
+    Field,
+    ResolutionContext,
+    _RegistryIndex,
     auto_join,
+    get_class_by_tablename,
     get_default_model,
+    get_join_path,
     get_model_class_by_name,
     get_model_from_spec,
+    get_model_from_table,
     get_query_models,
 )
 from test import SQLALCHEMY_VERSION
-from test.models import Bar, Base, Foo, Qux
+from test.models import Bar, Base, Foo, Quux, Qux, Waldo
 
 
 class TestGetQueryModels(object):
@@ -138,6 +165,49 @@ class TestGetModelFromSpec:
         assert "Ambiguous spec. Please specify a model." == err.value.args[0]
 
 
+class TestResolutionContext:
+    def test_models(self, session):
+        context = ResolutionContext(select(Foo).join(Bar))
+
+        assert {"Foo": Foo, "Bar": Bar} == context.models
+        assert context.default_model is None
+
+    def test_default_model(self, session):
+        context = ResolutionContext(select(Foo))
+
+        assert context.default_model == Foo
+        assert get_default_model(context) == Foo
+
+    def test_get_model_from_spec(self, session):
+        context = ResolutionContext(select(Foo, Bar))
+
+        assert get_model_from_spec({"model": "Bar"}, context) == Bar
+        assert get_model_from_spec({"table": "foo"}, context) == Foo
+
+    def test_dialect(self, session):
+        assert ResolutionContext(select(Foo)).dialect is None
+        assert ResolutionContext(Query(Foo)).dialect is None
+        assert ResolutionContext(Session().query(Foo)).dialect is None
+
+        context = ResolutionContext(session.query(Foo))
+        assert context.dialect is session.get_bind().dialect
+
+    def test_statement_is_walked_once(self, session):
+        stmt = select(Foo)
+
+        with mock.patch(
+            "sa_filters.models.find_tables", wraps=find_tables
+        ) as find_tables_mock:
+            context = ResolutionContext(stmt)
+            stmt = auto_join(stmt, "Bar", context=context)
+            get_model_from_spec({"model": "Bar"}, context)
+            get_model_from_spec({"model": "Foo"}, context)
+            get_default_model(context)
+
+        assert find_tables_mock.call_count == 1
+        assert {"Foo": Foo, "Bar": Bar} == context.models
+
+
 class TestGetModelClassByName:
     @pytest.fixture
     def registry(self):
@@ -149,6 +219,115 @@ class TestGetModelClassByName:
     def test_model_does_not_exist(self, registry):
         assert get_model_class_by_name(registry, "Missing") is None
 
+    def test_unindexed_registry(self):
+        assert get_model_class_by_name({"Foo": Foo}, "Foo") == Foo
+        assert get_model_class_by_name({"Foo": Foo}, "Bar") is None
+
+
+class TestField:
+    def test_column(self):
+        assert Field(Foo, "name").get_sqlalchemy_field() is Foo.name
+
+    def test_hybrid_method_is_called(self):
+        field = Field(Foo, "three_times_count").get_sqlalchemy_field()
+        assert str(field) == str(Foo.three_times_count())
+
+    def test_resolved_field_is_reused(self):
+        first = Field(Foo, "count_square").get_sqlalchemy_field()
+        second = Field(Foo, "count_square").get_sqlalchemy_field()
+        assert first is second
+
+    def test_invalid_field(self):
+        with pytest.raises(FieldNotFound) as err:
+            Field(Foo, "missing").get_sqlalchemy_field()
+
+        expected_error = "Model {} has no column `missing`.".format(Foo)
+        assert expected_error == err.value.args[0]
+
+    def test_cache_is_cleared_when_a_model_is_mapped(self):
+        first = Field(Foo, "count_square").get_sqlalchemy_field()
+
+        OtherBase = declarative_base()
+
+        class Garply(OtherBase):
+            __tablename__ = "garply"
+            id = Column(Integer, primary_key=True)
+
+        second = Field(Foo, "count_square").get_sqlalchemy_field()
+        assert first is not second
+        assert Field(Garply, "id").get_sqlalchemy_field() is Garply.id
+
+
+class TestRegistryIndex:
+    def test_get_model_from_table(self):
+        assert get_model_from_table(Foo.__table__) == Foo
+
+    def test_get_model_from_unmapped_table(self):
+        table = Table("unmapped", MetaData(), Column("id", Integer))
+        assert get_model_from_table(table) is None
+
+    def test_get_class_by_tablename(self):
+        assert get_class_by_tablename("bar") == Bar
+        assert get_class_by_tablename("missing") is None
+
+    def test_index_is_updated_when_a_model_is_mapped(self):
+        assert get_class_by_tablename("grault") is None
+
+        OtherBase = declarative_base()
+
+        class Grault(OtherBase):
+            __tablename__ = "grault"
+            id = Column(Integer, primary_key=True)
+
+        assert get_class_by_tablename("grault") == Grault
+        assert get_model_from_table(Grault.__table__) == Grault
+        registry = OtherBase.registry._class_registry
+        assert get_model_class_by_name(registry, "Grault") == Grault
+
+    def test_index_is_cleared_when_a_registry_is_disposed(self):
+        OtherBase = declarative_base()
+
+        class Waldorf(OtherBase):
+            __tablename__ = "waldorf"
+            id = Column(Integer, primary_key=True)
+
+        table = Waldorf.__table__
+        assert get_class_by_tablename("waldorf") == Waldorf
+
+        OtherBase.registry.dispose()
+
+        assert get_class_by_tablename("waldorf") is None
+        assert get_model_from_table(table) is None
+
+    def test_index_cleared_while_it_is_built_is_not_kept(self):
+        index = _RegistryIndex()
+        all_registries = mapperlib._all_registries
+
+        def clear_and_get_registries():
+            # as if another thread mapped a model during the build
+            index.clear()
+            return all_registries()
+
+        with mock.patch.object(
+            mapperlib, "_all_registries", side_effect=clear_and_get_registries
+        ) as all_registries_mock:
+            assert index.mapper_for_table(Foo.__table__) is inspect(Foo)
+            assert index.mapper_for_table(Foo.__table__) is inspect(Foo)
+            assert all_registries_mock.call_count == 2
+
+        assert index.mapper_for_table(Foo.__table__) is inspect(Foo)
+        assert index.class_for_tablename("foo") is Foo
+
+    def test_index_is_built_on_first_lookup_by_name(self):
+        OtherBase = declarative_base()
+
+        class Garply(OtherBase):
+            __tablename__ = "garply"
+            id = Column(Integer, primary_key=True)
+
+        registry = OtherBase.registry._class_registry
+        assert get_model_class_by_name(registry, "Garply") == Garply
+
 
 class TestGetDefaultModel:
     def test_single_model_query(self, session):
@@ -164,6 +343,52 @@ class TestGetDefaultModel:
         assert get_default_model(stmt) is None
 
 
+class TestGetJoinPath:
+    def test_path(self):
+        context = ResolutionContext(select(Bar))
+
+        path = get_join_path(context, "Quux")
+
+        assert [model for model, _ in path] == [Foo, Quux]
+
+    def test_model_already_present(self):
+        context = ResolutionContext(select(Foo))
+
+        assert get_join_path(context, "Foo") is None
+
+    def test_to_many_only(self):
+        foo_context = ResolutionContext(select(Foo))
+        bar_context = ResolutionContext(select(Bar))
+
+        assert get_join_path(foo_context, "Bar", to_many_only=True) is None
+        assert get_join_path(foo_context, "Quux", to_many_only=True)
+        assert get_join_path(bar_context, "Foo", to_many_only=True)
+
+    def test_to_many_only_with_a_condition_other_than_equality(self):
+        OtherBase = declarative_base()
+
+        class Fred(OtherBase):
+            __tablename__ = "fred"
+            id = Column(Integer, primary_key=True)
+
+        class Barney(OtherBase):
+            __tablename__ = "barney"
+            id = Column(Integer, primary_key=True)
+            fred_id = Column(Integer)
+            freds = relationship(
+                Fred, primaryjoin="Fred.id > foreign(Barney.fred_id)", viewonly=True
+            )
+
+        context = ResolutionContext(select(Barney))
+
+        assert get_join_path(context, "Fred", to_many_only=True)
+
+    def test_no_models(self):
+        context = ResolutionContext(select(func.count()))
+
+        assert get_join_path(context, "Foo") is None
+
+
 class TestAutoJoin:
     def test_model_not_present(self, session, db_uri):
         stmt = select(Foo).set_label_style(LABEL_STYLE_TABLENAME_PLUS_COL)
@@ -316,3 +541,126 @@ class TestAutoJoin:
 
         stmt = auto_join(stmt, "Missing")
         assert str(stmt) == expected  # no change
+
+    def test_query_with_no_models(self, session):
+        stmt = select()
+
+        assert auto_join(stmt, "Bar") is stmt
+
+    def test_join_is_not_compiled(self, session):
+        stmt = select(Foo.id)
+
+        with mock.patch.object(Select, "compile", side_effect=AssertionError):
+            stmt = auto_join(stmt, "Bar", "Qux")
+
+        assert str(stmt) == str(select(Foo.id).join(Bar, Bar.id == Foo.bar_id))
+
+    def test_reverse_foreign_key(self, session):
+        stmt = auto_join(select(Bar.id), "Foo")
+
+        assert str(stmt) == str(select(Bar.id).join(Foo, Bar.id == Foo.bar_id))
+
+    def test_relationship_without_foreign_key(self, session):
+        stmt = auto_join(select(Quux.id), "Waldo")
+
+        expected = select(Quux.id).join(Waldo, Waldo.quux_name == Quux.name)
+        assert str(stmt) == str(expected)
+
+    def test_multiple_hops(self, session):
+        context = ResolutionContext(select(Bar.id))
+        stmt = auto_join(select(Bar.id), "Quux", context=context)
+
+        expected = (
+            select(Bar.id)
+            .join(Foo, Bar.id == Foo.bar_id)
+            .join(Quux, Foo.id == Quux.foo_id)
+        )
+        assert str(stmt) == str(expected)
+        assert {"Bar": Bar, "Foo": Foo, "Quux": Quux} == context.models
+
+    def test_multiple_hops_through_relationship(self, session):
+        stmt = auto_join(select(Foo.id), "Waldo")
+
+        expected = (
+            select(Foo.id)
+            .join(Quux, Foo.id == Quux.foo_id)
+            .join(Waldo, Waldo.quux_name == Quux.name)
+        )
+        assert str(stmt) == str(expected)
+
+    def test_hops_already_present_are_reused(self, session):
+        stmt = auto_join(select(Bar.id), "Foo", "Quux")
+
+        expected = (
+            select(Bar.id)
+            .join(Foo, Bar.id == Foo.bar_id)
+            .join(Quux, Foo.id == Quux.foo_id)
+        )
+        assert str(stmt) == str(expected)
+
+    def test_unreachable_model(self, session):
+        stmt = select(Bar.id)
+
+        assert str(auto_join(stmt, "Qux")) == str(stmt)
+
+    def test_ambiguous_join(self, session):
+        # both Bar and Quux could be joined to Foo
+        stmt = select(Bar.id, Quux.id)
+
+        assert str(auto_join(stmt, "Foo")) == str(stmt)
+
+    def test_ambiguous_foreign_keys(self):
+        OtherBase = declarative_base()
+
+        class Plugh(OtherBase):
+            __tablename__ = "plugh"
+            id = Column(Integer, primary_key=True)
+
+        class Xyzzy(OtherBase):
+            __tablename__ = "xyzzy"
+            id = Column(Integer, primary_key=True)
+            first_id = Column(Integer, ForeignKey("plugh.id"))
+            second_id = Column(Integer, ForeignKey("plugh.id"))
+
+        stmt = select(Xyzzy)
+
+        assert str(auto_join(stmt, "Plugh")) == str(stmt)
+
+    def test_ambiguous_foreign_keys_with_a_relationship(self):
+        OtherBase = declarative_base()
+
+        class Wibble(OtherBase):
+            __tablename__ = "wibble"
+            id = Column(Integer, primary_key=True)
+
+        class Wobble(OtherBase):
+            __tablename__ = "wobble"
+            id = Column(Integer, primary_key=True)
+            first_id = Column(Integer, ForeignKey("wibble.id"))
+            second_id = Column(Integer, ForeignKey("wibble.id"))
+            first = relationship(Wibble, foreign_keys=first_id, backref="wobbles")
+
+        stmt = select(Wobble)
+
+        assert "JOIN wibble ON wibble.id = wobble.first_id" in str(
+            auto_join(stmt, "Wibble")
+        )
+
+    def test_ambiguous_foreign_keys_with_relationships(self):
+        OtherBase = declarative_base()
+
+        class Flob(OtherBase):
+            __tablename__ = "flob"
+            id = Column(Integer, primary_key=True)
+
+        class Flub(OtherBase):
+            __tablename__ = "flub"
+            id = Column(Integer, primary_key=True)
+            first_id = Column(Integer, ForeignKey("flob.id"))
+            second_id = Column(Integer, ForeignKey("flob.id"))
+            first = relationship(Flob, foreign_keys=first_id)
+            second = relationship(Flob, foreign_keys=second_id)
+
+        stmt = select(Flub)
+
+        assert str(auto_join(stmt, "Flob")) == str(stmt)
@@ -1,13 +1,46 @@
 # -*- coding: utf-8 -*-
 
-import pytest
-from sqlalchemy import func, select
+import datetime
+import enum
+import uuid
+from decimal import Decimal
+from unittest import mock
 
-from sa_filters import apply_pagination
-from sa_filters.exceptions import InvalidPage
-from sa_filters.pagination import Pagination
+import pytest
+from sqlalchemy import and_, func, select
+from sqlalchemy.dialects import oracle, sqlite
+from sqlalchemy.orm import aliased, joinedload, with_loader_criteria
+
+from sa_filters import (
+    apply_filters,
+    apply_keyset_pagination,
+    apply_pagination,
+    apply_sort,
+)
+from sa_filters.exceptions import BadSortFormat, InvalidCursor, InvalidPage
+from sa_filters.models import ResolutionContext
+from sa_filters.pagination import (
+    CappedPagination,
+    KeysetPagination,
+    Pagination,
+    count_results,
+    decode_cursor,
+    encode_cursor,
+    execute_pagination,
+    get_count_stmt,
+)
 from test import error_value
-from test.models import Bar
+from test.models import Bar, Foo, Quux
+
+
+NULLSFIRST_NOT_SUPPORTED = (
+    "'nullsfirst' and 'nullslast' only supported by PostgreSQL in the current tests"
+)
+
+
+def get_sql(clause):
+    """The SQL of `clause` on one line, compiled the same on every version."""
+    return " ".join(str(clause.compile(dialect=sqlite.dialect())).split())
 
 
 class TestPaginationFixtures(object):
@@ -24,6 +57,18 @@ class TestPaginationFixtures(object):
         session.add_all([bar_1, bar_2, bar_3, bar_4, bar_5, bar_6, bar_7, bar_8])
         session.commit()
 
+    @pytest.fixture
+    def multiple_foos_inserted(self, session, multiple_bars_inserted):
+        session.add_all(
+            [
+                Foo(id=1, bar_id=1, name="name_1"),
+                Foo(id=2, bar_id=1, name="name_2"),
+                Foo(id=3, bar_id=2, name="name_3"),
+                Foo(id=4, bar_id=None, name="name_4"),
+            ]
+        )
+        session.commit()
+
 
 class TestWrongPagination(TestPaginationFixtures):
     @pytest.mark.parametrize(
@@ -476,3 +521,661 @@ class TestQueryObject(TestPaginationFixtures):
         assert len(result) == 2
         assert result[0].id == 5
         assert result[1].id == 6
+
+
+class TestKeysetPagination(TestPaginationFixtures):
+    def pages(self, session, sort_spec, page_size, backwards=False):
+        """Walk through all the pages, forwards from the first one, then
+        backwards from the last one if `backwards`.
+        """
+        context = ResolutionContext(select(Bar), dialect=session.get_bind().dialect)
+
+        def page(**key):
+            stmt, keyset = apply_keyset_pagination(
+                select(Bar), sort_spec, page_size, context=context, **key
+            )
+            bars, pagination = keyset.paginate(session.execute(stmt).scalars())
+            return [bar.id for bar in bars], pagination
+
+        pages = []
+        pagination = KeysetPagination(page_size, None, None)
+        while not pages or pagination.next_key is not None:
+            ids, pagination = page(after=pagination.next_key)
+            pages.append(ids)
+        if not backwards:
+            return pages
+
+        pages = [pages[-1]]
+        while pagination.previous_key is not None:
+            ids, pagination = page(before=pagination.previous_key)
+            pages.insert(0, ids)
+        return pages
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_pages(self, session):
+        sort_spec = [
+            {"field": "name", "direction": "asc"},
+            {"field": "id", "direction": "desc"},
+        ]
+
+        pages = self.pages(session, sort_spec, 3)
+
+        assert pages == [[3, 1, 2], [4, 6, 5], [7, 8]]
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_pagination(self, session):
+        sort_spec = {"field": "id", "direction": "asc"}
+
+        stmt, keyset = apply_keyset_pagination(select(Bar), sort_spec, 3, after=(2,))
+        bars, pagination = keyset.paginate(session.execute(stmt).scalars())
+
+        assert [bar.id for bar in bars] == [3, 4, 5]
+        assert pagination == KeysetPagination(3, next_key=(5,), previous_key=(3,))
+
+        stmt, keyset = apply_keyset_pagination(select(Bar), sort_spec, 3, before=(3,))
+        bars, pagination = keyset.paginate(session.execute(stmt).scalars())
+
+        assert [bar.id for bar in bars] == [1, 2]
+        assert pagination == KeysetPagination(3, next_key=(2,), previous_key=None)
+
+    @pytest.mark.parametrize(
+        "sort_spec",
+        [
+            [{"field": "count", "direction": "asc"}],
+            [{"field": "count", "direction": "desc"}],
+            [{"field": "count", "direction": "asc", "nullsfirst": True}],
+            [{"field": "count", "direction": "desc", "nullslast": True}],
+        ],
+    )
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_null_values(self, session, sort_spec, is_postgresql):
+        if not is_postgresql and (
+            sort_spec[0].get("nullsfirst") or sort_spec[0].get("nullslast")
+        ):
+            pytest.skip(NULLSFIRST_NOT_SUPPORTED)
+        sort_spec = sort_spec + [{"field": "id", "direction": "asc"}]
+        stmt = apply_sort(select(Bar), sort_spec)
+        expected = [bar.id for bar in session.execute(stmt).scalars()]
+
+        for page_size in (1, 2, 3):
+            pages = self.pages(session, sort_spec, page_size)
+            assert sum(pages, []) == expected
+            assert self.pages(session, sort_spec, page_size, backwards=True) == pages
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_rows_of_several_models(self, session):
+        sort_spec = [
+            {"model": "Bar", "field": "name", "direction": "desc"},
+            {"model": "Bar", "field": "id", "direction": "desc"},
+        ]
+
+        stmt, keyset = apply_keyset_pagination(
+            select(Bar.id, Bar.name), sort_spec, 2, after=("name_5", 6)
+        )
+        rows, pagination = keyset.paginate(session.execute(stmt))
+
+        assert [row.id for row in rows] == [5, 4]
+        assert pagination.next_key == ("name_4", 4)
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_rows_of_entities_of_several_models(self, session):
+        session.add_all(
+            [Foo(id=id, bar_id=9 - id, name="foo_{}".format(id)) for id in (1, 2, 3)]
+        )
+        session.commit()
+        sort_spec = [
+            {"model": "Bar", "field": "name", "direction": "asc"},
+            {"model": "Foo", "field": "id", "direction": "asc"},
+        ]
+        stmt = select(Foo, Bar).join(Bar, Foo.bar)
+
+        stmt, keyset = apply_keyset_pagination(stmt, sort_spec, 2)
+        rows, pagination = keyset.paginate(session.execute(stmt))
+
+        assert [row.Foo.id for row in rows] == [3, 2]
+        assert pagination.next_key == ("name_7", 2)
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_rows_without_the_sorted_model(self, session):
+        sort_spec = [
+            {"model": "Bar", "field": "name", "direction": "asc"},
+            {"model": "Foo", "field": "id", "direction": "asc"},
+        ]
+        session.add(Foo(id=1, bar_id=1, name="foo_1"))
+        session.commit()
+        stmt = select(Foo).join(Bar, Foo.bar)
+
+        stmt, keyset = apply_keyset_pagination(stmt, sort_spec, 2)
+        (foo,) = session.execute(stmt).scalars()
+        with pytest.raises(InvalidPage) as err:
+            keyset.get_key(foo)
+
+        assert error_value(err) == ("The rows have no `name` value of model `Bar`.")
+
+    def test_row_values(self, session):
+        sort_spec = [
+            {"field": "name", "direction": "desc"},
+            {"field": "id", "direction": "desc"},
+        ]
+
+        def paginate(sort_spec, dialect, after=None):
+            context = ResolutionContext(select(Bar), dialect=dialect)
+            return apply_keyset_pagination(
+                select(Bar), sort_spec, 2, after=after, context=context
+            )
+
+        stmt, _ = paginate(sort_spec, sqlite.dialect(), after=("a", 1))
+        expanded_stmt, _ = paginate(
+            sort_spec[:1] + [{"field": "count", "direction": "desc"}], sqlite.dialect()
+        )
+        _, keyset = paginate(sort_spec, oracle.dialect())
+        _, unknown_keyset = paginate(sort_spec, None)
+        ascending_stmt, _ = paginate(
+            [{"field": "id", "direction": "asc"}] * 2, sqlite.dialect(), after=(1, 1)
+        )
+
+        assert "WHERE (bar.name, bar.id) < (?, ?)" in get_sql(stmt)
+        assert "WHERE (bar.id, bar.id) > (?, ?)" in get_sql(ascending_stmt)
+        assert "WHERE" not in get_sql(expanded_stmt)
+        # row values are only compared when the dialect is known to support it
+        for seek_keyset in (keyset, unknown_keyset):
+            assert get_sql(seek_keyset.get_seek_predicate(("a", 1))) == (
+                "bar.name < ? OR bar.name = ? AND bar.id < ?"
+            )
+
+    def test_nullable_field_with_unknown_dialect(self):
+        sort_spec = [
+            {"field": "count", "direction": "asc"},
+            {"field": "id", "direction": "asc"},
+        ]
+
+        with pytest.raises(BadSortFormat) as err:
+            apply_keyset_pagination(select(Bar), sort_spec, 2)
+
+        assert error_value(err) == (
+            "Field `count` may be null, and where nulls are sorted is not known "
+            "without the dialect: `nullsfirst` or `nullslast` should be given."
+        )
+        sort_spec[0]["nullslast"] = True
+        stmt, _ = apply_keyset_pagination(select(Bar), sort_spec, 2, after=(5, 1))
+        assert "bar.count IS NULL" in get_sql(stmt)
+
+    def test_seek_predicate(self):
+        sort_spec = [
+            {"field": "count", "direction": "asc", "nullslast": True},
+            {"field": "count", "direction": "asc", "nullsfirst": True},
+        ]
+
+        _, keyset = apply_keyset_pagination(select(Bar), sort_spec, 2)
+
+        assert str(keyset.get_seek_predicate((None, None))) == (
+            "bar.count IS NULL AND bar.count IS NOT NULL"
+        )
+        assert str(keyset.get_seek_predicate((None, 1))) == (
+            "bar.count IS NULL AND bar.count > :count_1"
+        )
+        assert str(keyset.get_seek_predicate((1, 1))) == (
+            "bar.count > :count_1 OR bar.count IS NULL "
+            "OR bar.count = :count_2 AND bar.count > :count_3"
+        )
+
+    def test_previous_page_is_sorted_the_other_way_round(self):
+        sort_spec = [
+            {"field": "count", "direction": "asc", "nullslast": True},
+            {"field": "id", "direction": "desc", "nullsfirst": True},
+        ]
+
+        stmt, _ = apply_keyset_pagination(select(Bar), sort_spec, 2, before=(1, 1))
+
+        assert "ORDER BY bar.count DESC NULLS FIRST, bar.id ASC NULLS LAST" in str(stmt)
+
+    def test_no_rows_after(self):
+        sort_spec = {"field": "count", "direction": "asc", "nullslast": True}
+
+        _, keyset = apply_keyset_pagination(select(Bar), sort_spec, 2)
+
+        assert str(keyset.get_seek_predicate((None,))) == "false"
+
+    def test_empty_page(self, session):
+        sort_spec = {"field": "id", "direction": "asc"}
+
+        stmt, keyset = apply_keyset_pagination(select(Bar), sort_spec, 2, after=(8,))
+        bars, pagination = keyset.paginate(session.execute(stmt).scalars())
+
+        assert bars == []
+        assert pagination == KeysetPagination(2, next_key=None, previous_key=None)
+
+    @pytest.mark.parametrize(
+        "kwargs, expected_error",
+        [
+            ({"page_size": -1}, "Page size should not be negative: -1"),
+            (
+                {"page_size": 1, "after": (1,), "before": (2,)},
+                "Only one of `after` and `before` should be given.",
+            ),
+            ({"page_size": 1, "after": (1, 2)}, "Key should have 1 values: (1, 2)"),
+        ],
+    )
+    def test_wrong_pagination(self, session, kwargs, expected_error):
+        sort_spec = {"field": "id", "direction": "asc"}
+
+        with pytest.raises(InvalidPage) as err:
+            apply_keyset_pagination(select(Bar), sort_spec, **kwargs)
+
+        assert error_value(err) == expected_error
+
+
+class TestCountResults(TestPaginationFixtures):
+    def assert_count(self, session, stmt, expected_sql, expected=None):
+        count_stmt = get_count_stmt(stmt)
+
+        assert get_sql(count_stmt) == expected_sql
+        if expected is None:
+            subquery = stmt.subquery()
+            expected = session.scalar(select(func.count()).select_from(subquery))
+        assert count_results(session, stmt) == expected
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_order_and_loader_options_are_left_out(self, session):
+        stmt = (
+            select(Bar)
+            .where(Bar.count > 5)
+            .order_by(Bar.name)
+            .options(joinedload(Bar.foos), with_loader_criteria(Bar, Bar.id < 8))
+        )
+
+        self.assert_count(
+            session,
+            stmt,
+            "SELECT count(bar.id) AS count_1 FROM bar "
+            "WHERE bar.count > ? AND bar.id < ?",
+            expected=len(session.execute(stmt).unique().all()),
+        )
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_outer_joins_to_one_row(self, session):
+        bar = aliased(Bar)
+        stmt = (
+            select(Foo, bar)
+            .outerjoin(bar, Foo.bar)
+            .outerjoin(Bar, and_(Bar.id == bar.id, Bar.count > 5))
+        )
+
+        self.assert_count(session, stmt, "SELECT count(*) AS count_1 FROM foo")
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_joins_that_change_the_count(self, session):
+        bar = aliased(Bar)
+        to_many = select(Bar).outerjoin(Bar.foos)
+        inner = select(Foo).join(Foo.bar)
+        inner_after_outer = (
+            select(Foo).outerjoin(Foo.bar).join(Quux, Quux.foo_id == Foo.id)
+        )
+        filtered = (
+            select(Foo)
+            .outerjoin(bar, Foo.bar)
+            .outerjoin(Bar, Bar.id > bar.id)
+            .where(bar.name == "name_1")
+        )
+
+        self.assert_count(
+            session,
+            to_many,
+            "SELECT count(bar.id) AS count_1 FROM bar "
+            "LEFT OUTER JOIN foo ON bar.id = foo.bar_id",
+        )
+        self.assert_count(
+            session,
+            inner,
+            "SELECT count(foo.id) AS count_1 FROM foo JOIN bar ON bar.id = foo.bar_id",
+        )
+        self.assert_count(
+            session,
+            inner_after_outer,
+            "SELECT count(foo.id) AS count_1 FROM foo "
+            "JOIN quux ON quux.foo_id = foo.id",
+        )
+        self.assert_count(
+            session,
+            filtered,
+            "SELECT count(foo.id) AS count_1 FROM foo "
+            "LEFT OUTER JOIN bar AS bar_1 ON bar_1.id = foo.bar_id "
+            "LEFT OUTER JOIN bar ON bar.id > bar_1.id "
+            "WHERE bar_1.name = ?",
+        )
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_nullable_model(self, session):
+        stmt = select(Bar).select_from(Foo).outerjoin(Foo.bar)
+
+        self.assert_count(session, stmt, "SELECT count(*) AS count_1 FROM foo")
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_aliased_model(self, session):
+        foo = aliased(Foo)
+
+        self.assert_count(
+            session, select(foo), "SELECT count(foo_1.id) AS count_1 FROM foo AS foo_1"
+        )
+
+    @pytest.mark.parametrize(
+        "stmt",
+        [
+            select(Bar.name).distinct(),
+            select(Bar.name).group_by(Bar.name),
+            select(Bar.count).group_by(Bar.count).having(func.count() > 1),
+            select(Bar).order_by(Bar.id).limit(3),
+            select(Bar).order_by(Bar.id).offset(6),
+        ],
+    )
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_counted_as_subquery(self, session, stmt):
+        count_stmt = get_count_stmt(stmt)
+
+        assert str(count_stmt).startswith("SELECT count(*) AS count_1 \nFROM (SELECT ")
+        assert "ORDER BY" not in str(count_stmt)
+        expected = len(session.execute(stmt).all())
+        assert count_results(session, stmt) == expected
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_query_object(self, session):
+        query = session.query(Bar).filter(Bar.count.is_(None)).order_by(Bar.id)
+
+        assert count_results(session, query) == 2
+
+    def test_known_empty(self, session):
+        stmt = apply_filters(select(Bar), {"field": "id", "op": "in", "value": []})
+        session = mock.Mock()
+
+        assert count_results(session, stmt) == 0
+        assert session.execute.call_count == 0
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_apply_pagination(self, session):
+        stmt = select(Bar).where(Bar.count.is_not(None)).order_by(Bar.id)
+
+        paginated_stmt, pagination = apply_pagination(stmt, 2, 4, session=session)
+
+        assert pagination == Pagination(2, 4, 2, 6)
+        result = session.execute(paginated_stmt).scalars()
+        assert [bar.id for bar in result] == [6, 8]
+        # an explicit total is not counted again
+        _, pagination = apply_pagination(stmt, 2, 4, 10, session=mock.Mock())
+        assert pagination == Pagination(2, 4, 3, 10)
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_cap(self, session):
+        stmt = select(Bar).where(Bar.count.is_not(None)).order_by(Bar.id)
+
+        count_stmt = get_count_stmt(stmt, cap=3)
+
+        assert get_sql(count_stmt) == (
+            "SELECT count(*) AS count_1 FROM (SELECT bar.id AS id FROM bar "
+            "WHERE bar.count IS NOT NULL LIMIT ? OFFSET ?) AS anon_1"
+        )
+        assert count_results(session, stmt, cap=3) == 4
+        assert count_results(session, stmt, cap=6) == 6
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_cap_of_subquery(self, session):
+        stmt = select(Bar.name).distinct()
+
+        count_stmt = get_count_stmt(stmt, cap=2)
+
+        assert get_sql(count_stmt) == (
+            "SELECT count(*) AS count_1 FROM (SELECT 1 FROM "
+            "(SELECT DISTINCT bar.name AS name FROM bar) AS anon_2 "
+            "LIMIT ? OFFSET ?) AS anon_1"
+        )
+        assert count_results(session, stmt, cap=2) == 3
+        assert count_results(session, stmt, cap=10) == 6
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_cap_with_loader_criteria(self, session):
+        stmt = select(Foo).options(with_loader_criteria(Foo, Foo.bar_id.is_not(None)))
+
+        assert count_results(session, stmt, cap=10) == 3
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_apply_pagination_with_cap(self, session):
+        stmt = select(Bar).where(Bar.count.is_not(None)).order_by(Bar.id)
+
+        paginated_stmt, pagination = apply_pagination(
+            stmt, 1, 2, session=session, count_cap=4
+        )
+
+        assert pagination == CappedPagination(1, 2, 2, 4)
+        assert pagination.is_capped
+        result = session.execute(paginated_stmt).scalars()
+        assert [bar.id for bar in result] == [1, 2]
+        _, pagination = apply_pagination(stmt, 1, 2, session=session, count_cap=6)
+        assert pagination == Pagination(1, 2, 3, 6)
+        assert not pagination.is_capped
+
+
+class TestExecutePagination(TestPaginationFixtures):
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_single_query(self, session):
+        stmt = select(Bar).where(Bar.count.is_not(None)).order_by(Bar.id)
+
+        with mock.patch(
+            "sa_filters.pagination.count_results", wraps=count_results
+        ) as count_results_mock:
+            result, pagination = execute_pagination(session, stmt, 2, 4)
+
+        assert pagination == Pagination(2, 4, 2, 6)
+        assert [bar.id for bar in result.scalars()] == [6, 8]
+        assert count_results_mock.call_count == 0
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_window_column_is_stripped(self, session):
+        stmt = select(Bar.id, Bar.name).order_by(Bar.id)
+
+        result, pagination = execute_pagination(session, stmt, None, 3)
+
+        assert pagination == Pagination(1, 3, 3, 8)
+        assert list(result.keys()) == ["id", "name"]
+        assert result.all() == [(1, "name_1"), (2, "name_2"), (3, "name_1")]
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_connection(self, session):
+        table = Bar.__table__
+        stmt = select(table.c.id).order_by(table.c.id)
+
+        result, pagination = execute_pagination(session.connection(), stmt, 2, 3)
+
+        assert pagination == Pagination(2, 3, 3, 8)
+        assert result.scalars().all() == [4, 5, 6]
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_query_object(self, session):
+        query = session.query(Bar).filter(Bar.name == "name_5")
+
+        result, pagination = execute_pagination(session, query, 1, 10)
+
+        assert pagination == Pagination(1, 2, 1, 2)
+        assert sorted(bar.id for bar in result.scalars()) == [5, 6]
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_empty_page_is_counted(self, session):
+        stmt = select(Bar).order_by(Bar.id)
+
+        result, pagination = execute_pagination(session, stmt, 5, 2)
+
+        assert pagination == Pagination(5, 2, 4, 8)
+        assert result.scalars().all() == []
+
+    def test_empty_first_page(self, session):
+        stmt = select(Bar)
+
+        with mock.patch("sa_filters.pagination.count_results") as count_results_mock:
+            result, pagination = execute_pagination(session, stmt, 1, 2)
+
+        assert pagination == Pagination(1, 2, 0, 0)
+        assert result.scalars().all() == []
+        assert count_results_mock.call_count == 0
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_distinct(self, session):
+        stmt = select(Bar.name).distinct().order_by(Bar.name)
+
+        result, pagination = execute_pagination(session, stmt, 2, 2)
+
+        assert pagination == Pagination(2, 2, 3, 6)
+        assert result.scalars().all() == ["name_4", "name_5"]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_joined_collections(self, session):
+        stmt = select(Bar).options(joinedload(Bar.foos)).order_by(Bar.id)
+
+        result, pagination = execute_pagination(session, stmt, 1, 2)
+
+        assert pagination == Pagination(1, 2, 4, 8)
+        bars = result.unique().scalars().all()
+        assert [(bar.id, len(bar.foos)) for bar in bars] == [(1, 2), (2, 1)]
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_page_size_zero(self, session):
+        stmt = select(Bar)
+
+        result, pagination = execute_pagination(session, stmt, 1, 0)
+
+        assert pagination == Pagination(1, 0, 0, 8)
+        assert result.scalars().all() == []
+
+
+class Color(str, enum.Enum):
+    RED = "red"
+
+
+class TestCursors(TestPaginationFixtures):
+    FILTERS = [{"field": "count", "op": ">", "value": 5}]
+    SORT = [
+        {"field": "name", "direction": "asc"},
+        {"field": "id", "direction": "asc"},
+    ]
+
+    @pytest.mark.parametrize(
+        "key",
+        [
+            (),
+            (None, True, False, 0, -1, 2**63 - 1, -(2**63), 2**80, -(2**80)),
+            (1.5, float("inf"), "", "name_é" * 100, b"\x00\xff"),
+            (Decimal("1.10"), Decimal("-1E+3")),
+            (
+                datetime.datetime(2024, 1, 2, 3, 4, 5, 6),
+                datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc),
+                datetime.date(2024, 2, 29),
+                datetime.time(23, 59, 59, 999999),
+            ),
+            (uuid.UUID("12345678-1234-5678-1234-567812345678"),),
+        ],
+    )
+    def test_round_trip(self, key):
+        cursor = encode_cursor(key, self.FILTERS, self.SORT)
+
+        assert decode_cursor(cursor, self.FILTERS, self.SORT) == (key, None)
+        assert "=" not in cursor
+
+        cursor = encode_cursor(key, self.FILTERS, self.SORT, before=True)
+
+        assert decode_cursor(cursor, self.FILTERS, self.SORT) == (None, key)
+
+    def test_compact(self):
+        cursor = encode_cursor((5, "name_5"), self.FILTERS, self.SORT)
+
+        # 10 bytes of header, 9 for the integer and 8 for the string
+        assert len(cursor) == 36
+
+    def test_subclasses_of_supported_types(self):
+        cursor = encode_cursor((Color.RED,))
+
+        assert decode_cursor(cursor) == (("red",), None)
+
+    def test_unsupported_value(self):
+        with pytest.raises(TypeError) as err:
+            encode_cursor((object(),))
+
+        expected_error = "Key value of type `object` can't be encoded in a cursor."
+        assert error_value(err) == expected_error
+
+    @pytest.mark.parametrize(
+        "filter_spec, sort_spec",
+        [
+            (None, SORT),
+            ([{"field": "count", "op": ">", "value": 6}], SORT),
+            (FILTERS, SORT[:1]),
+            (FILTERS, SORT[::-1]),
+        ],
+    )
+    def test_other_specs(self, filter_spec, sort_spec):
+        cursor = encode_cursor((5, "name_5"), self.FILTERS, self.SORT)
+
+        with pytest.raises(InvalidCursor) as err:
+            decode_cursor(cursor, filter_spec, sort_spec)
+
+        expected_error = "Cursor does not match the filter and sort specs."
+        assert error_value(err) == expected_error
+
+    @pytest.mark.parametrize(
+        "cursor",
+        [
+            "",
+            "a",
+            "é",
+            None,
+            # unknown version
+            "AgCbA-_HTzqfYWkAAAAAAAAABXMGbmFtZV81",
+            # truncated values
+            "AQCbA-_HTzqfYWkAAAAAAAAABXMGbmFtZV8",
+            "AQCbA-_HTzqfYWkAAAAAAAAA",
+            "AQCbA-_HTzqfYXMG",
+            "AQCbA-_HTzqfYXOA",
+            "AQCbA-_HTzqfYXU",
+            # unknown type
+            "AQCbA-_HTzqfYXo",
+            # invalid decimal, date and datetime
+            "AQCbA-_HTzqfYUQBeA",
+            "AQCbA-_HTzqfYWQAAAAA",
+            "AQCbA-_HTzqfYXQBeA",
+        ],
+    )
+    def test_invalid_cursor(self, cursor):
+        with pytest.raises(InvalidCursor) as err:
+            decode_cursor(cursor)
+
+        assert error_value(err) == "Cursor is not valid: {}".format(cursor)
+
+    @pytest.mark.usefixtures("multiple_bars_inserted")
+    def test_pages(self, session):
+        def page(cursor=None):
+            after, before = (None, None)
+            if cursor is not None:
+                after, before = decode_cursor(cursor, self.FILTERS, self.SORT)
+            stmt, keyset = apply_keyset_pagination(
+                apply_filters(select(Bar), self.FILTERS),
+                self.SORT,
+                2,
+                after=after,
+                before=before,
+            )
+            bars, pagination = keyset.paginate(session.execute(stmt).scalars())
+            next_cursor = previous_cursor = None
+            if pagination.next_key is not None:
+                next_cursor = encode_cursor(
+                    pagination.next_key, self.FILTERS, self.SORT
+                )
+            if pagination.previous_key is not None:
+                previous_cursor = encode_cursor(
+                    pagination.previous_key, self.FILTERS, self.SORT, before=True
+                )
+            return [bar.id for bar in bars], next_cursor, previous_cursor
+
+        ids, next_cursor, _ = page()
+        assert ids == [2, 4]
+        ids, next_cursor, previous_cursor = page(next_cursor)
+        assert ids == [5, 6]
+        ids, next_cursor, _ = page(next_cursor)
+        assert ids == [8]
+        assert next_cursor is None
+        assert page(previous_cursor)[0] == [2, 4]
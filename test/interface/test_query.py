@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+from unittest import mock
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.sql.util import find_tables
+
+from sa_filters import (
+    ExpressionCache,
+    SpecBudget,
+    apply_filters,
+    apply_loads,
+    apply_pagination,
+    apply_query,
+    apply_sort,
+)
+from sa_filters.exceptions import BadSpec, SpecTooComplex
+from sa_filters.pagination import Pagination
+from test.models import Bar, Foo
+
+
+@pytest.fixture
+def multiple_foos_inserted(session):
+    bar_1 = Bar(id=1, name="name_1", count=5)
+    bar_2 = Bar(id=2, name="name_2", count=10)
+    bar_3 = Bar(id=3, name="name_3", count=15)
+    foo_1 = Foo(id=1, bar_id=1, name="name_1", count=50)
+    foo_2 = Foo(id=2, bar_id=2, name="name_2", count=100)
+    foo_3 = Foo(id=3, bar_id=3, name="name_1", count=None)
+    foo_4 = Foo(id=4, bar_id=3, name="name_4", count=150)
+    session.add_all([bar_1, bar_2, bar_3, foo_1, foo_2, foo_3, foo_4])
+    session.commit()
+
+
+FILTERS = [{"model": "Bar", "field": "count", "op": ">=", "value": 10}]
+SORT = [
+    {"model": "Bar", "field": "name", "direction": "desc"},
+    {"model": "Foo", "field": "id", "direction": "asc"},
+]
+LOADS = [{"model": "Foo", "fields": ["name"]}]
+
+
+class TestApplyQuery:
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_same_as_separate_calls(self, session):
+        stmt = apply_filters(select(Foo), FILTERS)
+        stmt = apply_sort(stmt, SORT)
+        stmt = apply_loads(stmt, LOADS)
+        expected_stmt, expected_pagination = apply_pagination(stmt, 1, 2, 3)
+
+        stmt, pagination = apply_query(
+            select(Foo),
+            filters=FILTERS,
+            sort=SORT,
+            loads=LOADS,
+            page_number=1,
+            page_size=2,
+            total_results=3,
+        )
+
+        assert str(stmt) == str(expected_stmt)
+        assert pagination == expected_pagination == Pagination(1, 2, 2, 3)
+        result = session.execute(stmt).scalars().all()
+        assert [foo.id for foo in result] == [3, 4]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_statement_is_walked_once(self, session):
+        with mock.patch(
+            "sa_filters.models.find_tables", wraps=find_tables
+        ) as find_tables_mock:
+            apply_query(select(Foo), filters=FILTERS, sort=SORT, loads=LOADS)
+
+        assert find_tables_mock.call_count == 1
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_specs_without_model_apply_to_the_original_model(self, session):
+        stmt, _ = apply_query(
+            select(Foo),
+            filters=FILTERS,
+            sort={"field": "id", "direction": "desc"},
+            loads=["name"],
+        )
+
+        result = session.execute(stmt).scalars().all()
+        assert [foo.id for foo in result] == [4, 3, 2]
+
+    def test_no_specs(self, session):
+        stmt = select(Foo)
+
+        processed_stmt, pagination = apply_query(stmt)
+
+        assert str(processed_stmt) == str(stmt)
+        assert pagination == Pagination(1, 0, 0, 0)
+
+    def test_do_not_auto_join(self, session):
+        with pytest.raises(BadSpec) as err:
+            apply_query(select(Foo), filters=FILTERS, do_auto_join=False)
+
+        assert "The query does not contain model `Bar`." == err.value.args[0]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_do_not_auto_join_filters_only(self, session):
+        stmt, _ = apply_query(
+            select(Foo),
+            filters=[{"field": "count", "op": "is_null"}],
+            sort=SORT,
+            do_auto_join=False,
+        )
+
+        result = session.execute(stmt).scalars().all()
+        assert [foo.id for foo in result] == [3]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_cache(self, session):
+        cache = ExpressionCache()
+
+        for _ in range(2):
+            stmt, _ = apply_query(
+                select(Foo), filters=FILTERS, sort=SORT, loads=LOADS, cache=cache
+            )
+
+        assert cache.stats().hits == 3
+        result = session.execute(stmt).scalars().all()
+        assert [foo.id for foo in result] == [3, 4, 2]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_relationship_filters(self, session):
+        filters = [{"model": "Foo", "field": "name", "op": "==", "value": "name_1"}]
+
+        exists_stmt, _ = apply_query(
+            select(Bar), filters=filters, relationship_filters="exists"
+        )
+        sorted_stmt, _ = apply_query(
+            select(Bar),
+            filters=filters,
+            sort={"model": "Foo", "field": "id", "direction": "desc"},
+            relationship_filters="exists",
+        )
+
+        assert "EXISTS" in str(exists_stmt)
+        result = session.execute(exists_stmt).scalars()
+        assert sorted(bar.id for bar in result) == [1, 3]
+        # Foo is joined to be sorted, so it is filtered as it is
+        assert "EXISTS" not in str(sorted_stmt)
+        assert [bar.id for bar in session.execute(sorted_stmt).scalars()] == [3, 1]
+
+    @pytest.mark.usefixtures("multiple_foos_inserted")
+    def test_count_cap(self, session):
+        stmt, pagination = apply_query(
+            select(Foo), page_number=1, page_size=2, session=session, count_cap=3
+        )
+
+        assert pagination == Pagination(1, 2, 2, 3)
+        assert pagination.is_capped
+        assert [foo.id for foo in session.execute(stmt).scalars()] == [1, 2]
+
+    def test_budget(self, session):
+        with pytest.raises(SpecTooComplex) as err:
+            apply_query(
+                select(Foo),
+                filters=FILTERS,
+                sort=SORT,
+                budget=SpecBudget(max_joins=0),
+            )
+
+        assert "Filter spec requires more than 0 joins." == err.value.args[0]
+
+    def test_dialect(self):
+        dialect = postgresql.dialect()
+        filters = [{"field": "id", "op": "in", "value": [1, 2, 3]}]
+
+        with mock.patch("sa_filters.filters.LARGE_IN_THRESHOLD", 2):
+            stmt, _ = apply_query(select(Foo), filters=filters, dialect=dialect)
+
+        sql = str(stmt.compile(dialect=dialect))
+        assert "foo.id = ANY (%(param_1)s::INTEGER[])" in sql
@@ -6,7 +6,9 @@ import pytest
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 
+from sa_filters import apply_filters, apply_loads
 from sa_filters.exceptions import BadSortFormat, BadSpec, FieldNotFound
+from sa_filters.models import ResolutionContext
 from sa_filters.sorting import apply_sort
 from test import error_value
 from test.models import Bar, Foo, Qux
@@ -377,6 +379,34 @@ class TestAutoJoin:
         ]
 
 
+class TestSharedResolutionContext:
+    @pytest.mark.usefixtures(
+        "multiple_bars_with_no_nulls_inserted", "multiple_foos_inserted"
+    )
+    def test_context_shared_between_apply_calls(self, session):
+        stmt = select(Foo)
+        context = ResolutionContext(stmt)
+
+        stmt = apply_filters(
+            stmt,
+            {"model": "Bar", "field": "count", "op": ">", "value": 5},
+            context=context,
+        )
+        stmt = apply_sort(
+            stmt,
+            [
+                {"model": "Bar", "field": "name", "direction": "asc"},
+                {"model": "Foo", "field": "id", "direction": "desc"},
+            ],
+            context=context,
+        )
+        stmt = apply_loads(stmt, {"model": "Foo", "fields": ["name"]}, context=context)
+        result = session.execute(stmt).scalars().all()
+
+        assert {"Foo": Foo, "Bar": Bar} == context.models
+        assert [foo.id for foo in result] == [2, 6, 4]
+
+
 class TestSortNullsFirst(object):
     """Tests `nullsfirst`.
 
@@ -50,6 +50,21 @@ class Qux(Base):
     expiration_time = Column(Time)
 
 
+class Quux(Base):
+    __tablename__ = "quux"
+
+    foo_id = Column(Integer, ForeignKey("foo.id"), nullable=True)
+
+
+class Waldo(Base):
+    __tablename__ = "waldo"
+
+    quux_name = Column(String(50), nullable=True)
+    quux = relationship(
+        "Quux", primaryjoin="foreign(Waldo.quux_name) == Quux.name", viewonly=True
+    )
+
+
 class Corge(BasePostgresqlSpecific):
     __tablename__ = "corge"
 